@@ -4,6 +4,7 @@ from django.contrib.auth.admin import UserAdmin
 from django.utils.html import format_html
 from django.utils import timezone
 from .models import UsersModel
+from .user_cache import get_user_cache
 
 
 @admin.register(UsersModel)
@@ -53,38 +54,48 @@ class CustomUserAdmin(UserAdmin):
     
     actions = ['activate_users', 'deactivate_users', 'mark_as_admin', 'mark_as_staff', 'mark_as_regular_user', 'reset_trial_status']
     
+    def _invalidate_cached_users(self, queryset):
+        """queryset.update() از سیگنال‌ها عبور نمی‌کند؛ کش ربات‌ها دستی پاک می‌شود"""
+        get_user_cache().invalidate_many(queryset.values_list('telegram_id', flat=True))
+    
     def activate_users(self, request, queryset):
         """فعال‌سازی کاربران انتخاب شده"""
         updated = queryset.update(is_active=True)
+        self._invalidate_cached_users(queryset)
         self.message_user(request, f'{updated} کاربر فعال شد.')
     activate_users.short_description = 'فعال‌سازی کاربران انتخاب شده'
     
     def deactivate_users(self, request, queryset):
         """غیرفعال‌سازی کاربران انتخاب شده"""
         updated = queryset.update(is_active=False)
+        self._invalidate_cached_users(queryset)
         self.message_user(request, f'{updated} کاربر غیرفعال شد.')
     deactivate_users.short_description = 'غیرفعال‌سازی کاربران انتخاب شده'
     
     def mark_as_admin(self, request, queryset):
         """تبدیل به ادمین"""
         updated = queryset.update(is_admin=True, is_staff=True)
+        self._invalidate_cached_users(queryset)
         self.message_user(request, f'{updated} کاربر به ادمین تبدیل شد.')
     mark_as_admin.short_description = 'تبدیل به ادمین'
     
     def mark_as_staff(self, request, queryset):
         """تبدیل به کارمند"""
         updated = queryset.update(is_staff=True, is_admin=False)
+        self._invalidate_cached_users(queryset)
         self.message_user(request, f'{updated} کاربر به کارمند تبدیل شد.')
     mark_as_staff.short_description = 'تبدیل به کارمند'
     
     def mark_as_regular_user(self, request, queryset):
         """تبدیل به کاربر عادی"""
         updated = queryset.update(is_staff=False, is_admin=False)
+        self._invalidate_cached_users(queryset)
         self.message_user(request, f'{updated} کاربر به کاربر عادی تبدیل شد.')
     mark_as_regular_user.short_description = 'تبدیل به کاربر عادی'
     
     def reset_trial_status(self, request, queryset):
         """بازنشانی وضعیت تستی"""
         updated = queryset.update(has_used_trial=False)
+        self._invalidate_cached_users(queryset)
         self.message_user(request, f'{updated} وضعیت تستی بازنشانی شد.')
     reset_trial_status.short_description = 'بازنشانی وضعیت تستی'
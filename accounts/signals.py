@@ -0,0 +1,20 @@
+"""
+Signal handlers for accounts models
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import UsersModel
+from .user_cache import get_user_cache
+
+
+@receiver(post_save, sender=UsersModel)
+def refresh_cached_user(sender, instance, **kwargs):
+    """Drop the cached copy of a saved user so the next lookup reloads it"""
+    get_user_cache().invalidate(instance.telegram_id)
+
+
+@receiver(post_delete, sender=UsersModel)
+def drop_cached_user(sender, instance, **kwargs):
+    """Drop the cached copy of a deleted user"""
+    get_user_cache().invalidate(instance.telegram_id)
@@ -0,0 +1,224 @@
+"""
+Bot User Cache
+Read-through cache of UsersModel rows keyed by telegram_id, shared by the bots
+"""
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS
+
+from core.redis_client import get_redis
+from .models import UsersModel
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'usercache:v1'
+# the password hash never leaves the database; it stays deferred on cached rows
+EXCLUDED_FIELDS = frozenset({'password'})
+
+_MISSING = object()
+
+
+def cache_key(telegram_id: int) -> str:
+    return f'{KEY_PREFIX}:{telegram_id}'
+
+
+def _cached_fields():
+    return [f for f in UsersModel._meta.concrete_fields if f.attname not in EXCLUDED_FIELDS]
+
+
+def dump_user(user: UsersModel) -> str:
+    """Serialize a user's cached fields to JSON"""
+    return json.dumps(
+        {f.attname: f.value_from_object(user) for f in _cached_fields()},
+        cls=DjangoJSONEncoder
+    )
+
+
+def load_user(raw: str) -> UsersModel:
+    """Rebuild a user from dump_user() output, as if loaded from the database"""
+    data = json.loads(raw)
+    fields = _cached_fields()
+    return UsersModel.from_db(
+        DEFAULT_DB_ALIAS,
+        [f.attname for f in fields],
+        [f.to_python(data.get(f.attname)) for f in fields]
+    )
+
+
+class UserCache:
+    """
+    Two-tier cache of bot users by telegram_id
+
+    The first tier is an in-process LRU with a short TTL, so a button press
+    that was preceded by another one costs no I/O at all. The second tier is
+    Redis (optional), shared by every bot process and worker, with a longer
+    TTL. Misses fall through to the database and fill both tiers; unknown
+    telegram_ids are remembered locally too, so is_admin checks from strangers
+    do not hit the database every time.
+
+    post_save/post_delete on UsersModel drop the entry from the local tier of
+    the saving process and from Redis; other processes see the change once
+    their local TTL runs out. Callers get a copy of the cached row, so
+    mutating it (and saving) never leaks into the cache.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 60, redis_ttl: int = 300,
+                 client: Optional[redis.Redis] = None):
+        """
+        Args:
+            max_size: Entries kept in the local tier
+            ttl: Seconds an entry lives in the local tier
+            redis_ttl: Seconds an entry lives in Redis (0 disables the Redis tier)
+            client: Redis client (defaults to the shared one)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+        self._client = client
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[int, Tuple[float, object]]' = OrderedDict()
+
+    @property
+    def client(self) -> Optional[redis.Redis]:
+        if not self.redis_ttl:
+            return None
+        if self._client is None:
+            self._client = get_redis()
+        return self._client
+
+    def _get_local(self, telegram_id: int):
+        """Cached user, None for a known-missing user, or _MISSING on a miss"""
+        with self._lock:
+            entry = self._entries.get(telegram_id)
+            if entry is None:
+                return _MISSING
+            expires_at, user = entry
+            if expires_at <= time.monotonic():
+                del self._entries[telegram_id]
+                return _MISSING
+            self._entries.move_to_end(telegram_id)
+        return copy.copy(user) if user is not None else None
+
+    def _set_local(self, telegram_id: int, user: Optional[UsersModel]) -> None:
+        with self._lock:
+            self._entries[telegram_id] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(telegram_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _load(self, telegram_id: int) -> Optional[UsersModel]:
+        """Fill the local tier from Redis or, failing that, from the database"""
+        client = self.client
+        if client is not None:
+            try:
+                raw = client.get(cache_key(telegram_id))
+                if raw:
+                    user = load_user(raw)
+                    self._set_local(telegram_id, user)
+                    return copy.copy(user)
+            except (redis.RedisError, ValueError) as e:
+                logger.warning(f"User cache read failed for {telegram_id}: {e}")
+
+        user = UsersModel.objects.filter(telegram_id=telegram_id).first()
+        if user is None:
+            self._set_local(telegram_id, None)
+            return None
+        self.set(user)
+        return user
+
+    def get(self, telegram_id: int) -> Optional[UsersModel]:
+        """
+        User by telegram_id, or None if there is no such user
+
+        Blocking; use afind()/aget() from async handlers.
+        """
+        user = self._get_local(telegram_id)
+        if user is not _MISSING:
+            return user
+        return self._load(telegram_id)
+
+    async def afind(self, telegram_id: int) -> Optional[UsersModel]:
+        """Async get(); local hits are served without leaving the event loop"""
+        user = self._get_local(telegram_id)
+        if user is not _MISSING:
+            return user
+        return await sync_to_async(self._load)(telegram_id)
+
+    async def aget(self, telegram_id: int) -> UsersModel:
+        """
+        Drop-in for ``sync_to_async(UsersModel.objects.get)(telegram_id=...)``
+
+        Raises:
+            UsersModel.DoesNotExist: If there is no such user
+        """
+        user = await self.afind(telegram_id)
+        if user is None:
+            raise UsersModel.DoesNotExist(f"User with telegram_id {telegram_id} does not exist")
+        return user
+
+    def set(self, user: UsersModel) -> None:
+        """Store a freshly loaded or saved user in both tiers"""
+        if user.telegram_id is None:
+            return
+        cached = copy.copy(user)
+        self._set_local(user.telegram_id, cached)
+
+        client = self.client
+        if client is not None:
+            try:
+                client.set(cache_key(user.telegram_id), dump_user(cached), ex=self.redis_ttl)
+            except redis.RedisError as e:
+                logger.warning(f"User cache write failed for {user.telegram_id}: {e}")
+
+    def invalidate(self, telegram_id: Optional[int]) -> None:
+        """Forget a user in this process and in Redis"""
+        if telegram_id is None:
+            return
+        self.invalidate_many([telegram_id])
+
+    def invalidate_many(self, telegram_ids: Iterable[Optional[int]]) -> None:
+        """Forget several users at once (e.g. after a queryset.update())"""
+        telegram_ids = [telegram_id for telegram_id in telegram_ids if telegram_id is not None]
+        if not telegram_ids:
+            return
+
+        with self._lock:
+            for telegram_id in telegram_ids:
+                self._entries.pop(telegram_id, None)
+
+        client = self.client
+        if client is not None:
+            try:
+                client.delete(*[cache_key(telegram_id) for telegram_id in telegram_ids])
+            except redis.RedisError as e:
+                logger.warning(f"User cache invalidation failed for {telegram_ids}: {e}")
+
+    def clear(self) -> None:
+        """Empty the local tier"""
+        with self._lock:
+            self._entries.clear()
+
+
+_cache: Optional[UserCache] = None
+
+
+def get_user_cache() -> UserCache:
+    """Get the process-wide user cache"""
+    global _cache
+    if _cache is None:
+        _cache = UserCache(
+            max_size=getattr(settings, 'USER_CACHE_MAX_SIZE', 10000),
+            ttl=getattr(settings, 'USER_CACHE_TTL', 60),
+            redis_ttl=getattr(settings, 'USER_CACHE_REDIS_TTL', 300),
+        )
+    return _cache
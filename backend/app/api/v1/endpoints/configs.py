@@ -40,8 +40,8 @@ async def create_config(
     
     user_id = config_data.user_id if config_data.user_id else current_user["id"]
     
-    # Find available server
-    server = await server_crud.find_available_server(db)
+    # Reserve a slot on the least-loaded server
+    server = await server_crud.reserve_slot(db)
     if not server:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -65,6 +65,7 @@ async def create_config(
         
         sui_client_id = sui_client_data.get("id") or sui_client_data.get("client_id")
         if not sui_client_id:
+            await server_crud.release_slot(db, server.id)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to get client ID from S-UI panel"
@@ -77,12 +78,10 @@ async def create_config(
         config_dict["sui_client_id"] = str(sui_client_id)
         config = await config_crud.create(db, config_dict)
         
-        # Update server config count
-        await server_crud.increment_config_count(db, server.id)
-        
         return config
         
     except SUIClientError as e:
+        await server_crud.release_slot(db, server.id)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to create config in S-UI panel: {str(e)}"
@@ -0,0 +1,48 @@
+"""
+Traffic history endpoints
+"""
+from typing import List, Optional
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db
+from app.crud.usage import traffic_crud
+from app.models.usage import TrafficRollup
+from app.schemas.traffic import TrafficPoint, TopConsumer
+from app.dependencies import get_current_admin
+
+router = APIRouter()
+
+
+@router.get("/series", response_model=List[TrafficPoint])
+async def get_traffic_series(
+    period: str = Query(TrafficRollup.HOUR, regex="^(hour|day)$"),
+    since: Optional[datetime] = Query(None, description="Start of range (default: 24 hours or 30 days ago)"),
+    until: Optional[datetime] = Query(None, description="End of range (default: now)"),
+    server_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Get per-server traffic per hour or day (Admin only)
+    """
+    until = until or datetime.now(timezone.utc)
+    if since is None:
+        since = until - (timedelta(hours=24) if period == TrafficRollup.HOUR else timedelta(days=30))
+    
+    return await traffic_crud.get_series(db, period, since, until, server_id=server_id)
+
+
+@router.get("/top", response_model=List[TopConsumer])
+async def get_top_consumers(
+    hours: int = Query(1, ge=1, le=48, description="Window size in hours"),
+    limit: int = Query(10, ge=1, le=100),
+    server_id: Optional[int] = Query(None),
+    db: AsyncSession = Depends(get_db),
+    admin: dict = Depends(get_current_admin)
+):
+    """
+    Get the clients with the most traffic in the last hours (Admin only)
+    """
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    return await traffic_crud.get_top_consumers(db, since, limit=limit, server_id=server_id)
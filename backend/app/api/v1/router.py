@@ -10,6 +10,7 @@ from app.api.v1.endpoints import (
     orders,
     tickets,
     finance,
+    traffic,
 )
 
 api_router = APIRouter()
@@ -22,4 +23,5 @@ api_router.include_router(configs.router, prefix="/configs", tags=["Configs"])
 api_router.include_router(orders.router, prefix="/orders", tags=["Orders"])
 api_router.include_router(tickets.router, prefix="/tickets", tags=["Tickets"])
 api_router.include_router(finance.router, prefix="/finance", tags=["Finance"])
+api_router.include_router(traffic.router, prefix="/traffic", tags=["Traffic"])
 
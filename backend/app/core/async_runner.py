@@ -0,0 +1,150 @@
+"""
+Async task runner for Celery workers
+Keeps one event loop (and with it one database pool) per worker process
+"""
+import asyncio
+import functools
+import os
+import threading
+from typing import Any, Awaitable, Callable, Optional, Tuple, Type, TypeVar
+
+from celery import shared_task
+from celery.signals import worker_process_init, worker_process_shutdown
+from loguru import logger
+
+T = TypeVar("T")
+
+
+class AsyncRunner:
+    """
+    Long-lived event loop running in a daemon thread
+
+    asyncio.run() per task creates a new loop every time, while the
+    SQLAlchemy async engine, httpx pools and Telegram bots keep connections
+    bound to the loop that opened them. Running every task on the same loop
+    lets those pools be reused across tasks instead of being rebuilt (or
+    breaking) each time.
+    """
+
+    def __init__(self):
+        """Start the loop thread"""
+        self.pid = os.getpid()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="async-task-runner",
+            daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The runner's event loop"""
+        return self._loop
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Run a coroutine on the runner loop and wait for its result
+
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait before giving up
+
+        Returns:
+            The coroutine's result (its exception is re-raised)
+        """
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRunner.run() called from the runner loop itself")
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # timeouts and Celery's SoftTimeLimitExceeded must not leave the coroutine running
+            future.cancel()
+            raise
+
+    def close(self) -> None:
+        """Dispose the database pool on its loop and stop the loop"""
+        if not self._loop.is_running():
+            return
+        try:
+            from app.core.database import engine
+            self.run(engine.dispose(), timeout=10)
+        except Exception as e:
+            logger.warning(f"Error disposing database pool: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_runner: Optional[AsyncRunner] = None
+_lock = threading.Lock()
+
+
+def get_runner() -> AsyncRunner:
+    """Get this process's runner (a new one per PID, so forked children get their own loop)"""
+    global _runner
+    if _runner is None or _runner.pid != os.getpid():
+        with _lock:
+            if _runner is None or _runner.pid != os.getpid():
+                _runner = AsyncRunner()
+    return _runner
+
+
+def run_async(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Run a coroutine on the worker's persistent loop"""
+    return get_runner().run(coro, timeout)
+
+
+def async_task(
+    *task_args: Any,
+    retry_on: Tuple[Type[BaseException], ...] = (),
+    retry_countdown: Optional[int] = None,
+    **task_kwargs: Any
+) -> Callable:
+    """
+    Declare an async Celery task
+
+    Takes the same options as shared_task; the coroutine runs on the
+    worker's persistent loop and the task keeps the function's name, so
+    existing task names and beat entries stay valid.
+
+    Celery's task request is thread-local and the coroutine runs on the
+    runner thread, so a coroutine must not call self.retry() itself (it
+    would look like a direct call and just re-raise). Let the exception
+    propagate instead; for bound tasks, exceptions matching ``retry_on``
+    are retried from the worker thread with ``retry_countdown``.
+
+    Example:
+        @async_task(bind=True, max_retries=3, retry_on=(Exception,), retry_countdown=60)
+        async def send_something(self, order_id: int):
+            ...
+    """
+    if retry_on and not task_kwargs.get("bind"):
+        raise ValueError("retry_on needs bind=True")
+
+    def decorator(func: Callable[..., Awaitable[T]]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def run(*args: Any, **kwargs: Any) -> T:
+            try:
+                return run_async(func(*args, **kwargs))
+            except retry_on as e:
+                # args[0] is the bound task; its request is only valid on this thread
+                raise args[0].retry(exc=e, countdown=retry_countdown)
+
+        return shared_task(*task_args, **task_kwargs)(run)
+
+    return decorator
+
+
+@worker_process_init.connect
+def _reset_after_fork(**kwargs) -> None:
+    """Drop database connections inherited from the parent without closing them for it"""
+    from app.core.database import engine
+    engine.sync_engine.dispose(close=False)
+
+
+@worker_process_shutdown.connect
+def _close_runner(**kwargs) -> None:
+    """Close the pooled connections before the worker process exits"""
+    if _runner is not None and _runner.pid == os.getpid():
+        _runner.close()
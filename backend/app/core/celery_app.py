@@ -13,6 +13,7 @@ celery_app = Celery(
         "app.tasks.notifications",
         "app.tasks.config_expiry",
         "app.tasks.usage_sync",
+        "app.tasks.traffic_rollup",
     ]
 )
 
@@ -2,6 +2,7 @@
 Celery Beat schedule configuration
 """
 from celery.schedules import crontab
+from app.core.config import settings
 
 # Celery Beat schedule
 beat_schedule = {
@@ -15,10 +16,14 @@ beat_schedule = {
         "task": "app.tasks.config_expiry.check_over_limit_configs",
         "schedule": crontab(minute=30),  # Every hour at minute 30
     },
-    # Sync usage from S-UI panels every 6 hours
+    # Sync usage from S-UI panels incrementally every few minutes
     "sync-usage-from-sui": {
         "task": "app.tasks.usage_sync.sync_usage_from_sui",
-        "schedule": crontab(hour="*/6", minute=0),  # Every 6 hours
+        "schedule": crontab(minute=f"*/{settings.USAGE_SYNC_INTERVAL_MINUTES}"),
+    },
+    # Roll traffic samples up into hourly/daily totals
+    "rollup-traffic": {
+        "task": "app.tasks.traffic_rollup.rollup_traffic",
+        "schedule": crontab(minute=5),  # Every hour at minute 5
     },
 }
-
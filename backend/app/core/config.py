@@ -47,12 +47,21 @@ class Settings(BaseSettings):
     # Telegram
     TELEGRAM_BOT_TOKEN: str = ""
     TELEGRAM_ADMIN_ID: str = ""
+    TELEGRAM_POOL_SIZE: int = 10
     
     # S-UI Panel
     SUI_BASE_URL: str = "http://localhost:2095"
     SUI_API_KEY: str = ""
     SUI_DEFAULT_TIMEOUT: int = 30
     SUI_MAX_RETRIES: int = 3
+    SUI_USAGE_CONCURRENCY: int = 10
+    SUI_KEEPALIVE_EXPIRY: float = 60.0
+    USAGE_SYNC_INTERVAL_MINUTES: int = 5
+    
+    # Traffic history retention
+    TRAFFIC_RAW_RETENTION_HOURS: int = 48
+    TRAFFIC_HOURLY_RETENTION_DAYS: int = 30
+    TRAFFIC_DAILY_RETENTION_DAYS: int = 365
     
     # CORS
     CORS_ORIGINS: List[str] = ["http://localhost:3000", "http://localhost:5173"]
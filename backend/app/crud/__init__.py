@@ -5,6 +5,7 @@ from app.crud.config import config_crud
 from app.crud.order import order_crud
 from app.crud.ticket import ticket_crud
 from app.crud.finance import expense_crud
+from app.crud.usage import usage_crud, traffic_crud
 
 __all__ = [
     "user_crud",
@@ -13,5 +14,7 @@ __all__ = [
     "order_crud",
     "ticket_crud",
     "expense_crud",
+    "usage_crud",
+    "traffic_crud",
 ]
 
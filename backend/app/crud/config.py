@@ -1,9 +1,10 @@
 """
 Config CRUD operations
 """
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple
+from decimal import Decimal
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select, update, bindparam, func, and_, or_
 from datetime import datetime, timezone
 from app.models.config import Config, ConfigStatus
 from app.crud.base import CRUDBase
@@ -69,6 +70,74 @@ class CRUDConfig(CRUDBase[Config]):
         )
         return list(result.scalars().all())
     
+    async def _set_status_where(
+        self,
+        db: AsyncSession,
+        condition,
+        status: ConfigStatus,
+        commit: bool = True
+    ) -> List[Tuple[int, int, Optional[str]]]:
+        """Flip matching active configs to a status in one UPDATE ... RETURNING"""
+        result = await db.execute(
+            update(self.model)
+            .where(and_(condition, self.model.status == ConfigStatus.ACTIVE))
+            .values(status=status, updated_at=func.now())
+            .returning(self.model.id, self.model.server_id, self.model.sui_client_id)
+            .execution_options(synchronize_session=False)
+        )
+        rows = [tuple(row) for row in result.all()]
+        if commit:
+            await db.commit()
+        return rows
+    
+    async def expire_due_configs(
+        self,
+        db: AsyncSession,
+        commit: bool = True
+    ) -> List[Tuple[int, int, Optional[str]]]:
+        """
+        Mark every active config past its expire_at as expired
+        
+        Args:
+            db: Database session
+            commit: Commit the transaction (False when the caller owns it)
+            
+        Returns:
+            (id, server_id, sui_client_id) of each config that was expired
+        """
+        now = datetime.now(timezone.utc)
+        return await self._set_status_where(
+            db,
+            and_(self.model.expire_at.isnot(None), self.model.expire_at < now),
+            ConfigStatus.EXPIRED,
+            commit=commit
+        )
+    
+    async def disable_over_limit_configs(
+        self,
+        db: AsyncSession,
+        commit: bool = True
+    ) -> List[Tuple[int, int, Optional[str]]]:
+        """
+        Mark every active config that used up its data limit as disabled
+        
+        Args:
+            db: Database session
+            commit: Commit the transaction (False when the caller owns it)
+            
+        Returns:
+            (id, server_id, sui_client_id) of each config that was disabled
+        """
+        return await self._set_status_where(
+            db,
+            and_(
+                self.model.data_limit_gb.isnot(None),
+                self.model.used_data_gb >= self.model.data_limit_gb
+            ),
+            ConfigStatus.DISABLED,
+            commit=commit
+        )
+    
     async def update_usage(
         self,
         db: AsyncSession,
@@ -86,6 +155,65 @@ class CRUDConfig(CRUDBase[Config]):
         await db.refresh(config)
         return config
     
+    async def bulk_update_usage(
+        self,
+        db: AsyncSession,
+        server_id: int,
+        usage_bytes: Dict[str, int],
+        commit: bool = True
+    ) -> int:
+        """
+        Apply a server's usage snapshot in a single transaction
+        
+        Reads the current usage of the server's configs once, skips rows whose
+        rounded value is unchanged and writes the rest with one executemany
+        UPDATE.
+        
+        Args:
+            db: Database session
+            server_id: Server ID
+            usage_bytes: Mapping of S-UI client ID to used bytes
+            commit: Commit the transaction (False when the caller owns it)
+            
+        Returns:
+            Number of configs updated
+        """
+        result = await db.execute(
+            select(self.model.id, self.model.sui_client_id, self.model.used_data_gb)
+            .where(
+                and_(
+                    self.model.server_id == server_id,
+                    self.model.sui_client_id.isnot(None)
+                )
+            )
+        )
+        
+        changes = []
+        for config_id, sui_client_id, current_gb in result.all():
+            used_bytes = usage_bytes.get(sui_client_id)
+            if used_bytes is None:
+                continue
+            
+            used_gb = (Decimal(used_bytes) / (1024 ** 3)).quantize(Decimal("0.01"))
+            if current_gb is not None and Decimal(current_gb) == used_gb:
+                continue
+            changes.append({"config_id": config_id, "used_data_gb": used_gb})
+        
+        if not changes:
+            return 0
+        
+        table = self.model.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("config_id"))
+            .values(used_data_gb=bindparam("used_data_gb"), updated_at=func.now())
+        )
+        connection = await db.connection()
+        await connection.execute(stmt, changes)
+        if commit:
+            await db.commit()
+        return len(changes)
+    
     async def get_with_relations(
         self,
         db: AsyncSession,
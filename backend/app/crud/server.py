@@ -1,9 +1,9 @@
 """
 Server CRUD operations
 """
-from typing import Optional, List
+from typing import Optional, List, Iterable, Dict
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, update, func, and_
 from app.models.server import Server
 from app.crud.base import CRUDBase
 
@@ -18,6 +18,16 @@ class CRUDServer(CRUDBase[Server]):
         )
         return result.scalar_one_or_none()
     
+    async def get_by_ids(self, db: AsyncSession, ids: Iterable[int]) -> Dict[int, Server]:
+        """Get several servers in one query, keyed by ID"""
+        ids = set(ids)
+        if not ids:
+            return {}
+        result = await db.execute(
+            select(self.model).where(self.model.id.in_(ids))
+        )
+        return {server.id: server for server in result.scalars().all()}
+    
     async def get_active_servers(self, db: AsyncSession) -> List[Server]:
         """Get all active servers"""
         result = await db.execute(
@@ -46,6 +56,70 @@ class CRUDServer(CRUDBase[Server]):
         """Alias for find_available_server"""
         return await self.find_available_server(db)
     
+    async def reserve_slot(self, db: AsyncSession, candidates: int = 5) -> Optional[Server]:
+        """
+        Atomically reserve a config slot on the least-loaded active server
+        
+        Each candidate is claimed with a conditional
+        ``UPDATE ... SET current_config_count = current_config_count + 1
+        WHERE current_config_count < max_config_limit RETURNING``, so concurrent
+        requests can never push a server over its limit. A lost race moves on
+        to the next candidate.
+        
+        Args:
+            db: Database session
+            candidates: Number of least-loaded servers to try
+            
+        Returns:
+            The server holding the reserved slot, or None if all are full
+        """
+        result = await db.execute(
+            select(self.model.id)
+            .where(
+                and_(
+                    self.model.is_active == True,
+                    self.model.current_config_count < self.model.max_config_limit
+                )
+            )
+            .order_by(self.model.current_config_count.asc())
+            .limit(candidates)
+        )
+        
+        for server_id in result.scalars().all():
+            reserved = await db.execute(
+                update(self.model)
+                .where(
+                    and_(
+                        self.model.id == server_id,
+                        self.model.current_config_count < self.model.max_config_limit
+                    )
+                )
+                .values(current_config_count=self.model.current_config_count + 1)
+                .returning(self.model)
+                .execution_options(synchronize_session=False)
+            )
+            server = reserved.scalar_one_or_none()
+            if server:
+                await db.commit()
+                return server
+        
+        return None
+    
+    async def release_slot(self, db: AsyncSession, server_id: int) -> None:
+        """Give back a slot reserved with reserve_slot"""
+        await db.execute(
+            update(self.model)
+            .where(
+                and_(
+                    self.model.id == server_id,
+                    self.model.current_config_count > 0
+                )
+            )
+            .values(current_config_count=self.model.current_config_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    
     async def increment_config_count(self, db: AsyncSession, server_id: int) -> Optional[Server]:
         """Increment server config count"""
         server = await self.get(db, server_id)
@@ -0,0 +1,355 @@
+"""
+Usage tracking CRUD operations
+"""
+from typing import Optional, Dict, List, Tuple, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, insert, update, delete, bindparam, literal, func, and_
+from datetime import datetime, timedelta, timezone
+from app.models.usage import UsageCursor, TrafficSample, TrafficRollup
+from app.models.config import Config
+from app.crud.base import CRUDBase
+
+
+class CRUDUsageCursor(CRUDBase[UsageCursor]):
+    """Usage cursor CRUD operations"""
+    
+    async def get_server_counters(
+        self,
+        db: AsyncSession,
+        server_id: int
+    ) -> Dict[str, Tuple[int, int, int]]:
+        """Get (cursor id, up, down) of every client seen on a server"""
+        result = await db.execute(
+            select(self.model.sui_client_id, self.model.id, self.model.up_bytes, self.model.down_bytes)
+            .where(self.model.server_id == server_id)
+        )
+        return {row[0]: (row[1], row[2], row[3]) for row in result.all()}
+    
+    async def record_snapshot(
+        self,
+        db: AsyncSession,
+        server_id: int,
+        counters: Dict[str, Tuple[int, int]],
+        sampled_at: Optional[datetime] = None
+    ) -> Dict[str, Tuple[int, int]]:
+        """
+        Diff a server's traffic counters against the stored cursors
+        
+        Advances the cursors of changed clients and appends one traffic sample
+        per changed client. A counter lower than the cursor means the panel
+        reset the client's traffic, so the new value is taken as the delta.
+        A client without a cursor gets one seeded from its counters and a
+        zero delta, so no sample is written for its lifetime traffic.
+        Nothing is committed; the caller owns the transaction.
+        
+        Args:
+            db: Database session
+            server_id: Server ID
+            counters: Mapping of S-UI client ID to cumulative (up, down) bytes
+            sampled_at: Sample timestamp (defaults to now, truncated to the minute)
+            
+        Returns:
+            Mapping of changed and newly seen client IDs to their (up, down) deltas
+        """
+        sampled_at = sampled_at or datetime.now(timezone.utc).replace(second=0, microsecond=0)
+        cursors = await self.get_server_counters(db, server_id)
+        
+        deltas = {}
+        new_cursors = []
+        moved_cursors = []
+        for client_id, (up, down) in counters.items():
+            cursor = cursors.get(client_id)
+            if cursor is None:
+                # first sight: the counter is lifetime traffic, not traffic since
+                # the last sync, so only seed the cursor
+                new_cursors.append({"server_id": server_id, "sui_client_id": client_id, "up_bytes": up, "down_bytes": down})
+                deltas[client_id] = (0, 0)
+                continue
+            
+            cursor_id, last_up, last_down = cursor
+            if (up, down) == (last_up, last_down):
+                continue
+            
+            moved_cursors.append({"cursor_id": cursor_id, "up_bytes": up, "down_bytes": down})
+            deltas[client_id] = (
+                up - last_up if up >= last_up else up,
+                down - last_down if down >= last_down else down,
+            )
+        
+        if new_cursors:
+            await db.execute(insert(self.model), new_cursors)
+        
+        if moved_cursors:
+            table = self.model.__table__
+            connection = await db.connection()
+            await connection.execute(
+                update(table)
+                .where(table.c.id == bindparam("cursor_id"))
+                .values(up_bytes=bindparam("up_bytes"), down_bytes=bindparam("down_bytes"), updated_at=func.now()),
+                moved_cursors
+            )
+        
+        samples = [
+            (client_id, up, down)
+            for client_id, (up, down) in deltas.items()
+            if up or down
+        ]
+        if samples:
+            result = await db.execute(
+                select(Config.sui_client_id, Config.id)
+                .where(
+                    and_(
+                        Config.server_id == server_id,
+                        Config.sui_client_id.isnot(None)
+                    )
+                )
+            )
+            config_ids = dict(result.all())
+            await db.execute(
+                insert(TrafficSample),
+                [
+                    {
+                        "server_id": server_id,
+                        "config_id": config_ids.get(client_id),
+                        "sui_client_id": client_id,
+                        "bucket_at": sampled_at,
+                        "up_bytes": up,
+                        "down_bytes": down,
+                    }
+                    for client_id, up, down in samples
+                ]
+            )
+        
+        return deltas
+
+
+def as_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Make a database timestamp UTC-aware (SQLite returns naive datetimes)"""
+    if moment is not None and moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def truncate_bucket(moment: datetime, period: str) -> datetime:
+    """Truncate a timestamp to the start of its hour or day"""
+    moment = moment.replace(minute=0, second=0, microsecond=0)
+    if period == TrafficRollup.DAY:
+        moment = moment.replace(hour=0)
+    return moment
+
+
+PERIOD_LENGTH = {
+    TrafficRollup.HOUR: timedelta(hours=1),
+    TrafficRollup.DAY: timedelta(days=1),
+}
+
+
+class CRUDTrafficRollup(CRUDBase[TrafficRollup]):
+    """Traffic rollup CRUD operations"""
+    
+    async def last_bucket(self, db: AsyncSession, period: str) -> Optional[datetime]:
+        """Get the latest rolled-up bucket of a period"""
+        result = await db.execute(
+            select(func.max(self.model.bucket_at)).where(self.model.period == period)
+        )
+        return as_utc(result.scalar_one_or_none())
+    
+    async def next_source_bucket(
+        self,
+        db: AsyncSession,
+        period: str,
+        since: Optional[datetime] = None
+    ) -> Optional[datetime]:
+        """
+        Get the first bucket of a period that has source rows at or after a moment
+        
+        Lets the rollup jump over hours and days without traffic instead of
+        rebuilding them as empty buckets on every run.
+        """
+        if period == TrafficRollup.HOUR:
+            source = TrafficSample
+            conditions = []
+        else:
+            source = TrafficRollup
+            conditions = [TrafficRollup.period == TrafficRollup.HOUR]
+        if since is not None:
+            conditions.append(source.bucket_at >= since)
+        
+        result = await db.execute(select(func.min(source.bucket_at)).where(and_(*conditions)))
+        first = as_utc(result.scalar_one_or_none())
+        return truncate_bucket(first, period) if first is not None else None
+    
+    async def rollup_bucket(self, db: AsyncSession, period: str, bucket_at: datetime) -> None:
+        """
+        (Re)build one bucket of a period
+        
+        Hourly buckets are summed from raw samples, daily buckets from hourly
+        rollups. Existing rows of the bucket are replaced so reruns are safe.
+        
+        Args:
+            db: Database session
+            period: TrafficRollup.HOUR or TrafficRollup.DAY
+            bucket_at: Bucket start
+        """
+        if period == TrafficRollup.HOUR:
+            source = TrafficSample
+            source_filter = []
+        else:
+            source = TrafficRollup
+            source_filter = [TrafficRollup.period == TrafficRollup.HOUR]
+        
+        bucket_end = bucket_at + PERIOD_LENGTH[period]
+        aggregate = (
+            select(
+                literal(period, self.model.period.type),
+                literal(bucket_at, self.model.bucket_at.type),
+                source.server_id,
+                func.max(source.config_id),
+                source.sui_client_id,
+                func.sum(source.up_bytes),
+                func.sum(source.down_bytes),
+            )
+            .where(
+                and_(
+                    *source_filter,
+                    source.bucket_at >= bucket_at,
+                    source.bucket_at < bucket_end
+                )
+            )
+            .group_by(source.server_id, source.sui_client_id)
+        )
+        
+        await db.execute(
+            delete(self.model).where(
+                and_(self.model.period == period, self.model.bucket_at == bucket_at)
+            )
+        )
+        await db.execute(
+            insert(self.model).from_select(
+                ["period", "bucket_at", "server_id", "config_id", "sui_client_id", "up_bytes", "down_bytes"],
+                aggregate
+            )
+        )
+    
+    async def apply_retention(
+        self,
+        db: AsyncSession,
+        raw_before: datetime,
+        hourly_before: datetime,
+        daily_before: datetime
+    ) -> Dict[str, int]:
+        """
+        Delete samples and rollups older than their retention
+        
+        Raw samples and hourly rollups are only dropped once the coarser
+        period covering them has been rolled up.
+        
+        Returns:
+            Number of deleted rows per level
+        """
+        last_hour = await self.last_bucket(db, TrafficRollup.HOUR)
+        last_day = await self.last_bucket(db, TrafficRollup.DAY)
+        deleted = {"raw": 0, "hour": 0, "day": 0}
+        
+        if last_hour is not None:
+            cutoff = min(raw_before, last_hour + PERIOD_LENGTH[TrafficRollup.HOUR])
+            result = await db.execute(delete(TrafficSample).where(TrafficSample.bucket_at < cutoff))
+            deleted["raw"] = result.rowcount or 0
+        
+        if last_day is not None:
+            cutoff = min(hourly_before, last_day + PERIOD_LENGTH[TrafficRollup.DAY])
+            result = await db.execute(
+                delete(self.model).where(
+                    and_(self.model.period == TrafficRollup.HOUR, self.model.bucket_at < cutoff)
+                )
+            )
+            deleted["hour"] = result.rowcount or 0
+        
+        result = await db.execute(
+            delete(self.model).where(
+                and_(self.model.period == TrafficRollup.DAY, self.model.bucket_at < daily_before)
+            )
+        )
+        deleted["day"] = result.rowcount or 0
+        return deleted
+    
+    async def get_series(
+        self,
+        db: AsyncSession,
+        period: str,
+        since: datetime,
+        until: datetime,
+        server_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Get per-server traffic totals for each bucket of a period"""
+        conditions = [
+            self.model.period == period,
+            self.model.bucket_at >= since,
+            self.model.bucket_at < until,
+        ]
+        if server_id is not None:
+            conditions.append(self.model.server_id == server_id)
+        
+        result = await db.execute(
+            select(
+                self.model.bucket_at,
+                self.model.server_id,
+                func.sum(self.model.up_bytes),
+                func.sum(self.model.down_bytes),
+            )
+            .where(and_(*conditions))
+            .group_by(self.model.bucket_at, self.model.server_id)
+            .order_by(self.model.bucket_at, self.model.server_id)
+        )
+        return [
+            {"bucket_at": bucket_at, "server_id": sid, "up_bytes": int(up or 0), "down_bytes": int(down or 0)}
+            for bucket_at, sid, up, down in result.all()
+        ]
+    
+    async def get_top_consumers(
+        self,
+        db: AsyncSession,
+        since: datetime,
+        limit: int = 10,
+        server_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the clients with the most traffic since a moment
+        
+        Reads raw samples, which cover the most recent window at sync
+        resolution; longer windows should use get_series on rollups.
+        """
+        total = func.sum(TrafficSample.up_bytes + TrafficSample.down_bytes)
+        conditions = [TrafficSample.bucket_at >= since]
+        if server_id is not None:
+            conditions.append(TrafficSample.server_id == server_id)
+        
+        result = await db.execute(
+            select(
+                TrafficSample.sui_client_id,
+                TrafficSample.server_id,
+                func.max(TrafficSample.config_id),
+                func.sum(TrafficSample.up_bytes),
+                func.sum(TrafficSample.down_bytes),
+                total,
+            )
+            .where(and_(*conditions))
+            .group_by(TrafficSample.sui_client_id, TrafficSample.server_id)
+            .order_by(total.desc())
+            .limit(limit)
+        )
+        return [
+            {
+                "sui_client_id": client_id,
+                "server_id": sid,
+                "config_id": config_id,
+                "up_bytes": int(up or 0),
+                "down_bytes": int(down or 0),
+                "total_bytes": int(total_bytes or 0),
+            }
+            for client_id, sid, config_id, up, down, total_bytes in result.all()
+        ]
+
+
+usage_crud = CRUDUsageCursor(UsageCursor)
+traffic_crud = CRUDTrafficRollup(TrafficRollup)
@@ -5,6 +5,7 @@ from app.models.config import Config
 from app.models.order import Order
 from app.models.ticket import Ticket
 from app.models.finance import Expense
+from app.models.usage import UsageCursor, TrafficSample, TrafficRollup
 
-__all__ = ["User", "Server", "Config", "Order", "Ticket", "Expense"]
+__all__ = ["User", "Server", "Config", "Order", "Ticket", "Expense", "UsageCursor", "TrafficSample", "TrafficRollup"]
 
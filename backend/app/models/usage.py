@@ -0,0 +1,69 @@
+"""
+Usage tracking models
+"""
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, ForeignKey, Index, UniqueConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class UsageCursor(Base):
+    """Last seen traffic counters of a panel client, used to compute deltas"""
+    __tablename__ = "usage_cursors"
+    __table_args__ = (
+        UniqueConstraint("server_id", "sui_client_id", name="uq_usage_cursor_server_client"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    server_id = Column(Integer, ForeignKey("servers.id", ondelete="CASCADE"), nullable=False, index=True)
+    sui_client_id = Column(String(100), nullable=False)
+    up_bytes = Column(BigInteger, default=0, nullable=False)
+    down_bytes = Column(BigInteger, default=0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    
+    def __repr__(self):
+        return f"<UsageCursor(server_id={self.server_id}, client={self.sui_client_id}, up={self.up_bytes}, down={self.down_bytes})>"
+
+
+class TrafficSample(Base):
+    """Append-only traffic delta of a client between two usage syncs"""
+    __tablename__ = "traffic_samples"
+    __table_args__ = (
+        Index("ix_traffic_samples_server_bucket", "server_id", "bucket_at"),
+        Index("ix_traffic_samples_config_bucket", "config_id", "bucket_at"),
+    )
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    server_id = Column(Integer, ForeignKey("servers.id", ondelete="CASCADE"), nullable=False)
+    config_id = Column(Integer, ForeignKey("configs.id", ondelete="SET NULL"), nullable=True)
+    sui_client_id = Column(String(100), nullable=False)
+    bucket_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    up_bytes = Column(BigInteger, default=0, nullable=False)
+    down_bytes = Column(BigInteger, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<TrafficSample(client={self.sui_client_id}, bucket={self.bucket_at}, up={self.up_bytes}, down={self.down_bytes})>"
+
+
+class TrafficRollup(Base):
+    """Hourly or daily traffic totals of a client, downsampled from traffic samples"""
+    __tablename__ = "traffic_rollups"
+    __table_args__ = (
+        UniqueConstraint("period", "bucket_at", "server_id", "sui_client_id", name="uq_traffic_rollup_bucket"),
+        Index("ix_traffic_rollups_period_server_bucket", "period", "server_id", "bucket_at"),
+        Index("ix_traffic_rollups_period_bucket", "period", "bucket_at"),
+    )
+    
+    HOUR = "hour"
+    DAY = "day"
+    
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    period = Column(String(10), nullable=False)
+    bucket_at = Column(DateTime(timezone=True), nullable=False)
+    server_id = Column(Integer, ForeignKey("servers.id", ondelete="CASCADE"), nullable=False)
+    config_id = Column(Integer, ForeignKey("configs.id", ondelete="SET NULL"), nullable=True)
+    sui_client_id = Column(String(100), nullable=False)
+    up_bytes = Column(BigInteger, default=0, nullable=False)
+    down_bytes = Column(BigInteger, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f"<TrafficRollup(period={self.period}, bucket={self.bucket_at}, client={self.sui_client_id})>"
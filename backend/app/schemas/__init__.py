@@ -5,6 +5,7 @@ from app.schemas.config import *
 from app.schemas.order import *
 from app.schemas.ticket import *
 from app.schemas.finance import *
+from app.schemas.traffic import *
 from app.schemas.auth import *
 from app.schemas.common import *
 
@@ -0,0 +1,24 @@
+"""
+Traffic history schemas
+"""
+from pydantic import BaseModel, Field
+from typing import Optional
+from datetime import datetime
+
+
+class TrafficPoint(BaseModel):
+    """Traffic of one server in one bucket"""
+    bucket_at: datetime
+    server_id: int
+    up_bytes: int
+    down_bytes: int
+
+
+class TopConsumer(BaseModel):
+    """Client traffic over a recent window"""
+    sui_client_id: str
+    server_id: int
+    config_id: Optional[int] = None
+    up_bytes: int
+    down_bytes: int
+    total_bytes: int = Field(..., description="Upload plus download bytes")
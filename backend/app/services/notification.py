@@ -1,13 +1,42 @@
 """
 Notification service for Telegram notifications
 """
-from typing import Optional
+import asyncio
+import weakref
+from typing import Dict, Optional
 from loguru import logger
 from telegram import Bot
 from telegram.error import TelegramError
+from telegram.request import HTTPXRequest
 from app.core.config import settings
 
 
+# One Bot (and HTTP connection pool) per token and event loop. httpx pools are
+# bound to the loop they were opened on, so bots are never shared across loops;
+# entries disappear together with their loop.
+_bots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Bot]]" = weakref.WeakKeyDictionary()
+
+
+def get_shared_bot(token: str) -> Bot:
+    """
+    Get the Bot for a token on the running event loop
+    
+    Every NotificationService in the process (API requests, Celery tasks)
+    sends through it, so consecutive notifications reuse open connections to
+    api.telegram.org instead of reconnecting for each message.
+    """
+    loop = asyncio.get_running_loop()
+    bots = _bots.setdefault(loop, {})
+    bot = bots.get(token)
+    if bot is None:
+        bot = Bot(
+            token=token,
+            request=HTTPXRequest(connection_pool_size=settings.TELEGRAM_POOL_SIZE)
+        )
+        bots[token] = bot
+    return bot
+
+
 class NotificationService:
     """Service for sending notifications via Telegram"""
     
@@ -15,13 +44,17 @@ class NotificationService:
         """Initialize notification service"""
         self.bot_token = settings.TELEGRAM_BOT_TOKEN
         self.admin_id = settings.TELEGRAM_ADMIN_ID
-        self.bot: Optional[Bot] = None
-        
-        if self.bot_token:
-            try:
-                self.bot = Bot(token=self.bot_token)
-            except Exception as e:
-                logger.error(f"Failed to initialize Telegram bot: {str(e)}")
+    
+    @property
+    def bot(self) -> Optional[Bot]:
+        """Shared Bot of the running loop, or None if no token is configured"""
+        if not self.bot_token:
+            return None
+        try:
+            return get_shared_bot(self.bot_token)
+        except Exception as e:
+            logger.error(f"Failed to initialize Telegram bot: {str(e)}")
+            return None
     
     async def send_message(
         self,
@@ -40,12 +73,13 @@ class NotificationService:
         Returns:
             True if sent successfully, False otherwise
         """
-        if not self.bot:
+        bot = self.bot
+        if not bot:
             logger.warning("Telegram bot not initialized")
             return False
         
         try:
-            await self.bot.send_message(
+            await bot.send_message(
                 chat_id=chat_id,
                 text=message,
                 parse_mode=parse_mode
@@ -111,9 +145,10 @@ Status: {order.status.value}
         """.strip()
         
         try:
-            if telegram_message_id and self.bot:
+            bot = self.bot
+            if telegram_message_id and bot:
                 # Try to reply to original message
-                await self.bot.send_message(
+                await bot.send_message(
                     chat_id=str(user_tg_id),
                     text=message,
                     reply_to_message_id=telegram_message_id,
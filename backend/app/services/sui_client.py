@@ -2,8 +2,10 @@
 S-UI Panel Client
 Handles all interactions with S-UI panel API
 """
+import asyncio
+import json
 import httpx
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Tuple
 from loguru import logger
 from app.core.config import settings
 
@@ -45,6 +47,30 @@ class SUIClient:
         self.timeout = timeout or settings.SUI_DEFAULT_TIMEOUT
         self.max_retries = max_retries or settings.SUI_MAX_RETRIES
         self.base_url = f"{self.panel_url}/api/v1"
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_depth = 0
+    
+    async def __aenter__(self) -> "SUIClient":
+        """Open a shared keep-alive connection pool for the calls inside the block"""
+        if self._client is None:
+            limit = settings.SUI_USAGE_CONCURRENCY
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=limit,
+                    max_keepalive_connections=limit,
+                    keepalive_expiry=settings.SUI_KEEPALIVE_EXPIRY
+                )
+            )
+        self._client_depth += 1
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        """Close the shared pool when the outermost block exits"""
+        self._client_depth -= 1
+        if self._client_depth == 0 and self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     def _get_headers(self) -> Dict[str, str]:
         """Get request headers"""
@@ -78,15 +104,23 @@ class SUIClient:
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.request(
+            if self._client is not None:
+                response = await self._client.request(
                     method=method,
                     url=url,
                     headers=self._get_headers(),
                     json=data if data else None
                 )
-                response.raise_for_status()
-                return response.json()
+            else:
+                async with httpx.AsyncClient(timeout=self.timeout) as client:
+                    response = await client.request(
+                        method=method,
+                        url=url,
+                        headers=self._get_headers(),
+                        json=data if data else None
+                    )
+            response.raise_for_status()
+            return response.json()
         
         except httpx.HTTPStatusError as e:
             logger.error(f"S-UI API error: {e.response.status_code} - {e.response.text}")
@@ -276,30 +310,97 @@ class SUIClient:
             logger.error(f"Failed to get client usage: {str(e)}")
             raise
     
-    async def get_all_usage(self) -> Dict[str, float]:
+    async def get_usage_snapshot(self) -> Optional[Dict[str, Tuple[int, int]]]:
         """
-        Get usage for all clients
+        Get traffic counters of all clients from a single inbound listing call
+        
+        Panels that embed ``clientStats`` in their inbound list report traffic
+        for every client at once, keyed by email; the client ids come from the
+        inbound settings.
         
         Returns:
-            Dictionary mapping client_id to used_data_gb
+            Dictionary mapping client_id to (up, down) bytes, or None if the
+            panel does not expose client stats on inbounds
         """
         try:
-            clients = await self.list_clients()
-            usage_data = {}
+            response = await self._request("GET", "/inbounds")
+        except SUIClientError as e:
+            logger.debug(f"Inbound snapshot not available: {str(e)}")
+            return None
+        
+        inbounds = response.get("inbounds", response.get("obj")) if isinstance(response, dict) else response
+        if not isinstance(inbounds, list) or not any("clientStats" in inbound for inbound in inbounds):
+            return None
+        
+        counters = {}
+        for inbound in inbounds:
+            traffic_by_email = {
+                stat.get("email"): (stat.get("up") or 0, stat.get("down") or 0)
+                for stat in inbound.get("clientStats") or []
+            }
             
-            for client in clients:
-                client_id = client.get("id")
-                if client_id:
-                    try:
-                        usage = await self.get_client_usage(client_id)
-                        used_bytes = usage.get("used", 0)
-                        usage_data[client_id] = used_bytes / (1024 ** 3)  # Convert to GB
-                    except Exception as e:
-                        logger.warning(f"Failed to get usage for client {client_id}: {str(e)}")
-                        continue
+            inbound_settings = inbound.get("settings") or {}
+            if isinstance(inbound_settings, str):
+                inbound_settings = json.loads(inbound_settings or "{}")
             
-            return usage_data
+            for client in inbound_settings.get("clients", []):
+                client_id = client.get("id")
+                email = client.get("email")
+                if client_id and email in traffic_by_email:
+                    counters[client_id] = traffic_by_email[email]
+        
+        return counters
+    
+    async def get_traffic_counters(self) -> Dict[str, Tuple[int, int]]:
+        """
+        Get cumulative traffic counters for all clients
+        
+        Uses the single-call inbound snapshot when the panel supports it,
+        otherwise fetches per-client usage with bounded concurrency over one
+        keep-alive connection pool. Panels that only report a total are
+        counted as download.
+        
+        Returns:
+            Dictionary mapping client_id to (up, down) bytes
+        """
+        try:
+            async with self:
+                counters = await self.get_usage_snapshot()
+                if counters is not None:
+                    return counters
+                
+                clients = await self.list_clients()
+                semaphore = asyncio.Semaphore(settings.SUI_USAGE_CONCURRENCY)
+                
+                async def fetch(client_id: str) -> Optional[Tuple[int, int]]:
+                    async with semaphore:
+                        try:
+                            usage = await self.get_client_usage(client_id)
+                        except Exception as e:
+                            logger.warning(f"Failed to get usage for client {client_id}: {str(e)}")
+                            return None
+                        if "up" in usage or "down" in usage:
+                            return (usage.get("up") or 0, usage.get("down") or 0)
+                        return (0, usage.get("used") or 0)
+                
+                client_ids = [client.get("id") for client in clients if client.get("id")]
+                results = await asyncio.gather(*(fetch(client_id) for client_id in client_ids))
+                
+                return {
+                    client_id: traffic
+                    for client_id, traffic in zip(client_ids, results)
+                    if traffic is not None
+                }
         except Exception as e:
             logger.error(f"Failed to get all usage: {str(e)}")
             raise
-
+    
+    async def get_all_usage(self) -> Dict[str, int]:
+        """
+        Get usage for all clients
+        
+        Returns:
+            Dictionary mapping client_id to used bytes
+        """
+        counters = await self.get_traffic_counters()
+        return {client_id: up + down for client_id, (up, down) in counters.items()}
@@ -1,105 +1,123 @@
 """
 Config expiry and limit checking tasks
 """
-from celery import shared_task
+import asyncio
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
 from loguru import logger
-from datetime import datetime, timezone
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.async_runner import async_task
 from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
 from app.crud.config import config_crud
 from app.crud.server import server_crud
-from app.models.config import ConfigStatus
+from app.models.server import Server
 from app.services.sui_client import SUIClient, SUIClientError
 
 
-@shared_task
-def check_expired_configs():
+async def _delete_server_clients(server: Server, clients: List[Tuple[int, str]]) -> int:
+    """
+    Delete clients from one S-UI panel over a single pooled client
+
+    Args:
+        server: Server the clients live on
+        clients: (config ID, S-UI client ID) pairs
+
+    Returns:
+        Number of clients deleted
+    """
+    semaphore = asyncio.Semaphore(settings.SUI_USAGE_CONCURRENCY)
+
+    async def delete(config_id: int, sui_client_id: str) -> bool:
+        async with semaphore:
+            try:
+                return await sui_client.delete_client(sui_client_id)
+            except SUIClientError as e:
+                logger.error(f"Failed to disable config {config_id} in S-UI: {str(e)}")
+                return False
+
+    async with SUIClient(server.panel_url, server.api_key) as sui_client:
+        results = await asyncio.gather(
+            *(delete(config_id, sui_client_id) for config_id, sui_client_id in clients)
+        )
+    return sum(1 for deleted in results if deleted)
+
+
+async def remove_from_panels(
+    db: AsyncSession,
+    rows: List[Tuple[int, int, Optional[str]]]
+) -> int:
+    """
+    Delete the S-UI clients of configs that were just expired or disabled
+
+    Rows are grouped by server, the servers are loaded in one query and each
+    panel is worked through concurrently with its own connection pool.
+
+    Args:
+        db: Database session
+        rows: (config ID, server ID, S-UI client ID) as returned by config_crud
+
+    Returns:
+        Number of clients deleted
+    """
+    by_server: Dict[int, List[Tuple[int, str]]] = defaultdict(list)
+    for config_id, server_id, sui_client_id in rows:
+        if sui_client_id:
+            by_server[server_id].append((config_id, sui_client_id))
+    if not by_server:
+        return 0
+
+    servers = await server_crud.get_by_ids(db, by_server.keys())
+    for server_id in by_server.keys() - servers.keys():
+        logger.warning(f"Server {server_id} not found, {len(by_server[server_id])} clients left in S-UI")
+
+    results = await asyncio.gather(
+        *(
+            _delete_server_clients(server, by_server[server_id])
+            for server_id, server in servers.items()
+        ),
+        return_exceptions=True
+    )
+
+    deleted = 0
+    for server_id, result in zip(servers.keys(), results):
+        if isinstance(result, Exception):
+            logger.error(f"Error disabling configs on server {server_id}: {str(result)}")
+        else:
+            deleted += result
+    return deleted
+
+
+@async_task()
+async def check_expired_configs():
     """
     Check and disable expired configs
     Runs every hour
     """
     try:
-        from sqlalchemy.ext.asyncio import AsyncSession
-        from app.core.database import AsyncSessionLocal
-        
-        async def process_expired():
-            async with AsyncSessionLocal() as db:
-                expired_configs = await config_crud.get_expired_configs(db)
-                
-                for config in expired_configs:
-                    try:
-                        # Update status to expired
-                        await config_crud.update(
-                            db,
-                            config,
-                            {"status": ConfigStatus.EXPIRED}
-                        )
-                        
-                        # Disable in S-UI panel
-                        if config.sui_client_id:
-                            server = await server_crud.get(db, config.server_id)
-                            if server:
-                                sui_client = SUIClient(server.panel_url, server.api_key)
-                                try:
-                                    # Delete or disable client in S-UI
-                                    await sui_client.delete_client(config.sui_client_id)
-                                except SUIClientError as e:
-                                    logger.error(f"Failed to disable config {config.id} in S-UI: {str(e)}")
-                        
-                        logger.info(f"Disabled expired config {config.id}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing expired config {config.id}: {str(e)}")
-                        continue
-        
-        import asyncio
-        asyncio.run(process_expired())
-        
+        async with AsyncSessionLocal() as db:
+            rows = await config_crud.expire_due_configs(db)
+            deleted = await remove_from_panels(db, rows)
+
+            logger.info(f"Expired {len(rows)} configs, removed {deleted} clients from S-UI")
+
     except Exception as e:
         logger.error(f"Error in check_expired_configs task: {str(e)}")
 
 
-@shared_task
-def check_over_limit_configs():
+@async_task()
+async def check_over_limit_configs():
     """
     Check and disable configs that exceeded data limit
     Runs every hour
     """
     try:
-        from sqlalchemy.ext.asyncio import AsyncSession
-        from app.core.database import AsyncSessionLocal
-        
-        async def process_over_limit():
-            async with AsyncSessionLocal() as db:
-                over_limit_configs = await config_crud.get_over_limit_configs(db)
-                
-                for config in over_limit_configs:
-                    try:
-                        # Update status to disabled
-                        await config_crud.update(
-                            db,
-                            config,
-                            {"status": ConfigStatus.DISABLED}
-                        )
-                        
-                        # Disable in S-UI panel
-                        if config.sui_client_id:
-                            server = await server_crud.get(db, config.server_id)
-                            if server:
-                                sui_client = SUIClient(server.panel_url, server.api_key)
-                                try:
-                                    await sui_client.delete_client(config.sui_client_id)
-                                except SUIClientError as e:
-                                    logger.error(f"Failed to disable config {config.id} in S-UI: {str(e)}")
-                        
-                        logger.info(f"Disabled over-limit config {config.id}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing over-limit config {config.id}: {str(e)}")
-                        continue
-        
-        import asyncio
-        asyncio.run(process_over_limit())
-        
+        async with AsyncSessionLocal() as db:
+            rows = await config_crud.disable_over_limit_configs(db)
+            deleted = await remove_from_panels(db, rows)
+
+            logger.info(f"Disabled {len(rows)} over-limit configs, removed {deleted} clients from S-UI")
+
     except Exception as e:
         logger.error(f"Error in check_over_limit_configs task: {str(e)}")
-
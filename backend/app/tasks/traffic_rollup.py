@@ -0,0 +1,65 @@
+"""
+Traffic rollup tasks
+"""
+from datetime import datetime, timedelta, timezone
+from loguru import logger
+from app.core.async_runner import async_task
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.crud.usage import traffic_crud, truncate_bucket, PERIOD_LENGTH
+from app.models.usage import TrafficRollup
+
+
+@async_task()
+async def rollup_traffic():
+    """
+    Downsample traffic samples into hourly and daily rollups and apply retention
+    Runs every hour
+    """
+    try:
+        async with AsyncSessionLocal() as db:
+            now = datetime.now(timezone.utc)
+            raw_before = now - timedelta(hours=settings.TRAFFIC_RAW_RETENTION_HOURS)
+            
+            # Closed hours with samples since the last hourly rollup (within raw retention)
+            last_hour = await traffic_crud.last_bucket(db, TrafficRollup.HOUR)
+            since = truncate_bucket(raw_before, TrafficRollup.HOUR)
+            if last_hour is not None:
+                since = max(since, last_hour + PERIOD_LENGTH[TrafficRollup.HOUR])
+            start = await traffic_crud.next_source_bucket(db, TrafficRollup.HOUR, since)
+            
+            hours = 0
+            end = truncate_bucket(now, TrafficRollup.HOUR)
+            while start is not None and start < end:
+                await traffic_crud.rollup_bucket(db, TrafficRollup.HOUR, start)
+                hours += 1
+                start = await traffic_crud.next_source_bucket(
+                    db, TrafficRollup.HOUR, start + PERIOD_LENGTH[TrafficRollup.HOUR]
+                )
+            
+            # Closed days with hourly rollups since the last daily rollup
+            last_day = await traffic_crud.last_bucket(db, TrafficRollup.DAY)
+            since = last_day + PERIOD_LENGTH[TrafficRollup.DAY] if last_day is not None else None
+            start = await traffic_crud.next_source_bucket(db, TrafficRollup.DAY, since)
+            
+            days = 0
+            end = truncate_bucket(now, TrafficRollup.DAY)
+            while start is not None and start < end:
+                await traffic_crud.rollup_bucket(db, TrafficRollup.DAY, start)
+                days += 1
+                start = await traffic_crud.next_source_bucket(
+                    db, TrafficRollup.DAY, start + PERIOD_LENGTH[TrafficRollup.DAY]
+                )
+            
+            deleted = await traffic_crud.apply_retention(
+                db,
+                raw_before=raw_before,
+                hourly_before=now - timedelta(days=settings.TRAFFIC_HOURLY_RETENTION_DAYS),
+                daily_before=now - timedelta(days=settings.TRAFFIC_DAILY_RETENTION_DAYS),
+            )
+            await db.commit()
+            
+            logger.info(f"Rolled up {hours} hours and {days} days of traffic, deleted {deleted}")
+        
+    except Exception as e:
+        logger.error(f"Error in rollup_traffic task: {str(e)}")
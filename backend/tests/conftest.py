@@ -0,0 +1,8 @@
+"""
+Pytest configuration for the backend tests
+"""
+import os
+import sys
+
+# make the `app` package importable when pytest runs from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
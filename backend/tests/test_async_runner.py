@@ -0,0 +1,50 @@
+"""
+Unit tests for the async Celery task runner
+"""
+import asyncio
+
+import pytest
+
+from app.core.async_runner import async_task, get_runner
+
+
+calls = []
+
+
+@async_task(bind=True, max_retries=3, retry_on=(ConnectionError,), retry_countdown=60)
+async def flaky_task(self, value):
+    calls.append(self.request.retries)
+    if len(calls) == 1:
+        raise ConnectionError("panel unreachable")
+    return value
+
+
+@async_task()
+async def loop_task():
+    return asyncio.get_running_loop()
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+class TestAsyncTask:
+    """Test suite for async_task"""
+
+    def test_tasks_share_one_loop(self):
+        """Test that consecutive tasks run on the runner's loop"""
+        assert loop_task.apply().get() is get_runner().loop
+        assert loop_task.apply().get() is get_runner().loop
+
+    def test_bound_task_is_retried(self):
+        """Test that an exception from the coroutine is retried from the worker thread"""
+        result = flaky_task.apply(args=('ok',))
+
+        assert result.get() == 'ok'
+        assert len(calls) == 2
+
+    def test_retry_on_requires_bind(self):
+        """Test that retry_on is rejected for unbound tasks"""
+        with pytest.raises(ValueError):
+            async_task(retry_on=(Exception,))
@@ -59,6 +59,8 @@ from django.conf import settings
 from asgiref.sync import sync_to_async
 from xui_servers.models import XUIServer, XUIInbound, XUIClient, UserConfig
 from accounts.models import UsersModel
+from accounts.user_cache import get_user_cache
+from xui_servers.dashboard_stats import get_dashboard_stats, format_server_stats
 from plan.models import ConfingPlansModel
 from order.models import PayMentModel, OrderUserModel
 from chat_messages.models import MessageDirectory, MessageModel
@@ -261,34 +263,17 @@ class AdminBot:
             return
         
         try:
-            # آمار کلی - استفاده از sync_to_async
-            servers_count = await sync_to_async(XUIServer.objects.filter(is_active=True).count)()
-            inbounds_count = await sync_to_async(XUIInbound.objects.filter(is_active=True).count)()
-            clients_count = await sync_to_async(XUIClient.objects.filter(is_active=True).count)()
-            users_count = await sync_to_async(UsersModel.objects.count)()
-            configs_count = await sync_to_async(UserConfig.objects.filter(is_active=True).count)()
-            
-            # آمار کاربران منقضی شده
-            expired_configs = await sync_to_async(
-                lambda: UserConfig.objects.filter(
-                    is_active=True,
-                    expires_at__lt=timezone.now()
-                ).count()
-            )()
+            # آمار کلی از snapshot دوره‌ای (در صورت نبود، یک بار محاسبه می‌شود)
+            stats = await sync_to_async(get_dashboard_stats)()
+            servers_count = stats['active_servers']
+            inbounds_count = stats['active_inbounds']
+            clients_count = stats['active_clients']
+            users_count = stats['total_users']
+            configs_count = stats['active_configs']
+            expired_configs = stats['active_expired_configs']
             
             # آمار سرورها
-            server_stats = []
-            servers = await sync_to_async(list)(XUIServer.objects.filter(is_active=True))
-            for server in servers:
-                inbounds = await sync_to_async(list)(server.inbounds.filter(is_active=True))
-                total_clients = 0
-                for inbound in inbounds:
-                    clients_count_inbound = await sync_to_async(inbound.clients.count)()
-                    total_clients += clients_count_inbound
-                inbounds_count_server = len(inbounds)
-                server_stats.append(f"• {server.name}: {inbounds_count_server} inbound, {total_clients} کلاینت")
-            
-            stats_text = "\n".join(server_stats) if server_stats else "هیچ سروری یافت نشد"
+            stats_text = format_server_stats(stats)
             
             keyboard = [
                 [
@@ -2196,13 +2181,11 @@ class AdminBot:
         if user_id in ADMIN_USER_IDS:
             return True
         
-        # چک کردن از دیتابیس
+        # چک کردن از دیتابیس (از طریق کش کاربران)
         try:
-            user = await sync_to_async(UsersModel.objects.get)(telegram_id=user_id)
-            if user.is_admin or user.is_staff:
+            user = await get_user_cache().afind(user_id)
+            if user is not None and (user.is_admin or user.is_staff):
                 return True
-        except UsersModel.DoesNotExist:
-            pass
         except Exception as e:
             logger.error(f"خطا در بررسی دسترسی ادمین: {e}")
         
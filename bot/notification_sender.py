@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+ارسال‌کننده صف اعلان‌ها (notify:outbound)
+"""
+
+import os
+import sys
+import signal
+import asyncio
+import logging
+
+import django
+
+# اطمینان از اضافه شدن ریشه پروژه به مسیر پایتون
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+try:
+    from dotenv import load_dotenv
+    ENV_FILE = os.path.join(BASE_DIR, '.env')
+    if os.path.exists(ENV_FILE):
+        load_dotenv(ENV_FILE)
+    else:
+        load_dotenv()
+except ImportError:
+    pass  # dotenv not available, will use Django settings
+
+# تنظیم Django
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from xui_servers.notification_queue import NotificationSender
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+
+async def run():
+    """اجرای ارسال‌کننده تا دریافت SIGTERM/SIGINT"""
+    sender = NotificationSender()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, sender.stop)
+        except NotImplementedError:
+            pass  # Windows
+    await sender.run()
+
+
+def main():
+    """تابع اصلی"""
+    logger.info("🚀 شروع ارسال‌کننده اعلان‌ها...")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    logger.info("ارسال‌کننده اعلان‌ها متوقف شد")
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,7 @@ from telegram.ext import ContextTypes
 from asgiref.sync import sync_to_async
 from django.conf import settings
 from accounts.models import UsersModel
+from accounts.user_cache import get_user_cache
 
 logger = logging.getLogger(__name__)
 
@@ -63,13 +64,11 @@ async def is_admin(user_id: int) -> bool:
     if user_id in ADMIN_USER_IDS:
         return True
     
-    # Check database
+    # Check database (through the user cache)
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=user_id)
-        if user.is_admin or user.is_staff:
+        user = await get_user_cache().afind(user_id)
+        if user is not None and (user.is_admin or user.is_staff):
             return True
-    except UsersModel.DoesNotExist:
-        pass
     except Exception as e:
         logger.error(f"Error checking admin status: {e}")
     
@@ -111,19 +110,19 @@ def user_required(func):
         async def user_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # handler code
             # user object is available in context.user_data['user']
+    
+    The user is looked up through the user cache, so repeated button presses
+    do not query the database for identity.
     """
     @wraps(func)
     @error_handler
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args, **kwargs):
-        from accounts.models import UsersModel
-        from asgiref.sync import sync_to_async
-        
         user_id = update.effective_user.id
         
-        try:
-            user = await sync_to_async(UsersModel.objects.get)(telegram_id=user_id)
+        user = await get_user_cache().afind(user_id)
+        if user is not None:
             context.user_data['user'] = user
-        except UsersModel.DoesNotExist:
+        else:
             # Create user if doesn't exist
             user_data = update.effective_user
             user = await sync_to_async(UsersModel.objects.create)(
@@ -133,6 +132,7 @@ def user_required(func):
                 full_name=user_data.full_name or user_data.first_name or "کاربر",
                 username=user_data.username or ""
             )
+            get_user_cache().set(user)
             context.user_data['user'] = user
         
         return await func(update, context, *args, **kwargs)
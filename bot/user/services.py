@@ -2,13 +2,16 @@
 User bot business logic services
 """
 import logging
+from dataclasses import dataclass, field
 from typing import Optional, List, Dict, Any
 from datetime import timedelta
 from asgiref.sync import sync_to_async
+from django.db.models import Count, Q
 from django.utils import timezone
 from django.conf import settings
 
 from accounts.models import UsersModel
+from accounts.user_cache import get_user_cache
 from order.models import OrderUserModel, PayMentModel
 from plan.models import ConfingPlansModel
 from conf.models import ConfigUserModel, TrialConfigModel
@@ -24,6 +27,38 @@ from bot.shared.errors import (
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class ProfileSnapshot:
+    """
+    Everything the my_info / my_plans / my_config screens show, loaded at once
+
+    Expired configs are already filtered out, so handlers can format the
+    snapshot without touching the database again.
+    """
+    total_orders: int = 0
+    active_orders: int = 0
+    pending_orders: int = 0
+    active_configs: int = 0
+    trial_used: bool = False
+    trial_config: Optional[TrialConfigModel] = None
+    live_configs: List[UserConfig] = field(default_factory=list)
+    orders: List[OrderUserModel] = field(default_factory=list)
+    legacy_configs: List[ConfigUserModel] = field(default_factory=list)
+    
+    @property
+    def has_live_trial(self) -> bool:
+        return self.trial_config is not None or any(config.is_trial for config in self.live_configs)
+
+
+def _order_counts(user: UsersModel) -> Dict[str, int]:
+    """Total/active/pending order counts in a single aggregate query"""
+    return OrderUserModel.objects.filter(user=user).aggregate(
+        total_orders=Count('id'),
+        active_orders=Count('id', filter=Q(is_active=True)),
+        pending_orders=Count('id', filter=Q(is_active=False)),
+    )
+
+
 class UserBotService:
     """Service class for user bot business logic"""
     
@@ -40,13 +75,17 @@ class UserBotService:
             Tuple of (user, created)
         """
         try:
-            user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
-            # Update user info
+            user = await get_user_cache().aget(telegram_id)
+            # Update user info; the cached row may be stale, so only the
+            # Telegram fields are written back (is_admin, has_used_trial, ...
+            # may have changed elsewhere since it was cached)
             user.id_tel = str(user_data.id)
             user.username_tel = user_data.username or ""
             user.full_name = user_data.full_name or user_data.first_name or "کاربر"
             user.username = user_data.username or ""
-            await sync_to_async(user.save)()
+            await sync_to_async(user.save)(
+                update_fields=['id_tel', 'username_tel', 'full_name', 'username', 'updated_at']
+            )
             return user, False
         except UsersModel.DoesNotExist:
             # Create new user
@@ -74,7 +113,7 @@ class UserBotService:
             UserNotFoundError: If user not found
         """
         try:
-            return await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+            return await get_user_cache().aget(telegram_id)
         except UsersModel.DoesNotExist:
             raise UserNotFoundError(f"User with telegram_id {telegram_id} not found")
     
@@ -89,26 +128,72 @@ class UserBotService:
         Returns:
             Dictionary with user statistics
         """
-        total_orders = await sync_to_async(OrderUserModel.objects.filter(user=user).count)()
-        active_orders = await sync_to_async(
-            OrderUserModel.objects.filter(user=user, is_active=True).count
-        )()
-        pending_orders = await sync_to_async(
-            OrderUserModel.objects.filter(user=user, is_active=False).count
-        )()
-        xui_configs = await sync_to_async(
-            UserConfig.objects.filter(user=user, is_active=True).count
-        )()
-        trial_used = await sync_to_async(lambda: user.has_used_trial)()
+        snapshot = await UserBotService.get_profile_snapshot(user)
         
         return {
-            'total_orders': total_orders,
-            'active_orders': active_orders,
-            'pending_orders': pending_orders,
-            'xui_configs': xui_configs,
-            'trial_used': trial_used,
+            'total_orders': snapshot.total_orders,
+            'active_orders': snapshot.active_orders,
+            'pending_orders': snapshot.pending_orders,
+            'xui_configs': snapshot.active_configs,
+            'trial_used': snapshot.trial_used,
         }
     
+    @staticmethod
+    async def get_profile_snapshot(
+        user: UsersModel,
+        with_orders: bool = False,
+        with_legacy_configs: bool = False
+    ) -> ProfileSnapshot:
+        """
+        Load a user's profile screens in one thread hop and two or three queries
+        
+        Order counts come from one aggregate (or from the order list itself
+        when it is requested), configs are fetched with their server and plan,
+        and expiry is evaluated in Python on the loaded rows.
+        
+        Args:
+            user: UsersModel instance
+            with_orders: Also load the user's orders (with their plans)
+            with_legacy_configs: Also load the user's ConfigUserModel rows
+        
+        Returns:
+            ProfileSnapshot
+        """
+        def load() -> ProfileSnapshot:
+            snapshot = ProfileSnapshot(trial_used=user.has_used_trial)
+            
+            if with_orders:
+                snapshot.orders = list(
+                    OrderUserModel.objects.filter(user=user).select_related('plan').order_by('-created_at')
+                )
+                snapshot.total_orders = len(snapshot.orders)
+                snapshot.active_orders = sum(1 for order in snapshot.orders if order.is_active)
+                snapshot.pending_orders = snapshot.total_orders - snapshot.active_orders
+            else:
+                counts = _order_counts(user)
+                snapshot.total_orders = counts['total_orders']
+                snapshot.active_orders = counts['active_orders']
+                snapshot.pending_orders = counts['pending_orders']
+            
+            configs = list(
+                UserConfig.objects.filter(user=user, is_active=True)
+                .select_related('plan', 'server')
+                .order_by('-created_at')
+            )
+            snapshot.active_configs = len(configs)
+            snapshot.live_configs = [config for config in configs if not config.is_expired()]
+            
+            trial_config = TrialConfigModel.objects.filter(user=user).first()
+            if trial_config and not trial_config.is_expired():
+                snapshot.trial_config = trial_config
+            
+            if with_legacy_configs:
+                snapshot.legacy_configs = list(ConfigUserModel.objects.filter(user=user, is_active=True))
+            
+            return snapshot
+        
+        return await sync_to_async(load)()
+    
     @staticmethod
     async def get_user_plans(user: UsersModel) -> List[OrderUserModel]:
         """
@@ -135,15 +220,12 @@ class UserBotService:
         Returns:
             List of active configs
         """
-        configs = await sync_to_async(list)(
-            UserConfig.objects.filter(user=user, is_active=True).select_related('server', 'inbound')
-        )
-        # Filter out expired configs
-        active_configs = []
-        for config in configs:
-            if not await sync_to_async(config.is_expired)():
-                active_configs.append(config)
-        return active_configs
+        def load() -> List[UserConfig]:
+            configs = UserConfig.objects.filter(user=user, is_active=True).select_related('server', 'inbound')
+            # Filter out expired configs
+            return [config for config in configs if not config.is_expired()]
+        
+        return await sync_to_async(load)()
     
     @staticmethod
     async def can_get_trial(user: UsersModel) -> bool:
@@ -3,6 +3,7 @@ import sys
 import django
 import asyncio
 import datetime
+import html
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, MessageHandler, CallbackQueryHandler, filters
 from telegram.error import NetworkError, TimedOut
@@ -37,10 +38,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 django.setup()
 
 from accounts.models import UsersModel
+from accounts.user_cache import get_user_cache
+from xui_servers.dashboard_stats import get_dashboard_stats, format_server_stats
+from xui_servers.notification_queue import anotify_admins
 from order.models import OrderUserModel, PayMentModel
-from conf.models import ConfigUserModel, TrialConfigModel
+from conf.models import TrialConfigModel
 from plan.models import ConfingPlansModel
-from xui_servers.models import XUIServer, UserConfig, XUIInbound, XUIClient
+from xui_servers.models import XUIServer, UserConfig
 from chat_messages.models import MessageDirectory, MessageModel
 from xui_servers.services import UserConfigService
 from xui_servers.enhanced_api_models import (
@@ -514,76 +518,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # نمایش راهنمای مرحله به مرحله
             await show_start_tutorial(update, context)
             
-            # اطلاع به همه ادمین‌ها از کاربر جدید
+            # اطلاع به همه ادمین‌ها از کاربر جدید (از طریق صف اعلان‌ها، بدون انتظار برای ارسال)
             try:
-                from telegram import Bot
-                admin_bot_token = getattr(settings, 'ADMIN_BOT_TOKEN', '')
-                
-                if not admin_bot_token:
-                    admin_bot_token = getattr(settings, 'USER_BOT_TOKEN', '')
-                    logger.warning("⚠️ ADMIN_BOT_TOKEN تنظیم نشده، از USER_BOT_TOKEN استفاده می‌شود")
-                
-                if admin_bot_token:
-                    bot = Bot(token=admin_bot_token)
-                    
-                    # دریافت همه ادمین‌ها
-                    def get_all_admins():
-                        ADMIN_USER_IDS = getattr(settings, 'ADMIN_USER_IDS', [])
-                        admins = []
-                        
-                        # ادمین‌ها از ADMIN_USER_IDS (فقط آنهایی که telegram_id دارند)
-                        if ADMIN_USER_IDS:
-                            admin_users = UsersModel.objects.filter(telegram_id__in=ADMIN_USER_IDS).exclude(telegram_id__isnull=True)
-                            admins.extend(admin_users)
-                        
-                        # ادمین‌ها از دیتابیس (فقط آنهایی که telegram_id دارند)
-                        db_admins = (UsersModel.objects.filter(is_admin=True) | UsersModel.objects.filter(is_staff=True)).exclude(telegram_id__isnull=True)
-                        admins.extend(db_admins)
-                        
-                        # حذف تکراری‌ها و فیلتر کردن ادمین‌هایی که telegram_id معتبر دارند
-                        unique_admins = []
-                        seen_ids = set()
-                        for admin in admins:
-                            # بررسی اینکه telegram_id معتبر است (نه None و نه خالی)
-                            if admin.telegram_id and admin.telegram_id not in seen_ids:
-                                unique_admins.append(admin)
-                                seen_ids.add(admin.telegram_id)
-                        
-                        logger.info(f"🔍 تعداد ادمین‌های یافت شده: {len(unique_admins)}")
-                        return unique_admins
-                    
-                    all_admins = await sync_to_async(get_all_admins)()
-                    
-                    # پیام اطلاع‌رسانی
-                    admin_notification = (
-                        f"🆕 **کاربر جدید ثبت‌نام کرد!**\n\n"
-                        f"👤 **نام:** {user.full_name}\n"
-                        f"🆔 **ID تلگرام:** `{telegram_id}`\n"
-                        f"📱 **یوزرنیم:** @{user.username or 'بدون یوزرنیم'}\n"
-                        f"📅 **تاریخ ثبت‌نام:** {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-                        f"✅ کاربر با موفقیت در سیستم ثبت شد."
-                    )
-                    
-                    # ارسال به همه ادمین‌ها
-                    sent_count = 0
-                    for admin_user in all_admins:
-                        # بررسی اینکه ادمین telegram_id معتبر دارد
-                        if not admin_user.telegram_id:
-                            logger.warning(f"⚠️ ادمین {admin_user.id} telegram_id ندارد، رد شد")
-                            continue
-                        
-                        try:
-                            await bot.send_message(
-                                chat_id=admin_user.telegram_id,
-                                text=admin_notification,
-                                parse_mode='Markdown'
-                            )
-                            sent_count += 1
-                            logger.info(f"✅ اطلاع کاربر جدید به ادمین ارسال شد: Admin ID: {admin_user.telegram_id}, User ID: {telegram_id}")
-                        except Exception as e:
-                            logger.error(f"❌ خطا در ارسال به ادمین {admin_user.telegram_id}: {e}")
-                    
-                    logger.info(f"✅ اطلاع کاربر جدید به {sent_count} ادمین ارسال شد (از {len(all_admins)} ادمین)")
+                admin_notification = (
+                    f"🆕 **کاربر جدید ثبت‌نام کرد!**\n\n"
+                    f"👤 **نام:** {user.full_name}\n"
+                    f"🆔 **ID تلگرام:** `{telegram_id}`\n"
+                    f"📱 **یوزرنیم:** @{user.username or 'بدون یوزرنیم'}\n"
+                    f"📅 **تاریخ ثبت‌نام:** {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+                    f"✅ کاربر با موفقیت در سیستم ثبت شد."
+                )
+                queued = await anotify_admins(admin_notification, parse_mode='Markdown')
+                logger.info(f"✅ اطلاع کاربر جدید برای {queued} ادمین در صف قرار گرفت")
             except Exception as e:
                 logger.error(f"❌ خطا در اطلاع کاربر جدید به ادمین‌ها: {e}", exc_info=True)
             
@@ -641,30 +587,17 @@ async def my_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """نمایش اطلاعات کاربر"""
     telegram_id = update.effective_user.id
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         
-        # محاسبه آمار کاربر
-        total_orders_count = await sync_to_async(OrderUserModel.objects.filter(user=user).count)()
-        active_orders_count = await sync_to_async(OrderUserModel.objects.filter(user=user, is_active=True).count)()
-        pending_orders_count = await sync_to_async(OrderUserModel.objects.filter(user=user, is_active=False).count)()
-        
-        # بررسی کانفیگ‌های X-UI
-        xui_configs_count = await sync_to_async(UserConfig.objects.filter(user=user, is_active=True).count)()
+        # آمار کاربر در یک بار مراجعه به دیتابیس
+        snapshot = await UserBotService.get_profile_snapshot(user)
+        total_orders_count = snapshot.total_orders
+        active_orders_count = snapshot.active_orders
+        pending_orders_count = snapshot.pending_orders
+        xui_configs_count = snapshot.active_configs
         
-        # بررسی پلن تستی استفاده شده
-        trial_used = await sync_to_async(lambda: user.has_used_trial)()
-        trial_text = "✅ استفاده شده" if trial_used else "❌ استفاده نشده"
-        
-        # بررسی کانفیگ تستی فعال
-        trial_config_active = False
-        try:
-            trial_configs = await sync_to_async(list)(UserConfig.objects.filter(user=user, is_active=True))
-            for config in trial_configs:
-                if not await sync_to_async(config.is_expired)():
-                    trial_config_active = True
-                    break
-        except:
-            pass
+        trial_text = "✅ استفاده شده" if snapshot.trial_used else "❌ استفاده نشده"
+        trial_config_active = snapshot.has_live_trial
         
         trial_status = "🟢 فعال" if trial_config_active else "🔴 غیرفعال"
         
@@ -717,7 +650,7 @@ async def trial_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """دریافت پلن تستی - فقط یک بار برای هر کاربر"""
     telegram_id = update.effective_user.id
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         
         # بررسی اینکه آیا کاربر قبلاً پلن تستی گرفته است
         can_get_trial = await sync_to_async(user.can_get_trial)()
@@ -758,26 +691,14 @@ async def trial_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
             return
         
-        # بررسی سرورهای فعال
-        active_servers = await sync_to_async(list)(XUIServer.objects.filter(is_active=True))
-        if not active_servers:
-            await update.message.reply_text(
-                "❌ **هیچ سرور فعالی یافت نشد.**\n\n"
-                "لطفا با ادمین تماس بگیرید.",
-                parse_mode='Markdown'
-            )
-            return
-        
-        # انتخاب اولین سرور فعال
-        server = active_servers[0]
-        
         # استفاده از سرویس X-UI برای ایجاد کانفیگ تستی
         try:
-            from xui_servers.enhanced_api_models import XUIClientManager, XUIInboundManager
+            from xui_servers.enhanced_api_models import XUIClientManager
+            from xui_servers.placement import PlacementEngine
             
-            # یافتن inbound مناسب
-            inbound_manager = XUIInboundManager(server)
-            inbound = await sync_to_async(inbound_manager.find_best_inbound)("vless")
+            # رزرو اسلات روی کم‌بارترین inbound (از ایندکس ظرفیت)
+            placement = PlacementEngine()
+            inbound = await sync_to_async(placement.reserve)("vless", server_type='xui')
             
             if not inbound:
                 await update.message.reply_text(
@@ -787,9 +708,13 @@ async def trial_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 )
                 return
             
+            server = inbound.server
+            
             # ایجاد کانفیگ تستی با X-UI
             client_manager = XUIClientManager(server)
             user_config = await client_manager.create_trial_config_async(user, inbound)
+            if not user_config:
+                await sync_to_async(placement.release)(inbound)
             
             if user_config:
                 # علامت‌گذاری استفاده از پلن تستی
@@ -835,7 +760,7 @@ async def trial_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def buy_plan(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         
         # دریافت پلن‌های غیرحذف شده از دیتابیس
         # SoftManager به صورت خودکار فقط is_deleted=False یا is_deleted=None را برمی‌گرداند
@@ -966,7 +891,7 @@ async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TY
     
     try:
         plan = await sync_to_async(ConfingPlansModel.objects.get)(id=plan_id)
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         
         # ذخیره انتخاب کاربر
         context.user_data['selected_plan'] = plan_id
@@ -1021,30 +946,18 @@ async def handle_free_plan_confirm(update: Update, context: ContextTypes.DEFAULT
         return
     
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         plan_id = context.user_data.get('selected_plan')
         plan = await sync_to_async(ConfingPlansModel.objects.get)(id=plan_id)
         
-        # بررسی سرورهای فعال
-        active_servers = await sync_to_async(list)(XUIServer.objects.filter(is_active=True))
-        if not active_servers:
-            await update.message.reply_text(
-                "❌ **هیچ سرور فعالی یافت نشد.**\n\n"
-                "لطفا با ادمین تماس بگیرید.",
-                parse_mode='Markdown'
-            )
-            return
-        
-        # انتخاب اولین سرور فعال
-        server = active_servers[0]
-        
         # استفاده از سرویس X-UI برای ایجاد کانفیگ پولی
         try:
-            from xui_servers.enhanced_api_models import XUIClientManager, XUIInboundManager
+            from xui_servers.enhanced_api_models import XUIClientManager
+            from xui_servers.placement import PlacementEngine
             
-            # یافتن inbound مناسب
-            inbound_manager = XUIInboundManager(server)
-            inbound = await sync_to_async(inbound_manager.find_best_inbound)("vless")
+            # رزرو اسلات روی کم‌بارترین inbound (از ایندکس ظرفیت)
+            placement = PlacementEngine()
+            inbound = await sync_to_async(placement.reserve)("vless", server_type='xui')
             
             if not inbound:
                 await update.message.reply_text(
@@ -1054,9 +967,13 @@ async def handle_free_plan_confirm(update: Update, context: ContextTypes.DEFAULT
                 )
                 return
             
+            server = inbound.server
+            
             # ایجاد کانفیگ پولی با X-UI
             client_manager = XUIClientManager(server)
             user_config = await client_manager.create_user_config_async(user, plan, inbound)
+            if not user_config:
+                await sync_to_async(placement.release)(inbound)
             
             if user_config:
                 # ایجاد سفارش رایگان
@@ -1109,7 +1026,7 @@ async def handle_payment_receipt(update: Update, context: ContextTypes.DEFAULT_T
         return
     
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         plan_id = context.user_data.get('selected_plan')
         plan = await sync_to_async(ConfingPlansModel.objects.get)(id=plan_id)
         
@@ -1209,77 +1126,73 @@ async def handle_payment_receipt(update: Update, context: ContextTypes.DEFAULT_T
 async def my_plans(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
+        
+        snapshot = await UserBotService.get_profile_snapshot(user, with_orders=True)
         
         response = "📦 **پلن‌های شما:**\n\n"
+        has_plans = False
         
         # بررسی کانفیگ تستی
-        try:
-            trial_config = await sync_to_async(lambda: hasattr(user, 'trial_config') and user.trial_config)()
-            if trial_config and not await sync_to_async(trial_config.is_expired)():
-                remaining_time = await sync_to_async(trial_config.get_remaining_time)()
-                hours = int(remaining_time.total_seconds() // 3600)
-                minutes = int((remaining_time.total_seconds() % 3600) // 60)
-                
-                response += (
-                    f"🎁 **پلن تستی**\n"
-                    f"📊 حجم: 1GB\n"
-                    f"⏰ اعتبار: {hours} ساعت و {minutes} دقیقه باقی\n\n"
-                )
-        except:
-            pass
+        if snapshot.trial_config:
+            has_plans = True
+            remaining_time = snapshot.trial_config.get_remaining_time()
+            hours = int(remaining_time.total_seconds() // 3600)
+            minutes = int((remaining_time.total_seconds() % 3600) // 60)
+            
+            response += (
+                f"🎁 **پلن تستی**\n"
+                f"📊 حجم: 1GB\n"
+                f"⏰ اعتبار: {hours} ساعت و {minutes} دقیقه باقی\n\n"
+            )
         
         # بررسی کانفیگ‌های X-UI
-        xui_configs = await sync_to_async(list)(UserConfig.objects.filter(user=user, is_active=True))
-        for config in xui_configs:
-            if not await sync_to_async(config.is_expired)():
-                remaining_time = await sync_to_async(config.get_remaining_time)()
-                if remaining_time:
-                    hours = int(remaining_time.total_seconds() // 3600)
-                    minutes = int((remaining_time.total_seconds() % 3600) // 60)
-                    time_text = f"{hours} ساعت و {minutes} دقیقه باقی"
-                else:
-                    time_text = "نامحدود"
-                
-                response += (
-                    f"🔧 **{config.config_name}**\n"
-                    f"🖥️ سرور: {config.server.name}\n"
-                    f"⏰ اعتبار: {time_text}\n\n"
-                )
+        for config in snapshot.live_configs:
+            has_plans = True
+            remaining_time = config.get_remaining_time()
+            if remaining_time:
+                hours = int(remaining_time.total_seconds() // 3600)
+                minutes = int((remaining_time.total_seconds() % 3600) // 60)
+                time_text = f"{hours} ساعت و {minutes} دقیقه باقی"
+            else:
+                time_text = "نامحدود"
+            
+            response += (
+                f"🔧 **{config.config_name}**\n"
+                f"🖥️ سرور: {config.server.name}\n"
+                f"⏰ اعتبار: {time_text}\n\n"
+            )
         
         # بررسی سفارشات پولی
-        orders = await sync_to_async(list)(OrderUserModel.objects.filter(user=user, is_deleted=False).order_by('-created_at'))
-        if orders:
-            for order in orders:
-                status = "✅ فعال" if order.is_active else "⏳ در انتظار تایید"
-                status_emoji = "🟢" if order.is_active else "🟡"
-                
-                # محاسبه زمان باقی‌مانده
-                if order.is_active:
-                    remaining = order.end_plane_at - timezone.now()
-                    if remaining.total_seconds() > 0:
-                        days = int(remaining.total_seconds() // 86400)
-                        time_text = f"{days} روز باقی"
-                    else:
-                        time_text = "منقضی شده"
+        now = timezone.now()
+        for order in snapshot.orders:
+            status = "✅ فعال" if order.is_active else "⏳ در انتظار تایید"
+            status_emoji = "🟢" if order.is_active else "🟡"
+            
+            # محاسبه زمان باقی‌مانده
+            if order.is_active and order.end_plane_at:
+                remaining = order.end_plane_at - now
+                if remaining.total_seconds() > 0:
+                    days = int(remaining.total_seconds() // 86400)
+                    time_text = f"{days} روز باقی"
                 else:
-                    time_text = "در انتظار تایید"
-                
-                traffic_gb = await sync_to_async(order.plans.get_traffic_gb)()
-                
-                response += (
-                    f"{status_emoji} **{order.plans.name}**\n"
-                    f"💰 قیمت: `{order.plans.price:,}` تومان\n"
-                    f"📊 حجم: `{traffic_gb:.2f}` GB\n"
-                    f"📅 شروع: {order.start_plane_at.strftime('%Y/%m/%d')}\n"
-                    f"📅 پایان: {order.end_plane_at.strftime('%Y/%m/%d')}\n"
-                    f"⏰ باقی‌مانده: {time_text}\n"
-                    f"🔸 وضعیت: {status}\n\n"
-                )
-                has_plans = True
-        else:
-            if not trial_used:
-                response += "❗ هیچ پلنی یافت نشد.\n\n"
+                    time_text = "منقضی شده"
+            else:
+                time_text = "در انتظار تایید"
+            
+            start_text = order.start_plane_at.strftime('%Y/%m/%d') if order.start_plane_at else "-"
+            end_text = order.end_plane_at.strftime('%Y/%m/%d') if order.end_plane_at else "-"
+            
+            response += (
+                f"{status_emoji} **{order.plan.name}**\n"
+                f"💰 قیمت: `{order.plan.price:,}` تومان\n"
+                f"📊 حجم: `{order.plan.get_traffic_gb():.2f}` GB\n"
+                f"📅 شروع: {start_text}\n"
+                f"📅 پایان: {end_text}\n"
+                f"⏰ باقی‌مانده: {time_text}\n"
+                f"🔸 وضعیت: {status}\n\n"
+            )
+            has_plans = True
         
         if not has_plans:
             response += "❗ هیچ پلن فعالی ندارید.\n\n"
@@ -1310,7 +1223,7 @@ async def contact_us(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
     
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         
         # پیدا کردن یا ایجاد ادمین
         ADMIN_USER_IDS = getattr(settings, 'ADMIN_USER_IDS', [])
@@ -1408,171 +1321,40 @@ async def contact_us(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=main_keyboard
         )
         
-        # اطلاع فوری به همه ادمین‌ها
-        logger.info(f"🚀 شروع ارسال اطلاع تیکت به ادمین‌ها - Ticket ID: {ticket.id}")
+        # اطلاع به همه ادمین‌ها از طریق صف اعلان‌ها (ارسال توسط notification_sender)
         try:
-            from telegram import Bot
-            from telegram.error import TelegramError, BadRequest, Forbidden, NetworkError, TimedOut
-            
-            # استفاده از ADMIN_BOT_TOKEN برای ارسال به ادمین
-            admin_bot_token = getattr(settings, 'ADMIN_BOT_TOKEN', '')
-            logger.info(f"🔍 ADMIN_BOT_TOKEN از settings: {'موجود' if admin_bot_token else 'خالی'}")
+            keyboard = [
+                [
+                    InlineKeyboardButton("✅ تایید و ایجاد کلاینت", callback_data=f"approve_ticket_{ticket.id}"),
+                    InlineKeyboardButton("💬 پاسخ", callback_data=f"reply_ticket_{ticket.id}")
+                ],
+                [
+                    InlineKeyboardButton("❌ بستن", callback_data=f"close_ticket_{ticket.id}"),
+                    InlineKeyboardButton("📋 مشاهده تیکت‌ها", callback_data="admin_tickets")
+                ]
+            ]
             
-            if not admin_bot_token:
-                # اگر ADMIN_BOT_TOKEN تنظیم نشده، از USER_BOT_TOKEN استفاده می‌کنیم
-                admin_bot_token = getattr(settings, 'USER_BOT_TOKEN', '')
-                logger.warning("⚠️ ADMIN_BOT_TOKEN تنظیم نشده، از USER_BOT_TOKEN استفاده می‌شود")
+            # استفاده از HTML برای جلوگیری از مشکلات Markdown
+            admin_message = (
+                f"💬 <b>تیکت جدید ثبت شد!</b>\n\n"
+                f"👤 <b>کاربر:</b> {html.escape(user.full_name or 'بدون نام')}\n"
+                f"🆔 <b>ID:</b> <code>{user.telegram_id}</code>\n"
+                f"📱 <b>یوزرنیم:</b> @{html.escape(user.username or 'بدون یوزرنیم')}\n"
+                f"🆔 <b>شماره تیکت:</b> <code>{ticket.id}</code>\n\n"
+                f"💡 منتظر پیام کاربر باشید..."
+            )
             
-            if not admin_bot_token:
-                logger.error("❌ هیچ توکنی برای ارسال به ادمین یافت نشد!")
+            queued = await anotify_admins(
+                admin_message,
+                parse_mode='HTML',
+                reply_markup=InlineKeyboardMarkup(keyboard).to_dict()
+            )
+            if queued:
+                logger.info(f"✅ اطلاع تیکت {ticket.id} برای {queued} ادمین در صف قرار گرفت")
             else:
-                logger.info(f"🔑 استفاده از توکن برای ارسال به ادمین: {admin_bot_token[:20]}...")
-                bot = Bot(token=admin_bot_token)
-                # تست اتصال با getMe (اختیاری)
-                try:
-                    def get_bot_info():
-                        return bot.get_me()
-                    bot_info = await sync_to_async(get_bot_info)()
-                    logger.info(f"✅ اتصال به ربات برقرار شد: @{bot_info.username if bot_info else 'Unknown'}")
-                except Exception as e:
-                    logger.warning(f"⚠️ نتوانست اطلاعات ربات را دریافت کند (اما ادامه می‌دهد): {e}")
-                
-                keyboard = [
-                    [
-                        InlineKeyboardButton("✅ تایید و ایجاد کلاینت", callback_data=f"approve_ticket_{ticket.id}"),
-                        InlineKeyboardButton("💬 پاسخ", callback_data=f"reply_ticket_{ticket.id}")
-                    ],
-                    [
-                        InlineKeyboardButton("❌ بستن", callback_data=f"close_ticket_{ticket.id}"),
-                        InlineKeyboardButton("📋 مشاهده تیکت‌ها", callback_data="admin_tickets")
-                    ]
-                ]
-                
-                # استفاده از HTML برای جلوگیری از مشکلات Markdown
-                admin_message = (
-                    f"💬 <b>تیکت جدید ثبت شد!</b>\n\n"
-                    f"👤 <b>کاربر:</b> {user.full_name or 'بدون نام'}\n"
-                    f"🆔 <b>ID:</b> <code>{user.telegram_id}</code>\n"
-                    f"📱 <b>یوزرنیم:</b> @{user.username or 'بدون یوزرنیم'}\n"
-                    f"🆔 <b>شماره تیکت:</b> <code>{ticket.id}</code>\n\n"
-                    f"💡 منتظر پیام کاربر باشید..."
-                )
-                
-                # ارسال به همه ادمین‌ها
-                def get_all_admins():
-                    ADMIN_USER_IDS = getattr(settings, 'ADMIN_USER_IDS', [])
-                    admins = []
-                    
-                    # ادمین‌ها از ADMIN_USER_IDS (فقط آنهایی که telegram_id دارند)
-                    if ADMIN_USER_IDS:
-                        admin_users = UsersModel.objects.filter(telegram_id__in=ADMIN_USER_IDS).exclude(telegram_id__isnull=True)
-                        admins.extend(admin_users)
-                    
-                    # ادمین‌ها از دیتابیس (فقط آنهایی که telegram_id دارند)
-                    db_admins = (UsersModel.objects.filter(is_admin=True) | UsersModel.objects.filter(is_staff=True)).exclude(telegram_id__isnull=True)
-                    admins.extend(db_admins)
-                    
-                    # حذف تکراری‌ها و فیلتر کردن ادمین‌هایی که telegram_id معتبر دارند
-                    unique_admins = []
-                    seen_ids = set()
-                    for admin in admins:
-                        # بررسی اینکه telegram_id معتبر است (نه None و نه خالی)
-                        if admin.telegram_id and admin.telegram_id not in seen_ids:
-                            unique_admins.append(admin)
-                            seen_ids.add(admin.telegram_id)
-                    
-                    logger.info(f"🔍 تعداد ادمین‌های یافت شده: {len(unique_admins)}")
-                    return unique_admins
-                
-                all_admins = await sync_to_async(get_all_admins)()
-                logger.info(f"📊 تعداد ادمین‌های یافت شده: {len(all_admins) if all_admins else 0}")
-                
-                if not all_admins:
-                    logger.warning("⚠️ هیچ ادمینی برای ارسال تیکت یافت نشد!")
-                    logger.warning("⚠️ لطفاً ADMIN_USER_IDS را در config.env بررسی کنید!")
-                else:
-                    # ارسال به همه ادمین‌ها
-                    sent_count = 0
-                    failed_count = 0
-                    logger.info(f"📤 شروع ارسال به {len(all_admins)} ادمین...")
-                    for admin_user in all_admins:
-                        logger.info(f"📨 در حال ارسال به ادمین: ID={admin_user.telegram_id}, Name={admin_user.full_name}")
-                        # بررسی اینکه ادمین telegram_id معتبر دارد
-                        if not admin_user.telegram_id:
-                            logger.warning(f"⚠️ ادمین {admin_user.id} telegram_id ندارد، رد شد")
-                            continue
-                        
-                        try:
-                            # تلاش برای ارسال با HTML
-                            try:
-                                logger.info(f"📤 ارسال پیام به ادمین {admin_user.telegram_id}...")
-                                result = await bot.send_message(
-                                    chat_id=admin_user.telegram_id,
-                                    text=admin_message,
-                                    parse_mode='HTML',
-                                    reply_markup=InlineKeyboardMarkup(keyboard)
-                                )
-                                sent_count += 1
-                                logger.info(f"✅✅✅ اطلاع تیکت به ادمین ارسال شد: Admin ID: {admin_user.telegram_id}, Ticket ID: {ticket.id}, Message ID: {result.message_id}")
-                            except BadRequest as e:
-                                # اگر HTML مشکل داشت، بدون parse_mode امتحان می‌کنیم
-                                logger.warning(f"⚠️ خطا در ارسال با HTML، تلاش بدون parse_mode: {e}")
-                                try:
-                                    admin_message_plain = (
-                                        f"💬 تیکت جدید ثبت شد!\n\n"
-                                        f"👤 کاربر: {user.full_name or 'بدون نام'}\n"
-                                        f"🆔 ID: {user.telegram_id}\n"
-                                        f"📱 یوزرنیم: @{user.username or 'بدون یوزرنیم'}\n"
-                                        f"🆔 شماره تیکت: {ticket.id}\n\n"
-                                        f"💡 منتظر پیام کاربر باشید..."
-                                    )
-                                    await bot.send_message(
-                                        chat_id=admin_user.telegram_id,
-                                        text=admin_message_plain,
-                                        reply_markup=InlineKeyboardMarkup(keyboard)
-                                    )
-                                    sent_count += 1
-                                    logger.info(f"✅ اطلاع تیکت به ادمین ارسال شد (بدون parse_mode): Admin ID: {admin_user.telegram_id}, Ticket ID: {ticket.id}")
-                                except Exception as e2:
-                                    logger.error(f"❌ خطا در ارسال به ادمین {admin_user.telegram_id} (بدون parse_mode): {e2}")
-                                    failed_count += 1
-                            except Forbidden as e:
-                                logger.error(f"❌ ربات توسط ادمین {admin_user.telegram_id} بلاک شده است: {e}")
-                                failed_count += 1
-                            except (NetworkError, TimedOut) as e:
-                                logger.warning(f"⚠️ خطای شبکه در ارسال به ادمین {admin_user.telegram_id}: {e}")
-                                # تلاش مجدد یک بار
-                                try:
-                                    await asyncio.sleep(2)
-                                    await bot.send_message(
-                                        chat_id=admin_user.telegram_id,
-                                        text=admin_message,
-                                        parse_mode='HTML',
-                                        reply_markup=InlineKeyboardMarkup(keyboard)
-                                    )
-                                    sent_count += 1
-                                    logger.info(f"✅ اطلاع تیکت به ادمین ارسال شد (بعد از retry): Admin ID: {admin_user.telegram_id}, Ticket ID: {ticket.id}")
-                                except Exception as e2:
-                                    logger.error(f"❌ خطا در ارسال مجدد به ادمین {admin_user.telegram_id}: {e2}")
-                                    failed_count += 1
-                            except TelegramError as e:
-                                logger.error(f"❌ خطای تلگرام در ارسال به ادمین {admin_user.telegram_id}: {e}")
-                                failed_count += 1
-                            except Exception as e:
-                                logger.error(f"❌ خطای غیرمنتظره در ارسال به ادمین {admin_user.telegram_id}: {e}", exc_info=True)
-                                failed_count += 1
-                        except Exception as e:
-                            logger.error(f"❌ خطای غیرمنتظره در پردازش ادمین {admin_user.telegram_id}: {e}", exc_info=True)
-                            failed_count += 1
-                    
-                    logger.info(f"📊 نتیجه ارسال: {sent_count} موفق، {failed_count} ناموفق (از {len(all_admins)} ادمین)")
-                    if sent_count == 0:
-                        logger.error("❌❌❌ هیچ پیامی به ادمین ارسال نشد! لطفاً لاگ‌های بالا را بررسی کنید!")
-                    else:
-                        logger.info(f"✅✅✅ {sent_count} پیام با موفقیت به ادمین‌ها ارسال شد!")
+                logger.warning("⚠️ هیچ ادمینی برای ارسال تیکت یافت نشد! لطفاً ADMIN_USER_IDS را بررسی کنید!")
         except Exception as e:
-            logger.error(f"❌❌❌ خطا در اطلاع به ادمین‌ها: {e}", exc_info=True)
-            logger.error(f"❌ نوع خطا: {type(e).__name__}")
+            logger.error(f"❌ خطا در اطلاع به ادمین‌ها: {e}", exc_info=True)
             # حتی اگر ارسال به ادمین با خطا مواجه شد، تیکت ثبت شده است
         
     except UsersModel.DoesNotExist:
@@ -1634,7 +1416,7 @@ async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYP
         # بستن تیکت
         if text.lower() in ['بستن تیکت', 'بستن', 'close ticket', 'close']:
             try:
-                user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+                user = await get_user_cache().aget(telegram_id)
                 ticket = await sync_to_async(
                     MessageDirectory.objects.filter(user=user, is_deleted=False).first
                 )()
@@ -1663,7 +1445,7 @@ async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYP
         else:
             # ارسال پیام به تیکت
             try:
-                user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+                user = await get_user_cache().aget(telegram_id)
                 
                 # دریافت ticket_id از context
                 ticket_id = context.user_data.get('active_ticket_id')
@@ -1777,152 +1559,38 @@ async def handle_text_messages(update: Update, context: ContextTypes.DEFAULT_TYP
                 message = await sync_to_async(save_message)()
                 logger.info(f"✅ پیام کاربر در دیتابیس ذخیره شد: Message ID: {message.id}, Ticket ID: {ticket.id}")
                 
-                # ارسال فوری به همه ادمین‌ها
+                # ارسال به همه ادمین‌ها از طریق صف اعلان‌ها (ارسال توسط notification_sender)
                 try:
-                    from telegram import Bot
-                    from telegram.error import TelegramError, BadRequest, Forbidden, NetworkError, TimedOut
-                    
-                    # استفاده از ADMIN_BOT_TOKEN برای ارسال به ادمین
-                    admin_bot_token = getattr(settings, 'ADMIN_BOT_TOKEN', '')
+                    keyboard = [
+                        [
+                            InlineKeyboardButton("✅ تایید و ایجاد کلاینت", callback_data=f"approve_ticket_{ticket.id}"),
+                            InlineKeyboardButton("💬 پاسخ", callback_data=f"reply_ticket_{ticket.id}")
+                        ],
+                        [
+                            InlineKeyboardButton("❌ بستن", callback_data=f"close_ticket_{ticket.id}"),
+                            InlineKeyboardButton("📋 مشاهده تیکت‌ها", callback_data="admin_tickets")
+                        ]
+                    ]
                     
-                    if not admin_bot_token:
-                        # اگر ADMIN_BOT_TOKEN تنظیم نشده، از USER_BOT_TOKEN استفاده می‌کنیم
-                        admin_bot_token = getattr(settings, 'USER_BOT_TOKEN', '')
-                        logger.warning("⚠️ ADMIN_BOT_TOKEN تنظیم نشده، از USER_BOT_TOKEN استفاده می‌شود")
+                    # استفاده از HTML برای جلوگیری از مشکلات Markdown؛ متن کاربر escape می‌شود
+                    admin_message = (
+                        f"💬 <b>پیام جدید در تیکت #{ticket.id}</b>\n\n"
+                        f"👤 <b>کاربر:</b> {html.escape(user.full_name or 'بدون نام')}\n"
+                        f"🆔 <b>ID:</b> <code>{user.telegram_id}</code>\n"
+                        f"📱 <b>یوزرنیم:</b> @{html.escape(user.username or 'بدون یوزرنیم')}\n\n"
+                        f"📝 <b>پیام:</b>\n{html.escape(text)}\n\n"
+                        f"🆔 <b>Message ID:</b> <code>{message.id}</code>"
+                    )
                     
-                    if not admin_bot_token:
-                        logger.error("❌ هیچ توکنی برای ارسال به ادمین یافت نشد!")
+                    queued = await anotify_admins(
+                        admin_message,
+                        parse_mode='HTML',
+                        reply_markup=InlineKeyboardMarkup(keyboard).to_dict()
+                    )
+                    if queued:
+                        logger.info(f"✅ پیام تیکت {ticket.id} برای {queued} ادمین در صف قرار گرفت")
                     else:
-                        logger.info(f"🔑 استفاده از توکن برای ارسال پیام تیکت: {admin_bot_token[:20]}...")
-                        bot = Bot(token=admin_bot_token)
-                        
-                        keyboard = [
-                            [
-                                InlineKeyboardButton("✅ تایید و ایجاد کلاینت", callback_data=f"approve_ticket_{ticket.id}"),
-                                InlineKeyboardButton("💬 پاسخ", callback_data=f"reply_ticket_{ticket.id}")
-                            ],
-                            [
-                                InlineKeyboardButton("❌ بستن", callback_data=f"close_ticket_{ticket.id}"),
-                                InlineKeyboardButton("📋 مشاهده تیکت‌ها", callback_data="admin_tickets")
-                            ]
-                        ]
-                        
-                        # استفاده از HTML برای جلوگیری از مشکلات Markdown
-                        # فرار کردن کاراکترهای خاص در متن کاربر
-                        text_escaped = text.replace('<', '&lt;').replace('>', '&gt;').replace('&', '&amp;')
-                        
-                        admin_message = (
-                            f"💬 <b>پیام جدید در تیکت #{ticket.id}</b>\n\n"
-                            f"👤 <b>کاربر:</b> {user.full_name or 'بدون نام'}\n"
-                            f"🆔 <b>ID:</b> <code>{user.telegram_id}</code>\n"
-                            f"📱 <b>یوزرنیم:</b> @{user.username or 'بدون یوزرنیم'}\n\n"
-                            f"📝 <b>پیام:</b>\n{text_escaped}\n\n"
-                            f"🆔 <b>Message ID:</b> <code>{message.id}</code>"
-                        )
-                        
-                        # ارسال به همه ادمین‌ها
-                        def get_all_admins():
-                            ADMIN_USER_IDS = getattr(settings, 'ADMIN_USER_IDS', [])
-                            admins = []
-                            
-                            # ادمین‌ها از ADMIN_USER_IDS (فقط آنهایی که telegram_id دارند)
-                            if ADMIN_USER_IDS:
-                                admin_users = UsersModel.objects.filter(telegram_id__in=ADMIN_USER_IDS).exclude(telegram_id__isnull=True)
-                                admins.extend(admin_users)
-                            
-                            # ادمین‌ها از دیتابیس (فقط آنهایی که telegram_id دارند)
-                            db_admins = (UsersModel.objects.filter(is_admin=True) | UsersModel.objects.filter(is_staff=True)).exclude(telegram_id__isnull=True)
-                            admins.extend(db_admins)
-                            
-                            # حذف تکراری‌ها و فیلتر کردن ادمین‌هایی که telegram_id معتبر دارند
-                            unique_admins = []
-                            seen_ids = set()
-                            for admin in admins:
-                                # بررسی اینکه telegram_id معتبر است (نه None و نه خالی)
-                                if admin.telegram_id and admin.telegram_id not in seen_ids:
-                                    unique_admins.append(admin)
-                                    seen_ids.add(admin.telegram_id)
-                            
-                            logger.info(f"🔍 تعداد ادمین‌های یافت شده: {len(unique_admins)}")
-                            return unique_admins
-                        
-                        all_admins = await sync_to_async(get_all_admins)()
-                        
-                        if not all_admins:
-                            logger.warning("⚠️ هیچ ادمینی برای ارسال پیام تیکت یافت نشد!")
-                        else:
-                            # ارسال به همه ادمین‌ها
-                            sent_count = 0
-                            failed_count = 0
-                            for admin_user in all_admins:
-                                # بررسی اینکه ادمین telegram_id معتبر دارد
-                                if not admin_user.telegram_id:
-                                    logger.warning(f"⚠️ ادمین {admin_user.id} telegram_id ندارد، رد شد")
-                                    continue
-                                
-                                try:
-                                    # تلاش برای ارسال با HTML
-                                    try:
-                                        await bot.send_message(
-                                            chat_id=admin_user.telegram_id,
-                                            text=admin_message,
-                                            parse_mode='HTML',
-                                            reply_markup=InlineKeyboardMarkup(keyboard)
-                                        )
-                                        sent_count += 1
-                                        logger.info(f"✅ پیام به ادمین ارسال شد: Admin ID: {admin_user.telegram_id}, Ticket ID: {ticket.id}, Message ID: {message.id}")
-                                    except BadRequest as e:
-                                        # اگر HTML مشکل داشت، بدون parse_mode امتحان می‌کنیم
-                                        logger.warning(f"⚠️ خطا در ارسال با HTML، تلاش بدون parse_mode: {e}")
-                                        try:
-                                            admin_message_plain = (
-                                                f"💬 پیام جدید در تیکت #{ticket.id}\n\n"
-                                                f"👤 کاربر: {user.full_name or 'بدون نام'}\n"
-                                                f"🆔 ID: {user.telegram_id}\n"
-                                                f"📱 یوزرنیم: @{user.username or 'بدون یوزرنیم'}\n\n"
-                                                f"📝 پیام:\n{text}\n\n"
-                                                f"🆔 Message ID: {message.id}"
-                                            )
-                                            await bot.send_message(
-                                                chat_id=admin_user.telegram_id,
-                                                text=admin_message_plain,
-                                                reply_markup=InlineKeyboardMarkup(keyboard)
-                                            )
-                                            sent_count += 1
-                                            logger.info(f"✅ پیام به ادمین ارسال شد (بدون parse_mode): Admin ID: {admin_user.telegram_id}, Ticket ID: {ticket.id}, Message ID: {message.id}")
-                                        except Exception as e2:
-                                            logger.error(f"❌ خطا در ارسال به ادمین {admin_user.telegram_id} (بدون parse_mode): {e2}")
-                                            failed_count += 1
-                                    except Forbidden as e:
-                                        logger.error(f"❌ ربات توسط ادمین {admin_user.telegram_id} بلاک شده است: {e}")
-                                        failed_count += 1
-                                    except (NetworkError, TimedOut) as e:
-                                        logger.warning(f"⚠️ خطای شبکه در ارسال به ادمین {admin_user.telegram_id}: {e}")
-                                        # تلاش مجدد یک بار
-                                        try:
-                                            await asyncio.sleep(2)
-                                            await bot.send_message(
-                                                chat_id=admin_user.telegram_id,
-                                                text=admin_message,
-                                                parse_mode='HTML',
-                                                reply_markup=InlineKeyboardMarkup(keyboard)
-                                            )
-                                            sent_count += 1
-                                            logger.info(f"✅ پیام به ادمین ارسال شد (بعد از retry): Admin ID: {admin_user.telegram_id}, Ticket ID: {ticket.id}, Message ID: {message.id}")
-                                        except Exception as e2:
-                                            logger.error(f"❌ خطا در ارسال مجدد به ادمین {admin_user.telegram_id}: {e2}")
-                                            failed_count += 1
-                                    except TelegramError as e:
-                                        logger.error(f"❌ خطای تلگرام در ارسال به ادمین {admin_user.telegram_id}: {e}")
-                                        failed_count += 1
-                                    except Exception as e:
-                                        logger.error(f"❌ خطای غیرمنتظره در ارسال به ادمین {admin_user.telegram_id}: {e}", exc_info=True)
-                                        failed_count += 1
-                                except Exception as e:
-                                    logger.error(f"❌ خطای غیرمنتظره در پردازش ادمین {admin_user.telegram_id}: {e}", exc_info=True)
-                                    failed_count += 1
-                            
-                            logger.info(f"✅ پیام تیکت: {sent_count} موفق، {failed_count} ناموفق (از {len(all_admins)} ادمین)")
+                        logger.warning("⚠️ هیچ ادمینی برای ارسال پیام تیکت یافت نشد!")
                 except Exception as e:
                     logger.error(f"❌ خطا در ارسال پیام به ادمین‌ها: {e}", exc_info=True)
                     # حتی اگر ارسال به ادمین با خطا مواجه شد، پیام در دیتابیس ذخیره شده است
@@ -1973,52 +1641,46 @@ async def back_to_main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def my_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = update.effective_user.id
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
-        configs = await sync_to_async(list)(ConfigUserModel.objects.filter(user=user, is_active=True))
+        user = await get_user_cache().aget(telegram_id)
+        snapshot = await UserBotService.get_profile_snapshot(user, with_legacy_configs=True)
         
         response = "⚙️ **تنظیمات شما:**\n\n"
         has_configs = False
         
         # بررسی کانفیگ تستی
-        try:
-            trial_config = await sync_to_async(lambda: hasattr(user, 'trial_config') and user.trial_config)()
-            if trial_config and not await sync_to_async(trial_config.is_expired)():
-                has_configs = True
-                remaining_time = await sync_to_async(trial_config.get_remaining_time)()
-                hours = int(remaining_time.total_seconds() // 3600)
-                minutes = int((remaining_time.total_seconds() % 3600) // 60)
-                
-                response += (
-                    f"🎁 **کانفیگ تستی**\n"
-                    f"⏰ اعتبار: {hours} ساعت و {minutes} دقیقه باقی\n\n"
-                )
-        except:
-            pass
+        trial_config = snapshot.trial_config
+        if trial_config:
+            has_configs = True
+            remaining_time = trial_config.get_remaining_time()
+            hours = int(remaining_time.total_seconds() // 3600)
+            minutes = int((remaining_time.total_seconds() % 3600) // 60)
+            
+            response += (
+                f"🎁 **کانفیگ تستی**\n"
+                f"⏰ اعتبار: {hours} ساعت و {minutes} دقیقه باقی\n\n"
+            )
         
         # بررسی کانفیگ‌های X-UI
-        xui_configs = await sync_to_async(list)(UserConfig.objects.filter(user=user, is_active=True))
-        for config in xui_configs:
-            if not await sync_to_async(config.is_expired)():
-                has_configs = True
-                remaining_time = await sync_to_async(config.get_remaining_time)()
-                if remaining_time:
-                    hours = int(remaining_time.total_seconds() // 3600)
-                    minutes = int((remaining_time.total_seconds() % 3600) // 60)
-                    time_text = f"{hours} ساعت و {minutes} دقیقه باقی"
-                else:
-                    time_text = "نامحدود"
-                
-                response += (
-                    f"🔧 **{config.config_name}**\n"
-                    f"🖥️ سرور: {config.server.name}\n"
-                    f"⏰ اعتبار: {time_text}\n"
-                    f"📋 کپی کنید: /copy_{config.id}\n\n"
-                )
+        for config in snapshot.live_configs:
+            has_configs = True
+            remaining_time = config.get_remaining_time()
+            if remaining_time:
+                hours = int(remaining_time.total_seconds() // 3600)
+                minutes = int((remaining_time.total_seconds() % 3600) // 60)
+                time_text = f"{hours} ساعت و {minutes} دقیقه باقی"
+            else:
+                time_text = "نامحدود"
+            
+            response += (
+                f"🔧 **{config.config_name}**\n"
+                f"🖥️ سرور: {config.server.name}\n"
+                f"⏰ اعتبار: {time_text}\n"
+                f"📋 کپی کنید: /copy_{config.id}\n\n"
+            )
         
-        if configs:
-            for i, config in enumerate(configs, 1):
-                has_configs = True
-                response += f"{i}. 🔧 {config.config}\n"
+        for i, config in enumerate(snapshot.legacy_configs, 1):
+            has_configs = True
+            response += f"{i}. 🔧 {config.config}\n"
         
         if not has_configs:
             response += "⚠️ هیچ کانفیگ فعالی یافت نشد.\n\n"
@@ -2033,12 +1695,11 @@ async def my_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # ایجاد دکمه‌های کپی برای هر کانفیگ
         keyboard = []
-        if trial_config and not trial_config.is_expired():
+        if trial_config:
             keyboard.append([InlineKeyboardButton("📋 کپی کانفیگ تستی", callback_data="copy_trial_config")])
         
-        for i, config in enumerate(xui_configs):
-            if not config.is_expired():
-                keyboard.append([InlineKeyboardButton(f"📋 کپی {config.config_name}", callback_data=f"copy_config_{config.id}")])
+        for config in snapshot.live_configs:
+            keyboard.append([InlineKeyboardButton(f"📋 کپی {config.config_name}", callback_data=f"copy_config_{config.id}")])
         
         if keyboard:
             keyboard.append([InlineKeyboardButton("📚 راهنمای استفاده", callback_data="config_usage_guide")])
@@ -2067,7 +1728,7 @@ async def copy_config(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = query.from_user.id
     
     try:
-        user = await sync_to_async(UsersModel.objects.get)(telegram_id=telegram_id)
+        user = await get_user_cache().aget(telegram_id)
         
         if callback_data == "copy_trial_config":
             # کپی کانفیگ تستی
@@ -2182,34 +1843,17 @@ async def admin_dashboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     try:
-        # آمار کلی - استفاده از sync_to_async
-        servers_count = await sync_to_async(XUIServer.objects.filter(is_active=True).count)()
-        inbounds_count = await sync_to_async(XUIInbound.objects.filter(is_active=True).count)()
-        clients_count = await sync_to_async(XUIClient.objects.filter(is_active=True).count)()
-        users_count = await sync_to_async(UsersModel.objects.count)()
-        configs_count = await sync_to_async(UserConfig.objects.filter(is_active=True).count)()
-        
-        # آمار کاربران منقضی شده
-        expired_configs = await sync_to_async(
-            lambda: UserConfig.objects.filter(
-                is_active=True,
-                expires_at__lt=timezone.now()
-            ).count()
-        )()
+        # آمار کلی از snapshot دوره‌ای (در صورت نبود، یک بار محاسبه می‌شود)
+        stats = await sync_to_async(get_dashboard_stats)()
+        servers_count = stats['active_servers']
+        inbounds_count = stats['active_inbounds']
+        clients_count = stats['active_clients']
+        users_count = stats['total_users']
+        configs_count = stats['active_configs']
+        expired_configs = stats['active_expired_configs']
         
         # آمار سرورها
-        server_stats = []
-        servers = await sync_to_async(list)(XUIServer.objects.filter(is_active=True))
-        for server in servers:
-            inbounds = await sync_to_async(list)(server.inbounds.filter(is_active=True))
-            total_clients = 0
-            for inbound in inbounds:
-                clients_count_inbound = await sync_to_async(inbound.clients.count)()
-                total_clients += clients_count_inbound
-            inbounds_count_server = len(inbounds)
-            server_stats.append(f"• {server.name}: {inbounds_count_server} inbound, {total_clients} کلاینت")
-        
-        stats_text = "\n".join(server_stats) if server_stats else "هیچ سروری یافت نشد"
+        stats_text = format_server_stats(stats)
         
         await update.message.reply_text(
             f"📊 **داشبورد ادمین**\n\n"
@@ -2565,6 +2209,9 @@ async def main():
                 await app.updater.stop()
                 await app.stop()
                 await app.shutdown()
+                # بستن connection pool های پنل
+                from xui_servers.async_client import close_panel_sessions
+                await close_panel_sessions()
                 break
                 
         except (NetworkError, TimedOut) as e:
@@ -244,6 +244,10 @@ XUI_USE_SSL = os.environ.get('XUI_USE_SSL', 'True').lower() == 'true'
 XUI_VERIFY_SSL = os.environ.get('XUI_VERIFY_SSL', 'False').lower() == 'true'
 XUI_TIMEOUT = int(os.environ.get('XUI_TIMEOUT', '30'))
 
+# تنظیمات connection pool کلاینت async پنل‌ها
+PANEL_POOL_LIMIT_PER_HOST = int(os.environ.get('PANEL_POOL_LIMIT_PER_HOST', '20'))
+PANEL_KEEPALIVE_TIMEOUT = int(os.environ.get('PANEL_KEEPALIVE_TIMEOUT', '60'))
+
 # تنظیمات ایمیل
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
@@ -332,6 +336,69 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# تنظیمات پاکسازی موازی سرورها
+CLEANUP_MAX_WORKERS = int(os.environ.get('CLEANUP_MAX_WORKERS', '8'))
+CLEANUP_SERVER_TIMEOUT = int(os.environ.get('CLEANUP_SERVER_TIMEOUT', '120'))
+CLEANUP_LOCK_TTL = int(os.environ.get('CLEANUP_LOCK_TTL', '900'))
+EXPIRY_SWEEP_CHUNK_SIZE = int(os.environ.get('EXPIRY_SWEEP_CHUNK_SIZE', '1000'))
+PROVISION_BATCH_WINDOW = int(os.environ.get('PROVISION_BATCH_WINDOW', '5'))
+PROVISION_BATCH_SIZE = int(os.environ.get('PROVISION_BATCH_SIZE', '200'))
+PROVISION_CLAIM_TIMEOUT = int(os.environ.get('PROVISION_CLAIM_TIMEOUT', '600'))
+PLACEMENT_POLICY = os.environ.get('PLACEMENT_POLICY', 'least_loaded')  # least_loaded, weighted, region_affinity
+
+# تنظیمات Redis مشترک (ایندکس ظرفیت و کش‌ها)
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', '0.5'))
+CAPACITY_INDEX_ENABLED = os.environ.get('CAPACITY_INDEX_ENABLED', 'True').lower() == 'true'
+
+# کش کاربران ربات بر اساس telegram_id (USER_CACHE_REDIS_TTL=0 لایه Redis را غیرفعال می‌کند)
+USER_CACHE_MAX_SIZE = int(os.environ.get('USER_CACHE_MAX_SIZE', '10000'))
+USER_CACHE_TTL = float(os.environ.get('USER_CACHE_TTL', '60'))
+USER_CACHE_REDIS_TTL = int(os.environ.get('USER_CACHE_REDIS_TTL', '300'))
+
+# بررسی سلامت پنل‌ها و circuit breaker
+HEALTH_PROBE_INTERVAL = int(os.environ.get('HEALTH_PROBE_INTERVAL', '60'))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get('HEALTH_PROBE_TIMEOUT', '5'))
+HEALTH_PROBE_CONCURRENCY = int(os.environ.get('HEALTH_PROBE_CONCURRENCY', '20'))
+HEALTH_FAILURE_THRESHOLD = int(os.environ.get('HEALTH_FAILURE_THRESHOLD', '2'))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '3'))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get('CIRCUIT_RESET_TIMEOUT', '30'))
+CIRCUIT_SHARED_CHECK_INTERVAL = float(os.environ.get('CIRCUIT_SHARED_CHECK_INTERVAL', '5'))
+
+# سیاست retry مشترک همه کلاینت‌های پنل (سقف زمانی کل هر درخواست بر حسب ثانیه)
+PANEL_RETRY_MAX_ATTEMPTS = int(os.environ.get('PANEL_RETRY_MAX_ATTEMPTS', '3'))
+PANEL_RETRY_DEADLINE = float(os.environ.get('PANEL_RETRY_DEADLINE', '30'))
+PANEL_RETRY_BASE_DELAY = float(os.environ.get('PANEL_RETRY_BASE_DELAY', '0.5'))
+PANEL_RETRY_MAX_DELAY = float(os.environ.get('PANEL_RETRY_MAX_DELAY', '4'))
+PANEL_STREAM_CHUNK_SIZE = int(os.environ.get('PANEL_STREAM_CHUNK_SIZE', '65536'))
+INBOUND_SYNC_BATCH_SIZE = int(os.environ.get('INBOUND_SYNC_BATCH_SIZE', '500'))
+
+# تطبیق دوره‌ای پنل‌ها با دیتابیس
+RECONCILE_INTERVAL_HOURS = int(os.environ.get('RECONCILE_INTERVAL_HOURS', '6'))
+RECONCILE_AUTO_REPAIR = os.environ.get('RECONCILE_AUTO_REPAIR', 'False').lower() == 'true'
+RECONCILE_EXPIRY_TOLERANCE = int(os.environ.get('RECONCILE_EXPIRY_TOLERANCE', '300'))
+RECONCILE_REPAIR_BATCH_SIZE = int(os.environ.get('RECONCILE_REPAIR_BATCH_SIZE', '100'))
+
+# آمار از پیش محاسبه‌شده داشبورد ادمین (ثانیه)
+DASHBOARD_STATS_INTERVAL = int(os.environ.get('DASHBOARD_STATS_INTERVAL', '60'))
+DASHBOARD_STATS_TTL = int(os.environ.get('DASHBOARD_STATS_TTL', '300'))
+
+# ارسال انبوه پیام تلگرام (پیام در ثانیه، ارسال همزمان، مدت نگهداری کلید تکراری)
+BROADCAST_RATE = float(os.environ.get('BROADCAST_RATE', '25'))
+BROADCAST_CONCURRENCY = int(os.environ.get('BROADCAST_CONCURRENCY', '10'))
+BROADCAST_MAX_RETRIES = int(os.environ.get('BROADCAST_MAX_RETRIES', '3'))
+BROADCAST_DEDUP_TTL = int(os.environ.get('BROADCAST_DEDUP_TTL', '86400'))
+
+# صف اعلان‌های خروجی (bot/notification_sender.py)
+NOTIFY_RATE = float(os.environ.get('NOTIFY_RATE', '25'))
+NOTIFY_CHAT_INTERVAL = float(os.environ.get('NOTIFY_CHAT_INTERVAL', '1'))
+NOTIFY_BATCH_SIZE = int(os.environ.get('NOTIFY_BATCH_SIZE', '100'))
+NOTIFY_BLOCK_SECONDS = int(os.environ.get('NOTIFY_BLOCK_SECONDS', '5'))
+NOTIFY_RETRY_IDLE = int(os.environ.get('NOTIFY_RETRY_IDLE', '60'))
+NOTIFY_MAX_DELIVERIES = int(os.environ.get('NOTIFY_MAX_DELIVERIES', '5'))
+NOTIFY_DEDUP_TTL = int(os.environ.get('NOTIFY_DEDUP_TTL', '86400'))
+NOTIFY_QUEUE_MAXLEN = int(os.environ.get('NOTIFY_QUEUE_MAXLEN', '100000'))
+
 CELERY_BEAT_SCHEDULE = {
     'check-expiring-configs-every-15-mins': {
         'task': 'xui_servers.tasks.send_expiry_warnings',
@@ -341,6 +408,18 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'xui_servers.tasks.cleanup_expired_and_overused',
         'schedule': crontab(minute='*/10'),
     },
+    'probe-server-health': {
+        'task': 'xui_servers.tasks.probe_server_health',
+        'schedule': HEALTH_PROBE_INTERVAL,
+    },
+    'reconcile-panels': {
+        'task': 'xui_servers.tasks.reconcile_panels',
+        'schedule': crontab(minute=30, hour=f'*/{RECONCILE_INTERVAL_HOURS}'),
+    },
+    'refresh-dashboard-stats': {
+        'task': 'xui_servers.tasks.refresh_dashboard_snapshot',
+        'schedule': DASHBOARD_STATS_INTERVAL,
+    },
 }
 
 # تنظیمات پنل S-UI (API v2)
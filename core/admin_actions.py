@@ -13,34 +13,22 @@ logger = logging.getLogger(__name__)
 class AdminActionsMixin:
     """کلاس میکسین برای اکشن‌های ادمین"""
     
+    STATISTICS_KEYS = (
+        'total_users', 'active_users',
+        'total_servers', 'active_servers',
+        'total_configs', 'active_configs', 'expired_configs',
+        'total_plans', 'active_plans',
+        'total_orders', 'active_orders',
+        'total_payments', 'approved_payments', 'pending_payments', 'rejected_payments',
+        'total_trials', 'active_trials',
+    )
+    
     def get_statistics(self, request):
-        """دریافت آمار کلی سیستم"""
-        from accounts.models import UsersModel
-        from xui_servers.models import XUIServer, UserConfig
-        from plan.models import ConfingPlansModel
-        from order.models import OrderUserModel, PayMentModel
-        from conf.models import TrialConfigModel
+        """دریافت آمار کلی سیستم (از snapshot محاسبه‌شده توسط تسک دوره‌ای)"""
+        from xui_servers.dashboard_stats import get_dashboard_stats
         
-        stats = {
-            'total_users': UsersModel.objects.count(),
-            'active_users': UsersModel.objects.filter(is_active=True).count(),
-            'total_servers': XUIServer.objects.count(),
-            'active_servers': XUIServer.objects.filter(is_active=True).count(),
-            'total_configs': UserConfig.objects.count(),
-            'active_configs': UserConfig.objects.filter(is_active=True).count(),
-            'expired_configs': UserConfig.objects.filter(expires_at__lt=timezone.now()).count(),
-            'total_plans': ConfingPlansModel.objects.count(),
-            'active_plans': ConfingPlansModel.objects.filter(is_active=True).count(),
-            'total_orders': OrderUserModel.objects.count(),
-            'active_orders': OrderUserModel.objects.filter(is_active=True).count(),
-            'total_payments': PayMentModel.objects.count(),
-            'approved_payments': PayMentModel.objects.filter(is_active=True, rejected=False).count(),
-            'pending_payments': PayMentModel.objects.filter(is_active=False, rejected=False).count(),
-            'rejected_payments': PayMentModel.objects.filter(rejected=True).count(),
-            'total_trials': TrialConfigModel.objects.count(),
-            'active_trials': TrialConfigModel.objects.filter(is_active=True).count(),
-        }
-        return stats
+        snapshot = get_dashboard_stats()
+        return {key: snapshot[key] for key in self.STATISTICS_KEYS}
     
     def bulk_extend_configs(self, request, queryset, days=30):
         """تمدید دسته‌ای کانفیگ‌ها"""
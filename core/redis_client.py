@@ -0,0 +1,28 @@
+"""
+Shared Redis connection
+
+One connection pool per process, shared by the bots and Celery workers for
+caches and indexes that must be consistent across processes.
+"""
+import threading
+
+import redis
+from django.conf import settings
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_redis() -> redis.Redis:
+    """Get the process-wide Redis client (str responses)"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = redis.Redis.from_url(
+                    getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0'),
+                    decode_responses=True,
+                    socket_timeout=getattr(settings, 'REDIS_SOCKET_TIMEOUT', 0.5),
+                    socket_connect_timeout=getattr(settings, 'REDIS_SOCKET_TIMEOUT', 0.5),
+                )
+    return _client
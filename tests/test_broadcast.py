@@ -0,0 +1,129 @@
+"""
+Unit tests for the Telegram broadcast engine
+"""
+import asyncio
+from unittest.mock import AsyncMock, Mock
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+import redis
+
+from xui_servers.broadcast import BroadcastEngine, OutboundMessage, SharedRateLimit, TokenBucket
+
+
+def _engine(redis_client=None, **kwargs):
+    if redis_client is None:
+        redis_client = Mock()
+        redis_client.set.return_value = True
+    # the shared rate limit never asks to wait
+    redis_client.register_script.return_value = Mock(return_value=0)
+    return BroadcastEngine('token', rate=1000, concurrency=5, redis_client=redis_client, **kwargs)
+
+
+class TestBroadcastEngine:
+    """Test suite for BroadcastEngine delivery"""
+
+    def test_sends_every_message(self):
+        """Test that all messages are delivered and counted"""
+        bot = Mock(send_message=AsyncMock())
+        messages = [OutboundMessage(chat_id=i, text='hi') for i in range(20)]
+
+        result = asyncio.run(_engine().send(messages, bot=bot))
+
+        assert result.sent == 20
+        assert bot.send_message.await_count == 20
+
+    def test_duplicate_keys_are_skipped(self):
+        """Test that an already delivered dedup key is not sent again"""
+        redis_client = Mock()
+        redis_client.set.return_value = None  # SET NX found the marker
+        bot = Mock(send_message=AsyncMock())
+
+        result = asyncio.run(_engine(redis_client).send(
+            [OutboundMessage(chat_id=1, text='hi', dedup_key='expiry:1:100')], bot=bot
+        ))
+
+        assert result.duplicates == 1
+        bot.send_message.assert_not_awaited()
+
+    def test_retry_after_is_honoured(self):
+        """Test that a flood-limited message is retried and counted as throttled"""
+        bot = Mock(send_message=AsyncMock(side_effect=[RetryAfter(0), None]))
+
+        result = asyncio.run(_engine().send([OutboundMessage(chat_id=1, text='hi')], bot=bot))
+
+        assert result.sent == 1
+        assert result.throttled == 1
+
+    def test_rejected_message_releases_dedup_key(self):
+        """Test that a failed delivery can be retried by a later run"""
+        redis_client = Mock()
+        redis_client.set.return_value = True
+        bot = Mock(send_message=AsyncMock(side_effect=Forbidden('bot was blocked by the user')))
+
+        result = asyncio.run(_engine(redis_client).send(
+            [OutboundMessage(chat_id=1, text='hi', dedup_key='provisioned:1')], bot=bot
+        ))
+
+        assert result.failed == 1
+        assert bot.send_message.await_count == 1
+        redis_client.delete.assert_called_once_with('broadcast:sent:provisioned:1')
+
+    def test_broken_markup_falls_back_to_plain_text(self):
+        """Test that a message Telegram cannot parse is resent without parse_mode"""
+        bot = Mock(send_message=AsyncMock(side_effect=[BadRequest("Can't parse entities: unclosed tag"), None]))
+
+        result = asyncio.run(_engine().send(
+            [OutboundMessage(chat_id=1, text='<b>hi', parse_mode='HTML')], bot=bot
+        ))
+
+        assert result.sent == 1
+        assert bot.send_message.await_args.kwargs['parse_mode'] is None
+
+
+class TestTokenBucket:
+    """Test suite for TokenBucket"""
+
+    def test_rate_is_enforced(self):
+        """Test that tokens beyond the burst are spaced by the rate"""
+        async def take(bucket, count):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for _ in range(count):
+                await bucket.acquire()
+            return loop.time() - started
+
+        elapsed = asyncio.run(take(TokenBucket(rate=50, capacity=1), 6))
+
+        assert elapsed >= 0.09
+
+
+class TestSharedRateLimit:
+    """Test suite for SharedRateLimit"""
+
+    def test_waits_for_the_slot_given_by_redis(self):
+        """Test that acquire() sleeps for the time the script returns before taking a slot"""
+        redis_client = Mock()
+        script = Mock(side_effect=[20000, 0])
+        redis_client.register_script.return_value = script
+        limit = SharedRateLimit('123:secret', rate=25, redis_client=redis_client)
+
+        asyncio.run(limit.acquire())
+
+        assert script.call_count == 2
+        assert script.call_args.kwargs == {'keys': ['telegram:rate:123', 'telegram:rate:123:paused'], 'args': [40000]}
+
+    def test_falls_back_to_local_bucket(self):
+        """Test that a Redis outage still rate limits within the process"""
+        redis_client = Mock()
+        redis_client.register_script.return_value = Mock(side_effect=redis.ConnectionError('down'))
+        limit = SharedRateLimit('123:secret', rate=50, redis_client=redis_client)
+
+        async def take(count):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            for _ in range(count):
+                await limit.acquire()
+            return loop.time() - started
+
+        assert asyncio.run(take(6)) >= 0.09
@@ -0,0 +1,78 @@
+"""
+Unit tests for per-panel circuit breakers
+"""
+import pytest
+from unittest.mock import Mock, patch
+
+import requests
+
+from xui_servers.circuit_breaker import CircuitBreaker, reset_breakers
+from xui_servers.retry_policy import RetryPolicy
+from xui_servers.sui_client import SUIClient
+
+
+@pytest.fixture(autouse=True)
+def shared_state():
+    """Isolate breakers and replace the shared Redis marker store"""
+    reset_breakers()
+    redis_client = Mock()
+    redis_client.exists.return_value = 0
+    with patch('xui_servers.circuit_breaker.get_redis', return_value=redis_client):
+        yield redis_client
+    reset_breakers()
+
+
+class TestCircuitBreaker:
+    """Test suite for CircuitBreaker state transitions"""
+
+    def test_opens_after_threshold(self):
+        """Test that consecutive failures open the breaker"""
+        breaker = CircuitBreaker('panel:1', failure_threshold=2, reset_timeout=30)
+
+        breaker.record_failure()
+        assert breaker.allow() is True
+
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.allow() is False
+
+    @patch('xui_servers.circuit_breaker.time.monotonic')
+    def test_half_open_allows_single_trial(self, mock_monotonic):
+        """Test that one trial call is let through after the reset timeout"""
+        mock_monotonic.return_value = 100.0
+        breaker = CircuitBreaker('panel:2', failure_threshold=1, reset_timeout=30)
+        breaker.record_failure()
+
+        mock_monotonic.return_value = 131.0
+        assert breaker.allow() is True
+        assert breaker.allow() is False
+
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+
+    def test_shared_marker_blocks_calls(self, shared_state):
+        """Test that a panel tripped by the prober is refused in every process"""
+        shared_state.exists.return_value = 1
+        breaker = CircuitBreaker('panel:3')
+
+        assert breaker.is_open() is True
+        assert breaker.allow() is False
+
+
+class TestSUIClientFailFast:
+    """Test that SUIClient stops calling a panel whose circuit is open"""
+
+    @patch('xui_servers.sui_client.requests.Session.request')
+    def test_fail_fast_after_connection_errors(self, mock_request):
+        """Test that requests are skipped once the breaker opened"""
+        mock_request.side_effect = requests.exceptions.ConnectionError('refused')
+        client = SUIClient(host='dead-host', port=2095, api_token='token')
+        client.retry_policy = RetryPolicy(max_attempts=1)
+        client.breaker.failure_threshold = 2
+
+        assert client.get_inbounds() == []
+        assert client.get_inbounds() == []
+        assert mock_request.call_count == 2
+
+        assert client.get_inbounds() == []
+        assert mock_request.call_count == 2
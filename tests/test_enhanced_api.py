@@ -0,0 +1,103 @@
+"""
+Unit tests for X-UI enhanced service batch operations
+"""
+import json
+import pytest
+from unittest.mock import Mock, patch
+
+from xui_servers.enhanced_api_models import XUIEnhancedService
+
+
+class TestApplyClientChanges:
+    """Test suite for XUIEnhancedService.apply_client_changes"""
+
+    @pytest.fixture
+    def service(self):
+        """Create a test XUIEnhancedService instance"""
+        server = Mock(host='test-host', port=54321, web_base_path='/panel/')
+        server.name = 'Test Server'
+        service = XUIEnhancedService(server)
+        service._panel.authenticated = True
+        return service
+
+    def _inbound(self, clients):
+        return {
+            'id': 1,
+            'settings': json.dumps({'clients': clients})
+        }
+
+    @patch('xui_servers.enhanced_api_models.requests.Session.request')
+    def test_single_fetch_and_single_update(self, mock_request, service):
+        """Test that many edits cost one GET and one POST"""
+        get_response = Mock(
+            status_code=200,
+            json=Mock(return_value={'success': True, 'obj': self._inbound([
+                {'id': 'uuid-1', 'email': 'a'},
+                {'id': 'uuid-2', 'email': 'b'},
+                {'id': 'uuid-3', 'email': 'c'},
+            ])})
+        )
+        post_response = Mock(
+            status_code=200,
+            json=Mock(return_value={'success': True})
+        )
+        mock_request.side_effect = [get_response, post_response]
+
+        result = service.apply_client_changes(
+            1,
+            adds=[{'id': 'uuid-4', 'email': 'd'}, {'id': 'uuid-5', 'email': 'a'}],
+            removes=['a', 'uuid-2', 'unknown'],
+            updates={'c': {'enable': False}}
+        )
+
+        assert [c.args[0] for c in mock_request.call_args_list] == ['GET', 'POST']
+        assert sorted(result['removed']) == ['a', 'uuid-2']
+        assert result['updated'] == ['c']
+        assert result['missing'] == ['unknown']
+        # 'a' already exists in the inbound, so it is not re-added even though it is removed
+        assert result['added'] == ['d']
+
+        sent = json.loads(mock_request.call_args.kwargs['json']['settings'])
+        assert [c['email'] for c in sent['clients']] == ['c', 'd']
+        assert sent['clients'][0]['enable'] is False
+
+    @patch('xui_servers.enhanced_api_models.requests.Session.request')
+    def test_no_update_when_nothing_matches(self, mock_request, service):
+        """Test that no POST is issued when there is nothing to change"""
+        mock_request.return_value = Mock(
+            status_code=200,
+            json=Mock(return_value={'success': True, 'obj': self._inbound([])})
+        )
+
+        result = service.apply_client_changes(1, removes=['missing'])
+
+        assert result['missing'] == ['missing']
+        assert mock_request.call_count == 1
+
+
+class TestPanelSessionSharing:
+    """Test that services share one login per server"""
+
+    @patch('xui_servers.enhanced_api_models.requests.Session.request')
+    @patch('xui_servers.enhanced_api_models.requests.Session.post')
+    def test_login_once_and_relogin_on_401(self, mock_post, mock_request):
+        """Test that two services log in once and re-login only after a 401"""
+        server = Mock(host='shared-host', port=54321, web_base_path='/')
+        server.name = 'Shared Server'
+        mock_post.return_value = Mock(
+            status_code=200,
+            json=Mock(return_value={'success': True}),
+            cookies=Mock(get_dict=Mock(return_value={'3x-ui': 'cookie'}))
+        )
+        ok = Mock(status_code=200, json=Mock(return_value={'success': True, 'obj': []}))
+        unauthorized = Mock(status_code=401)
+        mock_request.side_effect = [ok, ok, unauthorized, ok]
+
+        first = XUIEnhancedService(server)
+        second = XUIEnhancedService(server)
+        first.get_inbounds()
+        second.get_inbounds()
+        assert mock_post.call_count == 1
+
+        second.get_inbounds()
+        assert mock_post.call_count == 2
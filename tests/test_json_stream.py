@@ -0,0 +1,64 @@
+"""
+Unit tests for streaming inbound parsing
+"""
+import json
+from unittest.mock import Mock, patch
+
+import pytest
+
+from xui_servers.json_stream import PanelInbound, iter_json_array
+from xui_servers.sui_client import SUIClient
+
+
+def _chunks(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestIterJsonArray:
+    """Test suite for iter_json_array"""
+
+    def test_elements_across_chunk_boundaries(self):
+        """Test that elements split at every possible byte come out intact"""
+        inbounds = [
+            {'id': i, 'remark': 'ü "quoted" ]},', 'settings': json.dumps({'clients': [{'email': f'c{i}'}]})}
+            for i in range(3)
+        ]
+        document = json.dumps({'success': True, 'msg': '"obj": []', 'obj': inbounds}).encode()
+
+        for size in (1, 2, 7, 64):
+            assert list(iter_json_array(_chunks(document, size), key='obj')) == inbounds
+
+    def test_null_array_yields_nothing(self):
+        """Test that a failed listing (obj: null) is an empty stream"""
+        assert list(iter_json_array([b'{"success": false, "obj": null}'], key='obj')) == []
+
+    def test_truncated_document_raises(self):
+        """Test that a cut-off download is reported instead of silently shortened"""
+        with pytest.raises(ValueError):
+            list(iter_json_array([b'{"obj": [{"id": 1}, {"id"'], key='obj'))
+
+    def test_settings_decoded_lazily(self):
+        """Test that clients are decoded from settings on first access only"""
+        inbound = PanelInbound({'settings': json.dumps({'clients': [{'email': 'a'}, {'email': 'b'}]})})
+
+        assert 'clients' not in inbound.__dict__
+        assert inbound.client_count == 2
+        assert [c['email'] for c in inbound.clients] == ['a', 'b']
+
+
+class TestSUIClientStreaming:
+    """Test SUIClient.iter_inbounds"""
+
+    @patch('xui_servers.sui_client.requests.Session.request')
+    def test_iter_inbounds_streams_response(self, mock_request):
+        """Test that inbounds are read from the streamed body"""
+        body = json.dumps({'success': True, 'data': [{'id': 1}, {'id': 2}]}).encode()
+        response = Mock(status_code=200)
+        response.iter_content.return_value = _chunks(body, 5)
+        mock_request.return_value = response
+        client = SUIClient(host='stream-host', port=2095, api_token='token')
+        client._authenticated = True
+
+        assert [inbound['id'] for inbound in client.iter_inbounds()] == [1, 2]
+        assert mock_request.call_args.kwargs['stream'] is True
+        response.close.assert_called_once()
@@ -0,0 +1,69 @@
+"""
+Unit tests for the outbound notification queue
+"""
+import json
+from unittest.mock import Mock, patch
+
+import redis
+
+from xui_servers.notification_queue import COALESCE_SEPARATOR, MAX_MESSAGE_LENGTH, coalesce, enqueue_notification
+
+
+def _entry(entry_id, chat_id, text, **fields):
+    return entry_id, {'chat_id': str(chat_id), 'text': text, 'bot': 'admin', **fields}
+
+
+class TestCoalesce:
+    """Test suite for merging queue entries per chat"""
+
+    def test_same_chat_is_merged_in_order(self):
+        """Test that entries for one chat become one message"""
+        batches = coalesce([
+            _entry('1-0', 10, 'first'),
+            _entry('2-0', 20, 'other chat'),
+            _entry('3-0', 10, 'second'),
+        ])
+
+        assert len(batches) == 2
+        assert batches[0].message.text == 'first' + COALESCE_SEPARATOR + 'second'
+        assert batches[0].entry_ids == ['1-0', '3-0']
+        assert batches[1].entry_ids == ['2-0']
+
+    def test_different_keyboards_are_not_merged(self):
+        """Test that messages with their own buttons stay separate"""
+        keyboard = json.dumps({'inline_keyboard': [[{'text': 'ok', 'callback_data': 'ok'}]]})
+        batches = coalesce([
+            _entry('1-0', 10, 'ticket', parse_mode='HTML', reply_markup=keyboard),
+            _entry('2-0', 10, 'plain', parse_mode='HTML'),
+        ])
+
+        assert len(batches) == 2
+        assert batches[0].message.reply_markup == json.loads(keyboard)
+
+    def test_long_texts_are_split(self):
+        """Test that a merged message never exceeds Telegram's limit"""
+        text = 'x' * (MAX_MESSAGE_LENGTH // 2)
+        batches = coalesce([_entry(f'{i}-0', 10, text) for i in range(3)])
+
+        assert [len(batch.entry_ids) for batch in batches] == [1, 1, 1]
+
+    def test_malformed_entry_is_dropped(self):
+        """Test that an entry without a chat is acknowledged without sending"""
+        batches = coalesce([('1-0', {'text': 'no chat'})])
+
+        assert batches[0].message is None
+        assert batches[0].entry_ids == ['1-0']
+
+
+class TestEnqueue:
+    """Test suite for enqueue_notification"""
+
+    @patch('xui_servers.notification_queue.get_redis')
+    def test_failed_add_releases_dedup_marker(self, mock_get_redis):
+        """Test that a message that could not be queued is not suppressed as a duplicate"""
+        client = mock_get_redis.return_value
+        client.set.return_value = True
+        client.xadd.side_effect = redis.ConnectionError('down')
+
+        assert enqueue_notification(1, 'hello', dedup_key='order:1') is False
+        client.delete.assert_called_once_with('notify:dedup:order:1')
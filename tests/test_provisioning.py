@@ -3,7 +3,7 @@ Integration tests for provisioning flow
 """
 import pytest
 from unittest.mock import Mock, patch, MagicMock
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from datetime import timedelta
 
@@ -14,7 +14,8 @@ from xui_servers.models import XUIServer, UserConfig, XUIInbound
 from xui_servers.provisioning_tasks import (
     provision_subscription,
     revoke_subscription,
-    process_paid_order
+    process_paid_order,
+    provision_pending_batch
 )
 
 
@@ -164,6 +165,35 @@ class TestProvisioningFlow:
         assert user_config.status == 'cancelled'
         assert user_config.is_active is False
     
+    @override_settings(CAPACITY_INDEX_ENABLED=False)
+    @patch('xui_servers.provisioning_tasks.SUIProvisionService')
+    def test_revoke_releases_slot_once(self, mock_service_class, user, plan, server, inbound):
+        """Test that revoking a config whose slot was already released keeps the count"""
+        mock_service_class.return_value.deprovision_config.return_value = True
+        XUIInbound.objects.filter(pk=inbound.pk).update(current_clients=2)
+        
+        configs = [
+            UserConfig.objects.create(
+                user=user,
+                server=server,
+                plan=plan,
+                inbound=inbound,
+                xui_inbound_id=1,
+                xui_user_id=f'{status}@example.com',
+                config_name='Test Config',
+                status=status,
+                is_active=status == 'active',
+                protocol='vless'
+            )
+            for status in ('active', 'expired')
+        ]
+        
+        for config in configs:
+            assert revoke_subscription(str(config.id))['success'] is True
+        
+        inbound.refresh_from_db()
+        assert inbound.current_clients == 1
+    
     @patch('xui_servers.provisioning_tasks.provision_subscription')
     def test_process_paid_order(self, mock_provision, user, plan, server):
         """Test processing paid order"""
@@ -191,3 +221,196 @@ class TestProvisioningFlow:
         # Verify provisioning was queued
         mock_provision.delay.assert_called_once()
 
+
+@pytest.mark.django_db
+class TestBatchProvisioning:
+    """Test batched X-UI provisioning"""
+    
+    @pytest.fixture
+    def plan(self):
+        """Create test plan"""
+        return ConfingPlansModel.objects.create(
+            name='Test Plan',
+            price=10000,
+            in_volume=10,
+            traffic_mb=10240,
+            duration_days=30
+        )
+    
+    @pytest.fixture
+    def server(self):
+        """Create test X-UI server"""
+        return XUIServer.objects.create(
+            name='Batch Server',
+            host='xui.example.com',
+            port=54321,
+            username='admin',
+            password='password',
+            server_type='xui'
+        )
+    
+    @pytest.fixture
+    def inbound(self, server):
+        """Create test inbound"""
+        return XUIInbound.objects.create(
+            server=server,
+            xui_inbound_id=7,
+            port=443,
+            protocol='vless',
+            remark='Batch Inbound',
+            max_clients=100
+        )
+    
+    def _pending_config(self, telegram_id, plan, server, inbound):
+        user = UsersModel.objects.create(
+            telegram_id=telegram_id,
+            id_tel=str(telegram_id),
+            username_tel=f'user{telegram_id}',
+            full_name=f'User {telegram_id}'
+        )
+        return UserConfig.objects.create(
+            user=user,
+            server=server,
+            plan=plan,
+            inbound=inbound,
+            xui_inbound_id=0,
+            config_name='Pending Config',
+            status='pending',
+            is_active=False,
+            expires_at=timezone.now() + timedelta(days=30),
+            protocol='vless',
+            external_id=f'order_{telegram_id}'
+        )
+    
+    @patch('xui_servers.provisioning_tasks.send_provision_notification')
+    @patch('xui_servers.enhanced_api_models.XUIEnhancedService.add_client_to_inbound')
+    def test_one_add_call_per_inbound(self, mock_add, mock_notify, plan, server, inbound):
+        """Test that pending configs of an inbound are added in one call"""
+        mock_add.return_value = True
+        configs = [self._pending_config(1000 + i, plan, server, inbound) for i in range(3)]
+        
+        result = provision_pending_batch(str(server.id))
+        
+        assert result['provisioned'] == 3
+        assert mock_add.call_count == 1
+        inbound_id, payload = mock_add.call_args.args
+        assert inbound_id == 7
+        assert sorted(c['email'] for c in payload['clients']) == ['order_1000', 'order_1001', 'order_1002']
+        
+        for config in configs:
+            config.refresh_from_db()
+            assert config.status == 'active'
+            assert config.is_active is True
+            assert config.xui_inbound_id == 7
+    
+    @patch('xui_servers.provisioning_tasks.send_provision_notification')
+    @patch('xui_servers.enhanced_api_models.XUIEnhancedService.add_client_to_inbound')
+    def test_client_ids_are_stable_across_retries(self, mock_add, mock_notify, plan, server, inbound):
+        """Test that a retried batch sends the same client ids"""
+        mock_add.return_value = False
+        self._pending_config(2000, plan, server, inbound)
+        
+        with patch('xui_servers.enhanced_api_models.XUIEnhancedService.apply_client_changes', return_value=None):
+            with patch('xui_servers.provisioning_tasks.schedule_batch_provision'):
+                provision_pending_batch(str(server.id))
+                provision_pending_batch(str(server.id))
+        
+        first_ids = [c['id'] for c in mock_add.call_args_list[0].args[1]['clients']]
+        second_ids = [c['id'] for c in mock_add.call_args_list[1].args[1]['clients']]
+        assert first_ids == second_ids
+    
+    @override_settings(CAPACITY_INDEX_ENABLED=False)
+    @patch('xui_servers.provisioning_tasks.notify_admins')
+    @patch('xui_servers.provisioning_tasks.schedule_batch_provision')
+    @patch('xui_servers.enhanced_api_models.XUIEnhancedService.apply_client_changes', return_value=None)
+    @patch('xui_servers.enhanced_api_models.XUIEnhancedService.add_client_to_inbound', return_value=False)
+    def test_failed_configs_return_to_pending_then_fail(
+        self, mock_add, mock_apply, mock_schedule, mock_notify, plan, server, inbound
+    ):
+        """Test that failures release the claim and end in 'failed' once retries run out"""
+        config = self._pending_config(3000, plan, server, inbound)
+        # the slot reserved for the config at purchase
+        XUIInbound.objects.filter(pk=inbound.pk).update(current_clients=1)
+        
+        provision_pending_batch(str(server.id))
+        config.refresh_from_db()
+        assert config.status == 'pending'
+        assert config.provision_retry_count == 1
+        
+        for _ in range(provision_subscription.max_retries - 1):
+            provision_pending_batch(str(server.id))
+        
+        config.refresh_from_db()
+        assert config.status == 'failed'
+        assert config.is_active is False
+        mock_notify.assert_called_once()
+        inbound.refresh_from_db()
+        assert inbound.current_clients == 0
+
+
+@pytest.mark.django_db
+class TestPlacementEngine:
+    """Test capacity-aware placement"""
+    
+    @pytest.fixture
+    def server(self):
+        """Create test X-UI server"""
+        return XUIServer.objects.create(
+            name='Placement Server',
+            host='place.example.com',
+            port=54321,
+            username='admin',
+            password='password',
+            server_type='xui'
+        )
+    
+    def _inbound(self, server, xui_inbound_id, current, maximum):
+        return XUIInbound.objects.create(
+            server=server,
+            xui_inbound_id=xui_inbound_id,
+            port=10000 + xui_inbound_id,
+            protocol='vless',
+            remark=f'Inbound {xui_inbound_id}',
+            max_clients=maximum,
+            current_clients=current
+        )
+    
+    def test_reserves_least_loaded_inbound(self, server):
+        """Test that the inbound with most free slots is reserved"""
+        from xui_servers.placement import PlacementEngine, LeastLoadedPolicy
+        
+        self._inbound(server, 1, current=90, maximum=100)
+        roomy = self._inbound(server, 2, current=10, maximum=100)
+        
+        inbound = PlacementEngine(LeastLoadedPolicy()).reserve('vless')
+        
+        assert inbound.pk == roomy.pk
+        roomy.refresh_from_db()
+        assert roomy.current_clients == 11
+    
+    def test_never_overfills_inbound(self, server):
+        """Test that a full inbound is never reserved"""
+        from xui_servers.placement import PlacementEngine, LeastLoadedPolicy
+        
+        last_slot = self._inbound(server, 1, current=99, maximum=100)
+        engine = PlacementEngine(LeastLoadedPolicy())
+        
+        assert engine.reserve('vless').pk == last_slot.pk
+        assert engine.reserve('vless') is None
+        last_slot.refresh_from_db()
+        assert last_slot.current_clients == 100
+    
+    @override_settings(CAPACITY_INDEX_ENABLED=False)
+    def test_release_many_frees_slots_without_going_negative(self, server):
+        """Test that bulk release gives back slots per inbound and stops at zero"""
+        from xui_servers.placement import PlacementEngine, LeastLoadedPolicy
+        
+        busy = self._inbound(server, 1, current=5, maximum=100)
+        almost_empty = self._inbound(server, 2, current=1, maximum=100)
+        
+        PlacementEngine(LeastLoadedPolicy()).release_many({busy.pk: 3, almost_empty.pk: 2})
+        
+        busy.refresh_from_db()
+        almost_empty.refresh_from_db()
+        assert busy.current_clients == 2
+        assert almost_empty.current_clients == 0
@@ -0,0 +1,84 @@
+"""
+Unit tests for panel reconciliation
+"""
+import json
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import Mock
+
+import pytest
+
+from xui_servers.reconciliation import GB, PanelReconciler
+
+
+class TestReconcilerDiff:
+    """Test suite for PanelReconciler.diff"""
+
+    @pytest.fixture
+    def reconciler(self):
+        server = Mock(id='server-1')
+        server.name = 'Test Server'
+        return PanelReconciler(server)
+
+    def _inbound(self, inbound_id, clients):
+        return {'id': inbound_id, 'settings': json.dumps({'clients': clients})}
+
+    def test_orphans_missing_and_mismatches(self, reconciler):
+        """Test that each kind of drift is reported once"""
+        expires_at = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        expiry_ms = int(expires_at.timestamp() * 1000)
+
+        in_sync = Mock(id='c1', xui_inbound_id=1, xui_user_id='uuid-1', expires_at=expires_at)
+        expired_early = Mock(id='c2', xui_inbound_id=1, xui_user_id='uuid-2', expires_at=expires_at)
+        gone = Mock(id='c3', xui_inbound_id=1, xui_user_id='uuid-3', expires_at=expires_at)
+        db_client = Mock(
+            id='x1', xui_client_id='uuid-4', email='client-4',
+            limit_ip=2, total_gb=10, expiry_time=0
+        )
+        configs = {c.xui_user_id: c for c in (in_sync, expired_early, gone)}
+        clients = {'uuid-4': db_client}
+        protected = set(configs) | {'uuid-4', 'client-4'}
+
+        inbounds = [self._inbound(1, [
+            {'id': 'uuid-1', 'email': 'a', 'expiryTime': expiry_ms, 'enable': True},
+            {'id': 'uuid-2', 'email': 'b', 'expiryTime': expiry_ms - 86400000, 'enable': True},
+            {'id': 'uuid-4', 'email': 'client-4', 'limitIp': 1, 'totalGB': 10 * GB, 'expiryTime': 0},
+            {'id': 'uuid-9', 'email': 'stranger'},
+        ])]
+
+        report = reconciler.diff(inbounds, configs, clients, protected)
+
+        assert report.panel_clients == 4
+        assert [o.email for o in report.orphans] == ['stranger']
+        assert [m.key for m in report.missing] == ['uuid-3']
+        mismatches = {m.key: m.fields for m in report.mismatches}
+        assert set(mismatches) == {'uuid-2', 'uuid-4'}
+        assert set(mismatches['uuid-2']) == {'expiryTime'}
+        assert mismatches['uuid-4'] == {'limitIp': (2, 1)}
+
+    def test_pending_configs_are_not_orphans(self, reconciler):
+        """Test that clients of configs still being provisioned are left alone"""
+        inbounds = [self._inbound(1, [{'id': 'uuid-p', 'email': 'order-42'}])]
+
+        report = reconciler.diff(inbounds, {}, {}, protected={'order-42'})
+
+        assert not report.has_drift
+
+    def test_panel_disabled_clients(self, reconciler):
+        """Test that only clients disabled without expiry or quota reason are mismatches"""
+        future = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        past = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+        configs = {
+            'uuid-1': Mock(id='c1', xui_inbound_id=1, xui_user_id='uuid-1', expires_at=future),
+            'uuid-2': Mock(id='c2', xui_inbound_id=1, xui_user_id='uuid-2', expires_at=past),
+            'uuid-3': Mock(id='c3', xui_inbound_id=1, xui_user_id='uuid-3', expires_at=future),
+        }
+        inbound = self._inbound(1, [
+            {'id': 'uuid-1', 'email': 'a', 'expiryTime': int(future.timestamp() * 1000), 'enable': False},
+            {'id': 'uuid-2', 'email': 'b', 'expiryTime': int(past.timestamp() * 1000), 'enable': False},
+            {'id': 'uuid-3', 'email': 'c', 'expiryTime': int(future.timestamp() * 1000), 'enable': False},
+        ])
+        inbound['clientStats'] = [{'email': 'c', 'up': 6 * GB, 'down': 4 * GB, 'total': 10 * GB}]
+
+        report = reconciler.diff([inbound], configs, {}, protected=set(configs))
+
+        assert {m.key: m.fields for m in report.mismatches} == {'uuid-1': {'enable': (True, False)}}
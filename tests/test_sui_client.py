@@ -1,10 +1,13 @@
 """
 Unit tests for S-UI Client
 """
+import time
+
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import requests
 from xui_servers.sui_client import SUIClient, retry_with_backoff
+from xui_servers.retry_policy import DeadlineExceeded, RetryPolicy
 
 
 class TestSUIClient:
@@ -175,3 +178,88 @@ class TestIdempotency:
         assert result1 is True
         assert result2 is True  # Should succeed due to idempotency check
 
+
+class TestRetryPolicy:
+    """Test the shared panel retry policy"""
+    
+    @patch('xui_servers.retry_policy.time.sleep')
+    def test_retries_retryable_status(self, mock_sleep):
+        """Test that a 503 is retried and the final response returned"""
+        policy = RetryPolicy(max_attempts=3, deadline=None, base_delay=0.01)
+        responses = [Mock(status_code=503, headers={}), Mock(status_code=200)]
+        
+        result = policy.execute(lambda timeout: responses.pop(0))
+        
+        assert result.status_code == 200
+        assert mock_sleep.call_count == 1
+    
+    def test_read_timeout_not_retried_for_post(self):
+        """Test that a timed-out POST is not replayed"""
+        policy = RetryPolicy(max_attempts=3, deadline=None, base_delay=0.01)
+        send = Mock(side_effect=requests.exceptions.ReadTimeout('slow'))
+        
+        with pytest.raises(requests.exceptions.ReadTimeout):
+            policy.execute(send, method='POST')
+        
+        assert send.call_count == 1
+    
+    @patch('xui_servers.retry_policy.time.sleep')
+    def test_deadline_caps_attempt_timeout(self, mock_sleep):
+        """Test that each attempt gets at most the remaining budget"""
+        policy = RetryPolicy(max_attempts=2, deadline=5.0, base_delay=0.01)
+        send = Mock(return_value=Mock(status_code=200))
+        
+        policy.execute(send, timeout=30)
+        
+        assert send.call_args.args[0] <= 5.0
+    
+    @patch('xui_servers.sui_client.requests.Session.request')
+    def test_client_uses_single_retry_layer(self, mock_request):
+        """Test that a connection error costs at most max_attempts requests"""
+        mock_request.side_effect = requests.exceptions.ConnectionError('refused')
+        client = SUIClient(host='retry-host', port=2095, api_token='token')
+        client.retry_policy = RetryPolicy(max_attempts=2, deadline=None, base_delay=0)
+        client.breaker.failure_threshold = 100
+        
+        assert client.get_inbounds() == []
+        assert mock_request.call_count == 2
+    
+    def test_dropped_connection_not_retried_for_post(self):
+        """Test that a POST whose connection dropped after sending is not replayed"""
+        policy = RetryPolicy(max_attempts=3, deadline=None, base_delay=0)
+        send = Mock(side_effect=requests.exceptions.ConnectionError('Connection aborted'))
+        
+        with pytest.raises(requests.exceptions.ConnectionError):
+            policy.execute(send, method='POST')
+        
+        assert send.call_count == 1
+    
+    def test_connect_timeout_retried_for_post(self):
+        """Test that a POST that never connected is retried"""
+        policy = RetryPolicy(max_attempts=2, deadline=None, base_delay=0)
+        send = Mock(side_effect=[requests.exceptions.ConnectTimeout('no route'), Mock(status_code=200)])
+        
+        assert policy.execute(send, method='POST').status_code == 200
+        assert send.call_count == 2
+    
+    def test_gateway_error_not_retried_for_post(self):
+        """Test that a POST answered with 502/504 is not replayed, while 503 is"""
+        policy = RetryPolicy(max_attempts=3, deadline=None, base_delay=0)
+        
+        send = Mock(return_value=Mock(status_code=504, headers={}))
+        assert policy.execute(send, method='POST').status_code == 504
+        assert send.call_count == 1
+        
+        send = Mock(side_effect=[Mock(status_code=503, headers={}), Mock(status_code=200)])
+        assert policy.execute(send, method='POST').status_code == 200
+        assert send.call_count == 2
+    
+    def test_spent_deadline_does_not_send(self):
+        """Test that a resend charged to a spent deadline raises instead of sending"""
+        policy = RetryPolicy(max_attempts=2, deadline=5.0, base_delay=0)
+        send = Mock(return_value=Mock(status_code=200))
+        
+        with pytest.raises(DeadlineExceeded):
+            policy.execute(send, timeout=30, started=time.monotonic() - 10)
+        
+        assert send.call_count == 0
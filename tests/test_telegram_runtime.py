@@ -0,0 +1,39 @@
+"""
+Unit tests for the process-wide Telegram runtime
+"""
+import asyncio
+
+import pytest
+
+from xui_servers.telegram_runtime import TelegramRuntime
+
+
+@pytest.fixture
+def runtime():
+    runtime = TelegramRuntime()
+    yield runtime
+    runtime.close()
+
+
+class TestTelegramRuntime:
+    """Test suite for TelegramRuntime"""
+
+    def test_calls_share_one_loop(self, runtime):
+        """Test that consecutive runs execute on the same event loop"""
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        assert runtime.run(current_loop()) is runtime.run(current_loop())
+
+    def test_errors_propagate(self, runtime):
+        """Test that an exception inside the coroutine reaches the caller"""
+        async def fail():
+            raise ValueError('boom')
+
+        with pytest.raises(ValueError):
+            runtime.run(fail())
+
+    def test_bots_are_bound_to_the_runtime_loop(self, runtime):
+        """Test that get_bot() refuses to hand out bots on another loop"""
+        with pytest.raises(RuntimeError):
+            asyncio.run(runtime.get_bot('token'))
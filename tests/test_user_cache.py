@@ -0,0 +1,115 @@
+"""
+Unit tests for the bot user cache
+"""
+import asyncio
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+
+from accounts.models import UsersModel
+from accounts.user_cache import UserCache
+from bot.user.services import UserBotService
+
+
+@pytest.fixture
+def users():
+    """Replace the UsersModel lookups with an in-memory table"""
+    table = {}
+
+    def lookup(telegram_id):
+        result = Mock()
+        result.first.return_value = table.get(telegram_id)
+        return result
+
+    with patch('accounts.user_cache.UsersModel.objects') as objects:
+        objects.filter.side_effect = lambda telegram_id: lookup(telegram_id)
+        yield table, objects
+
+
+def _user(telegram_id, is_admin=False):
+    return Mock(telegram_id=telegram_id, is_admin=is_admin, is_staff=False)
+
+
+class TestUserCache:
+    """Test suite for the local tier of UserCache"""
+
+    def test_second_lookup_skips_database(self, users):
+        """Test that a cached user is served without another query"""
+        table, objects = users
+        table[1] = _user(1)
+        cache = UserCache(redis_ttl=0)
+
+        assert cache.get(1).telegram_id == 1
+        assert cache.get(1).telegram_id == 1
+        assert objects.filter.call_count == 1
+
+    def test_missing_user_is_remembered(self, users):
+        """Test that unknown telegram_ids do not query the database every time"""
+        _, objects = users
+        cache = UserCache(redis_ttl=0)
+
+        assert cache.get(2) is None
+        assert cache.get(2) is None
+        assert objects.filter.call_count == 1
+
+    def test_invalidate_reloads(self, users):
+        """Test that an invalidated user is read again from the database"""
+        table, objects = users
+        table[3] = _user(3)
+        cache = UserCache(redis_ttl=0)
+        cache.get(3)
+
+        table[3] = _user(3, is_admin=True)
+        cache.invalidate(3)
+
+        assert cache.get(3).is_admin is True
+        assert objects.filter.call_count == 2
+
+    @patch('accounts.user_cache.time.monotonic')
+    def test_entries_expire(self, mock_monotonic, users):
+        """Test that local entries are dropped after the TTL"""
+        table, objects = users
+        table[4] = _user(4)
+        cache = UserCache(ttl=60, redis_ttl=0)
+
+        mock_monotonic.return_value = 100.0
+        cache.get(4)
+        mock_monotonic.return_value = 161.0
+        cache.get(4)
+
+        assert objects.filter.call_count == 2
+
+    def test_least_recently_used_is_evicted(self, users):
+        """Test that the local tier never grows past max_size"""
+        table, objects = users
+        for telegram_id in (5, 6, 7):
+            table[telegram_id] = _user(telegram_id)
+        cache = UserCache(max_size=2, redis_ttl=0)
+
+        cache.get(5)
+        cache.get(6)
+        cache.get(5)
+        cache.get(7)  # evicts 6
+        cache.get(5)
+
+        assert objects.filter.call_count == 3
+        cache.get(6)
+        assert objects.filter.call_count == 4
+
+
+@pytest.mark.django_db(transaction=True)
+def test_start_does_not_revert_fields_changed_elsewhere():
+    """Test that saving a stale cached user only writes the Telegram fields"""
+    user = UsersModel.objects.create(telegram_id=900, id_tel='900', username_tel='old', full_name='Old')
+    stale = UsersModel.objects.get(pk=user.pk)
+    UsersModel.objects.filter(pk=user.pk).update(has_used_trial=True, is_admin=True)
+
+    cache = Mock(aget=AsyncMock(return_value=stale))
+    telegram_user = Mock(id=900, username='new_name', full_name='New Name')
+    with patch('bot.user.services.get_user_cache', return_value=cache):
+        asyncio.run(UserBotService.get_or_create_user(900, telegram_user))
+
+    user.refresh_from_db()
+    assert user.full_name == 'New Name'
+    assert user.has_used_trial is True
+    assert user.is_admin is True
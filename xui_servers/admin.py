@@ -7,18 +7,21 @@ from .models import XUIServer, XUIInbound, XUIClient, UserConfig
 
 @admin.register(XUIServer)
 class XUIServerAdmin(admin.ModelAdmin):
-    list_display = ['name', 'host', 'port', 'is_active', 'get_inbounds_count', 'get_clients_count']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['name', 'host', 'port', 'is_active', 'health_status', 'health_latency_ms', 'get_inbounds_count', 'get_clients_count']
+    list_filter = ['is_active', 'health_status', 'created_at']
     search_fields = ['name', 'host']
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['created_at', 'updated_at', 'health_status', 'health_latency_ms', 'health_failures', 'last_health_check']
     
     fieldsets = (
         ('اطلاعات اصلی', {
-            'fields': ('name', 'host', 'port', 'is_active')
+            'fields': ('name', 'host', 'port', 'region', 'is_active')
         }),
         ('تنظیمات X-UI', {
             'fields': ('username', 'password', 'web_base_path')
         }),
+        ('وضعیت سلامت', {
+            'fields': ('health_check_enabled', 'health_status', 'health_latency_ms', 'health_failures', 'last_health_check')
+        }),
         ('اطلاعات زمانی', {
             'fields': ('created_at', 'updated_at'),
             'classes': ('collapse',)
@@ -35,6 +38,17 @@ class XUIServerAdmin(admin.ModelAdmin):
             total += inbound.clients.count()
         return total
     get_clients_count.short_description = 'تعداد کلاینت ها'
+    
+    actions = ['reconcile_with_panel']
+    
+    def reconcile_with_panel(self, request, queryset):
+        """تطبیق کلاینت‌های پنل با دیتابیس (فقط گزارش، بدون اصلاح)"""
+        from .reconciliation import PanelReconciler
+        
+        for server in queryset:
+            report = PanelReconciler(server).run(auto_repair=False)
+            self.message_user(request, report.summary_line())
+    reconcile_with_panel.short_description = "تطبیق با پنل"
 
 class XUIClientInline(admin.TabularInline):
     model = XUIClient
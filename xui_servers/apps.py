@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class XuiServersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'xui_servers'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,442 @@
+"""
+Async X-UI / S-UI API Clients
+aiohttp based clients sharing one keep-alive connection pool per panel
+"""
+import asyncio
+import json
+import logging
+import time
+from typing import Optional, Dict, List, Any, Tuple
+
+import aiohttp
+from django.conf import settings
+
+from .circuit_breaker import get_server_breaker
+from .enhanced_api_models import merge_client_changes
+from .retry_policy import RetryPolicy, get_panel_retry_policy
+
+logger = logging.getLogger(__name__)
+
+# (event loop id, panel base URL) -> shared aiohttp session
+_sessions: Dict[Tuple[int, str], aiohttp.ClientSession] = {}
+# pool keys that already hold an authenticated cookie jar
+_authenticated: set = set()
+
+
+def get_panel_session(base_url: str, headers: Optional[Dict[str, str]] = None) -> aiohttp.ClientSession:
+    """
+    Get the shared aiohttp session for a panel in the running event loop
+
+    aiohttp sessions are bound to the loop they were created in, so the pool is
+    keyed by loop as well as by panel. Bot handlers all run in one loop and get a
+    single long-lived pool per panel; Celery tasks get one per task loop.
+
+    Args:
+        base_url: Panel base URL (including web base path)
+        headers: Default headers for the session
+
+    Returns:
+        Shared ClientSession for the panel
+    """
+    loop = asyncio.get_running_loop()
+    key = (id(loop), base_url)
+    session = _sessions.get(key)
+
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit_per_host=getattr(settings, 'PANEL_POOL_LIMIT_PER_HOST', 20),
+            keepalive_timeout=getattr(settings, 'PANEL_KEEPALIVE_TIMEOUT', 60),
+            ssl=None if getattr(settings, 'XUI_VERIFY_SSL', False) else False,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            headers=headers,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=aiohttp.ClientTimeout(total=getattr(settings, 'XUI_TIMEOUT', 30)),
+        )
+        _sessions[key] = session
+        _authenticated.discard(key)
+
+    return session
+
+
+async def close_panel_sessions() -> None:
+    """Close all pooled sessions that belong to the running event loop"""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [k for k in _sessions if k[0] == loop_id]:
+        session = _sessions.pop(key)
+        _authenticated.discard(key)
+        if not session.closed:
+            await session.close()
+
+
+async def _send(
+    session: aiohttp.ClientSession,
+    policy: RetryPolicy,
+    method: str,
+    url: str,
+    started: Optional[float] = None,
+    **kwargs
+) -> Tuple[int, Optional[Dict[str, Any]]]:
+    """
+    Send one request under the panel retry policy
+
+    ``started`` shares the policy deadline with an earlier send (resend after re-login).
+
+    Returns:
+        (status, parsed JSON body for 200/201 responses, otherwise None)
+    """
+    async def send(timeout):
+        async with session.request(
+            method, url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+        ) as response:
+            if response.status not in (200, 201):
+                return response.status, None
+            return response.status, await response.json(content_type=None)
+
+    return await policy.aexecute(
+        send, method=method, timeout=getattr(settings, 'XUI_TIMEOUT', 30), started=started
+    )
+
+
+class AsyncXUIClient:
+    """
+    Async X-UI (Sanaei) API Client
+
+    Mirrors the operations of XUIEnhancedService without blocking the event loop:
+    - Inbound listing
+    - Client add/remove/update
+    - Client traffic
+    - Online clients
+    """
+
+    def __init__(self, server):
+        """
+        Initialize async X-UI client
+
+        Args:
+            server: XUIServer instance
+        """
+        self.server = server
+        use_ssl = getattr(settings, 'XUI_USE_SSL', True)
+        protocol = "https" if use_ssl else "http"
+        base_url = f"{protocol}://{server.host}:{server.port}"
+        if getattr(server, 'web_base_path', None):
+            base_url += server.web_base_path
+        self.base_url = base_url.rstrip('/')
+        self.headers = {
+            'Content-Type': 'application/json',
+            'User-Agent': 'Django-XUI-Bot/3.0',
+            'Accept': 'application/json'
+        }
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return get_panel_session(self.base_url, self.headers)
+
+    @property
+    def _pool_key(self) -> Tuple[int, str]:
+        return (id(asyncio.get_running_loop()), self.base_url)
+
+    async def login(self) -> bool:
+        """
+        Login to X-UI; the cookie is kept in the shared session's jar
+
+        Returns:
+            True if login successful
+        """
+        try:
+            async with self.session.post(
+                f"{self.base_url}/login",
+                json={
+                    "username": self.server.username,
+                    "password": self.server.password
+                }
+            ) as response:
+                if response.status != 200:
+                    logger.error(f"X-UI login failed for {self.server.name}: {response.status}")
+                    return False
+
+                try:
+                    data = await response.json(content_type=None)
+                except (aiohttp.ContentTypeError, json.JSONDecodeError):
+                    data = {'success': True}
+
+                if data and data.get('success'):
+                    _authenticated.add(self._pool_key)
+                    return True
+
+                logger.error(f"X-UI login rejected for {self.server.name}: {data}")
+                return False
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error logging in to X-UI {self.server.name}: {e}")
+            return False
+
+    async def _request(self, method: str, endpoint: str, **kwargs) -> Optional[Dict[str, Any]]:
+        """
+        Make request to X-UI API, logging in first if needed and once more on 401
+
+        Args:
+            method: HTTP method
+            endpoint: API endpoint relative to the panel base URL
+
+        Returns:
+            Response JSON or None on error (immediately while the panel's circuit is open)
+        """
+        breaker = get_server_breaker(self.server)
+        if not breaker.allow():
+            logger.warning(f"Circuit open for {self.server.name}, skipping {endpoint}")
+            return None
+
+        if self._pool_key not in _authenticated and not await self.login():
+            breaker.record_failure()
+            return None
+
+        policy = get_panel_retry_policy('xui-async')
+        started = time.monotonic()
+        for attempt in range(2):
+            try:
+                status, data = await _send(
+                    self.session, policy, method, f"{self.base_url}{endpoint}", started=started, **kwargs
+                )
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Error calling X-UI {endpoint} on {self.server.name}: {e}")
+                breaker.record_failure()
+                return None
+            except json.JSONDecodeError as e:
+                logger.error(f"Invalid JSON from X-UI {endpoint} on {self.server.name}: {e}")
+                return None
+
+            if status >= 500:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+
+            if status in (401, 403) and attempt == 0:
+                _authenticated.discard(self._pool_key)
+                if not await self.login():
+                    return None
+                if policy.deadline_exceeded(started):
+                    logger.warning(f"X-UI {endpoint} on {self.server.name}: no time left to resend after re-login")
+                    return None
+                continue
+
+            if status != 200:
+                logger.warning(f"X-UI {endpoint} returned {status}")
+                return None
+
+            if data and data.get('success'):
+                return data
+
+            logger.warning(f"X-UI {endpoint} unsuccessful: {data}")
+            return None
+
+        return None
+
+    async def get_inbounds(self) -> List[Dict[str, Any]]:
+        """Get list of all inbounds"""
+        data = await self._request('GET', '/panel/api/inbounds/list')
+        return data.get('obj', []) if data else []
+
+    async def get_inbound(self, inbound_id: int) -> Optional[Dict[str, Any]]:
+        """Get a single inbound by ID"""
+        data = await self._request('GET', f'/panel/api/inbounds/get/{inbound_id}')
+        return data.get('obj') if data else None
+
+    async def add_client_to_inbound(self, inbound_id: int, client_data: Dict) -> bool:
+        """
+        Add client(s) to inbound
+
+        Args:
+            inbound_id: Inbound ID
+            client_data: Settings dict with a ``clients`` list (see create_client_settings)
+
+        Returns:
+            True if successful
+        """
+        data = await self._request(
+            'POST',
+            '/panel/api/inbounds/addClient',
+            json={"id": inbound_id, "settings": json.dumps(client_data)}
+        )
+        if data:
+            emails = [c.get('email') for c in client_data.get('clients', [])]
+            logger.info(f"Added clients {emails} to inbound {inbound_id} on {self.server.name}")
+            return True
+        return False
+
+    async def apply_client_changes(
+        self,
+        inbound_id: int,
+        adds: Optional[List[Dict]] = None,
+        removes: Optional[List[str]] = None,
+        updates: Optional[Dict[str, Dict]] = None
+    ) -> Optional[Dict[str, List[str]]]:
+        """
+        Apply batched client changes with one fetch and one update
+
+        Same semantics as XUIEnhancedService.apply_client_changes.
+        """
+        inbound = await self.get_inbound(inbound_id)
+        if not inbound:
+            logger.error(f"Inbound {inbound_id} not found on {self.server.name}")
+            return None
+
+        settings_data, result = merge_client_changes(inbound, adds, removes, updates)
+        if not (result['added'] or result['removed'] or result['updated']):
+            return result
+
+        data = await self._request(
+            'POST',
+            f'/panel/api/inbounds/update/{inbound_id}',
+            json={"id": inbound_id, "settings": json.dumps(settings_data)}
+        )
+        return result if data else None
+
+    async def remove_client_from_inbound(self, inbound_id: int, client_email: str) -> bool:
+        """Remove client from inbound by email or UUID"""
+        result = await self.apply_client_changes(inbound_id, removes=[client_email])
+        return bool(result and result['removed'])
+
+    async def get_client_traffic(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get client traffic statistics"""
+        data = await self._request('GET', f'/panel/api/inbounds/getClientTraffics/{email}')
+        return data.get('obj') if data else None
+
+    async def get_online_clients(self) -> List[str]:
+        """Get emails of online clients"""
+        data = await self._request('POST', '/panel/api/inbounds/onlines')
+        return (data.get('obj') or []) if data else []
+
+
+class AsyncSUIClient:
+    """
+    Async S-UI API Client (API v2, token auth)
+
+    Mirrors the operations of SUIClient without blocking the event loop.
+    """
+
+    def __init__(self, server):
+        """
+        Initialize async S-UI client
+
+        Args:
+            server: XUIServer instance with server_type 'sui'
+        """
+        self.server = server
+        protocol = "https" if getattr(server, 'use_ssl', False) else "http"
+        base_path = (getattr(server, 'web_base_path', None) or '/app').rstrip('/')
+        self.base_url = f"{protocol}://{server.host}:{server.port}{base_path}"
+        api_token = server.api_token or getattr(settings, 'SUI_API_TOKEN', '')
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json',
+            'User-Agent': 'Django-SUI-Bot/1.0'
+        }
+        if api_token:
+            self.headers['Authorization'] = f'Bearer {api_token}'
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        return get_panel_session(self.base_url, self.headers)
+
+    async def _request(self, method: str, endpoint: str, data: Optional[Dict] = None) -> Optional[Dict[str, Any]]:
+        """
+        Make request to S-UI API
+
+        Returns:
+            Response JSON or None on error (immediately while the panel's circuit is open)
+        """
+        breaker = get_server_breaker(self.server)
+        if not breaker.allow():
+            logger.warning(f"Circuit open for {self.server.name}, skipping {endpoint}")
+            return None
+
+        try:
+            status, result = await _send(
+                self.session,
+                get_panel_retry_policy('sui-async'),
+                method,
+                f"{self.base_url}{endpoint}",
+                json=data
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Error calling S-UI {endpoint} on {self.server.name}: {e}")
+            breaker.record_failure()
+            return None
+        except json.JSONDecodeError as e:
+            logger.error(f"Invalid JSON from S-UI {endpoint} on {self.server.name}: {e}")
+            return None
+
+        if status >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+        if status == 401:
+            logger.error(f"S-UI authentication failed for {self.server.name}")
+            return None
+        if status not in (200, 201):
+            logger.warning(f"S-UI {endpoint} returned {status}")
+            return None
+
+        return result if result and result.get('success') else None
+
+    async def get_inbounds(self) -> List[Dict[str, Any]]:
+        """Get list of all inbounds"""
+        result = await self._request('GET', '/api/v2/inbounds')
+        return result.get('data', []) if result else []
+
+    async def get_inbound_by_id(self, inbound_id: int) -> Optional[Dict[str, Any]]:
+        """Get inbound by ID"""
+        result = await self._request('GET', f'/api/v2/inbounds/{inbound_id}')
+        return result.get('data') if result else None
+
+    async def apply_client_changes(
+        self,
+        inbound_id: int,
+        adds: Optional[List[Dict]] = None,
+        removes: Optional[List[str]] = None,
+        updates: Optional[Dict[str, Dict]] = None
+    ) -> Optional[Dict[str, List[str]]]:
+        """Apply batched client changes with one fetch and one PUT"""
+        inbound = await self.get_inbound_by_id(inbound_id)
+        if not inbound:
+            return None
+
+        settings_data, result = merge_client_changes(inbound, adds, removes, updates)
+        if not (result['added'] or result['removed'] or result['updated']):
+            return result
+
+        response = await self._request(
+            'PUT',
+            f'/api/v2/inbounds/{inbound_id}',
+            data={"id": inbound_id, "settings": json.dumps(settings_data)}
+        )
+        return result if response else None
+
+    async def add_client_to_inbound(self, inbound_id: int, client: Dict) -> bool:
+        """Add a client dict to inbound (no-op if the email already exists)"""
+        return await self.apply_client_changes(inbound_id, adds=[client]) is not None
+
+    async def remove_client_from_inbound(self, inbound_id: int, email: str) -> bool:
+        """Remove client from inbound"""
+        result = await self.apply_client_changes(inbound_id, removes=[email])
+        return bool(result and result['removed'])
+
+    async def get_client_traffic(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get client traffic statistics"""
+        result = await self._request('GET', f'/api/v2/clients/{email}/traffic')
+        return result.get('data') if result else None
+
+    async def health_check(self) -> bool:
+        """Check S-UI server health"""
+        return await self._request('GET', '/api/v2/system/info') is not None
+
+
+def get_async_client(server):
+    """Return the async client matching the server type"""
+    if getattr(server, 'server_type', 'xui') == 'sui':
+        return AsyncSUIClient(server)
+    return AsyncXUIClient(server)
@@ -0,0 +1,346 @@
+"""
+Telegram Broadcast Engine
+Sends many messages concurrently under one rate limit per bot, with per-message dedup
+"""
+import asyncio
+import logging
+import random
+import time
+from dataclasses import asdict, dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+import redis
+from django.conf import settings
+
+from core.redis_client import get_redis
+from .telegram_runtime import get_bot, run_telegram
+
+logger = logging.getLogger(__name__)
+
+DEDUP_PREFIX = 'broadcast:sent'
+RATE_PREFIX = 'telegram:rate'
+
+# Take the bot's next send slot (one per ARGV[1] microseconds, shared by every
+# process); returns the microseconds to wait before trying again (0 = send now)
+RATE_SCRIPT = """
+local paused = redis.call('PTTL', KEYS[2])
+if paused > 0 then
+    return paused * 1000
+end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000000 + tonumber(t[2])
+local interval = tonumber(ARGV[1])
+local next_slot = tonumber(redis.call('GET', KEYS[1]) or now)
+if next_slot > now then
+    return next_slot - now
+end
+redis.call('SET', KEYS[1], string.format('%.0f', now + interval), 'PX', math.ceil(interval / 1000) + 1000)
+return 0
+"""
+
+# deliver() outcomes
+SENT, DUPLICATE, REJECTED, GAVE_UP = 'sent', 'duplicate', 'rejected', 'gave_up'
+
+
+@dataclass
+class OutboundMessage:
+    """One message to deliver"""
+    chat_id: int
+    text: str
+    parse_mode: Optional[str] = None
+    # delivered at most once per key while the Redis marker lives
+    dedup_key: Optional[str] = None
+    # InlineKeyboardMarkup.to_dict(), so messages stay serializable
+    reply_markup: Optional[Dict] = None
+    reply_to_message_id: Optional[int] = None
+
+
+@dataclass
+class BroadcastResult:
+    """Outcome of a broadcast"""
+    sent: int = 0
+    failed: int = 0
+    throttled: int = 0   # RetryAfter responses received from Telegram
+    duplicates: int = 0  # skipped because their dedup key was already sent
+
+    def as_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+class TokenBucket:
+    """
+    Async token bucket
+
+    ``rate`` tokens are added per second up to ``capacity``; acquire() waits
+    for a token. pause() empties the bucket and holds every caller until
+    the pause is over, which is how a RetryAfter from Telegram (a global
+    flood limit) slows the whole broadcast rather than one sender.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class SharedRateLimit:
+    """
+    Rate limit of one bot token, shared through Redis by every process
+
+    Telegram's limit (about 30 msg/s) is per bot, while expiry broadcasts
+    run in Celery workers and notifications in the sender process. Each
+    acquire() reserves the next send slot of the bot in Redis, so all of
+    them together stay under ``rate``; a RetryAfter pause is stored there
+    too and holds every sender of the bot. Senders of one bot configured
+    with different rates share the slots, so together they never exceed
+    the highest of them. If Redis is unavailable the limit falls back to a
+    TokenBucket in this process. Same interface as TokenBucket.
+    """
+
+    def __init__(self, token: str, rate: float, redis_client: redis.Redis):
+        bot_id = token.split(':', 1)[0]
+        self.keys = [f'{RATE_PREFIX}:{bot_id}', f'{RATE_PREFIX}:{bot_id}:paused']
+        self.interval_us = int(1_000_000 / rate)
+        self.redis = redis_client
+        self._script = redis_client.register_script(RATE_SCRIPT)
+        self._local = TokenBucket(rate, capacity=1)
+
+    async def acquire(self) -> None:
+        while True:
+            try:
+                wait_us = int(await asyncio.to_thread(self._script, keys=self.keys, args=[self.interval_us]))
+            except redis.RedisError as e:
+                logger.warning(f"Shared Telegram rate limit unavailable, limiting locally: {e}")
+                await self._local.acquire()
+                return
+            if wait_us <= 0:
+                return
+            await asyncio.sleep(wait_us / 1_000_000)
+
+    def pause(self, seconds: float) -> None:
+        self._local.pause(seconds)
+        try:
+            self.redis.set(self.keys[1], 1, px=max(1, int(seconds * 1000)))
+        except redis.RedisError as e:
+            logger.warning(f"Could not share Telegram flood pause: {e}")
+
+
+def _retry_after_seconds(error) -> float:
+    value = getattr(error, 'retry_after', None)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    return float(value) if value is not None else 1.0
+
+
+class BroadcastEngine:
+    """
+    Concurrent, rate-limited sender for Telegram messages
+
+    Up to ``concurrency`` sends are in flight, all drawing from the bot's
+    SharedRateLimit of ``rate`` messages per second (Telegram allows about
+    30/s per bot), which every process sending with the same token shares.
+    RetryAfter pauses the limit for the requested time and the message is
+    retried; network errors are retried with jittered backoff;
+    Forbidden/BadRequest (blocked bot, unknown chat) fail immediately.
+
+    Messages with a dedup_key are claimed in Redis (SET NX) before sending
+    and released again if delivery fails, so a key is delivered once even
+    across runs and workers. Redis being down never blocks delivery.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        rate: Optional[float] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        dedup_ttl: Optional[int] = None,
+        redis_client: Optional[redis.Redis] = None
+    ):
+        """
+        Args:
+            token: Bot token
+            rate: Messages per second (BROADCAST_RATE)
+            concurrency: Sends in flight (BROADCAST_CONCURRENCY)
+            max_retries: Retries per message after the first attempt (BROADCAST_MAX_RETRIES)
+            dedup_ttl: Seconds a dedup key is remembered (BROADCAST_DEDUP_TTL)
+            redis_client: Redis client for dedup markers (defaults to the shared one)
+        """
+        self.token = token
+        self.rate = rate or getattr(settings, 'BROADCAST_RATE', 25)
+        self.concurrency = concurrency or getattr(settings, 'BROADCAST_CONCURRENCY', 10)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'BROADCAST_MAX_RETRIES', 3)
+        self.dedup_ttl = dedup_ttl or getattr(settings, 'BROADCAST_DEDUP_TTL', 86400)
+        self._redis = redis_client
+
+    @property
+    def redis(self) -> redis.Redis:
+        if self._redis is None:
+            self._redis = get_redis()
+        return self._redis
+
+    def _claim(self, key: str) -> bool:
+        try:
+            return bool(self.redis.set(f'{DEDUP_PREFIX}:{key}', 1, nx=True, ex=self.dedup_ttl))
+        except redis.RedisError as e:
+            logger.warning(f"Broadcast dedup unavailable, sending {key} anyway: {e}")
+            return True
+
+    def _release(self, key: str) -> None:
+        try:
+            self.redis.delete(f'{DEDUP_PREFIX}:{key}')
+        except redis.RedisError as e:
+            logger.warning(f"Could not release broadcast dedup key {key}: {e}")
+
+    def rate_limit(self, token: Optional[str] = None) -> SharedRateLimit:
+        """The shared rate limit of a bot token (this engine's by default)"""
+        return SharedRateLimit(token or self.token, self.rate, self.redis)
+
+    def _make_bot(self):
+        from telegram import Bot
+        from telegram.request import HTTPXRequest
+
+        return Bot(token=self.token, request=HTTPXRequest(connection_pool_size=self.concurrency))
+
+    async def send(self, messages: Iterable[OutboundMessage], bot=None) -> BroadcastResult:
+        """
+        Deliver messages
+
+        Args:
+            messages: Messages to send (evaluated up front; build them before
+                entering the event loop if they come from the ORM)
+            bot: Initialized telegram.Bot to reuse (one is created otherwise)
+
+        Returns:
+            BroadcastResult with sent/failed/throttled/duplicate counts
+        """
+        messages: List[OutboundMessage] = list(messages)
+        result = BroadcastResult()
+        if not messages:
+            return result
+
+        if bot is None:
+            async with self._make_bot() as own_bot:
+                await self._send_all(own_bot, messages, result)
+        else:
+            await self._send_all(bot, messages, result)
+
+        logger.info(f"Broadcast finished: {result.as_dict()}")
+        return result
+
+    async def _send_all(self, bot, messages: List[OutboundMessage], result: BroadcastResult) -> None:
+        bucket = self.rate_limit()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(message: OutboundMessage) -> None:
+            async with semaphore:
+                await self.deliver(bot, bucket, message, result)
+
+        await asyncio.gather(*(deliver(message) for message in messages))
+
+    async def _send_message(self, bot, message: OutboundMessage, parse_mode: Optional[str]) -> None:
+        from telegram import InlineKeyboardMarkup
+
+        reply_markup = None
+        if message.reply_markup:
+            reply_markup = InlineKeyboardMarkup.de_json(message.reply_markup, bot)
+        await bot.send_message(
+            chat_id=message.chat_id,
+            text=message.text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup,
+            reply_to_message_id=message.reply_to_message_id,
+        )
+
+    async def deliver(self, bot, bucket, message: OutboundMessage, result: BroadcastResult) -> str:
+        """
+        Deliver one message under a rate limit (SharedRateLimit or TokenBucket)
+
+        Returns:
+            SENT, DUPLICATE, REJECTED (Telegram refused it for good) or
+            GAVE_UP (transient errors outlasted max_retries)
+        """
+        from telegram.error import BadRequest, Forbidden, RetryAfter
+
+        if message.dedup_key and not await asyncio.to_thread(self._claim, message.dedup_key):
+            result.duplicates += 1
+            return DUPLICATE
+
+        parse_mode = message.parse_mode
+        outcome = GAVE_UP
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                await self._send_message(bot, message, parse_mode)
+                result.sent += 1
+                return SENT
+            except RetryAfter as e:
+                result.throttled += 1
+                wait = _retry_after_seconds(e)
+                logger.warning(f"Telegram flood limit hit, pausing broadcast for {wait:.0f}s")
+                bucket.pause(wait)
+                error = e
+            except BadRequest as e:
+                if parse_mode and 'parse entities' in str(e).lower():
+                    # broken markup in user-supplied text: send it as plain text instead
+                    parse_mode = None
+                    continue
+                logger.info(f"Message to {message.chat_id} rejected: {e}")
+                outcome = REJECTED
+                break
+            except Forbidden as e:
+                logger.info(f"Message to {message.chat_id} rejected: {e}")
+                outcome = REJECTED
+                break
+            except Exception as e:
+                error = e
+                await asyncio.sleep(random.uniform(0, min(8, 0.5 * (2 ** attempt))))
+
+            attempt += 1
+            if attempt > self.max_retries:
+                logger.error(f"Giving up on message to {message.chat_id}: {error}")
+                break
+
+        result.failed += 1
+        if message.dedup_key:
+            await asyncio.to_thread(self._release, message.dedup_key)
+        return outcome
+
+
+def run_broadcast(token: str, messages: Iterable[OutboundMessage], **kwargs) -> BroadcastResult:
+    """
+    Blocking entry point for Celery tasks
+
+    Runs on the worker's Telegram runtime, so consecutive broadcasts reuse one
+    Bot and its open connections instead of reconnecting every time.
+    """
+    engine = BroadcastEngine(token, **kwargs)
+    messages = list(messages)
+
+    async def broadcast() -> BroadcastResult:
+        return await engine.send(messages, bot=await get_bot(token))
+
+    return run_telegram(broadcast())
@@ -0,0 +1,154 @@
+"""
+Inbound Capacity Index
+Redis sorted sets of inbounds ordered by free slots, shared by bots and workers
+"""
+import logging
+from typing import Optional
+
+import redis
+from django.db.models import Q
+
+from core.redis_client import get_redis
+from .models import XUIInbound, XUIServer
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'capacity'
+MEMBERS_KEY = f'{KEY_PREFIX}:members'
+
+# Take one slot from the inbound with the most free slots; drop it when full
+RESERVE_SCRIPT = """
+local top = redis.call('ZREVRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #top == 0 then
+    return false
+end
+if tonumber(top[2]) <= 1 then
+    redis.call('ZREM', KEYS[1], top[1])
+else
+    redis.call('ZINCRBY', KEYS[1], -1, top[1])
+end
+return top[1]
+"""
+
+# Give slots back, but only to inbounds that are still indexed
+RELEASE_SCRIPT = """
+if redis.call('SISMEMBER', KEYS[2], ARGV[1]) == 1 then
+    redis.call('ZINCRBY', KEYS[1], ARGV[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+def index_key(server_type: str, protocol: str) -> str:
+    return f'{KEY_PREFIX}:{server_type}:{protocol}'
+
+
+def server_key(server_id) -> str:
+    return f'{KEY_PREFIX}:server:{server_id}'
+
+
+class CapacityIndex:
+    """
+    Per (server type, protocol) heap of inbounds keyed by free slots
+
+    Each heap is a Redis sorted set (inbound id -> free slots), so picking the
+    least-loaded inbound is a single O(log n) script call. The index is rebuilt
+    per server by sync_server_stats and kept current by reserve/release; the
+    database conditional UPDATE remains the source of truth, so a stale entry
+    only costs a retry.
+    """
+
+    def __init__(self, client: Optional[redis.Redis] = None):
+        self.client = client or get_redis()
+        self._reserve = self.client.register_script(RESERVE_SCRIPT)
+        self._release = self.client.register_script(RELEASE_SCRIPT)
+
+    def rebuild_server(self, server: XUIServer) -> int:
+        """
+        Replace the index entries of one server
+
+        Args:
+            server: XUIServer instance
+
+        Returns:
+            Number of inbounds indexed with free slots
+        """
+        if server.is_active and server.health_status != 'unhealthy' and not server.is_deleted:
+            inbounds = list(
+                XUIInbound.objects.filter(server=server, is_active=True)
+                .values_list('id', 'protocol', 'max_clients', 'current_clients')
+            )
+        else:
+            inbounds = []
+
+        old_entries = self.client.smembers(server_key(server.id))
+        pipe = self.client.pipeline(transaction=True)
+        for entry in old_entries:
+            key, member = entry.rsplit('|', 1)
+            pipe.zrem(key, member)
+            pipe.srem(MEMBERS_KEY, member)
+        pipe.delete(server_key(server.id))
+
+        indexed = 0
+        for inbound_id, protocol, max_clients, current_clients in inbounds:
+            key = index_key(server.server_type, protocol)
+            member = str(inbound_id)
+            pipe.sadd(MEMBERS_KEY, member)
+            pipe.sadd(server_key(server.id), f'{key}|{member}')
+            free = max_clients - current_clients
+            if free > 0:
+                pipe.zadd(key, {member: free})
+                indexed += 1
+        pipe.execute()
+
+        return indexed
+
+    def rebuild_all(self) -> int:
+        """Rebuild the index for every server"""
+        servers = XUIServer.objects.filter(Q(is_deleted=False) | Q(is_deleted__isnull=True))
+        return sum(self.rebuild_server(server) for server in servers)
+
+    def drop_server(self, server_id) -> None:
+        """Remove all entries of a server (e.g. after it was deleted)"""
+        old_entries = self.client.smembers(server_key(server_id))
+        pipe = self.client.pipeline(transaction=True)
+        for entry in old_entries:
+            key, member = entry.rsplit('|', 1)
+            pipe.zrem(key, member)
+            pipe.srem(MEMBERS_KEY, member)
+        pipe.delete(server_key(server_id))
+        pipe.execute()
+
+    def reserve(self, server_type: str, protocol: str) -> Optional[str]:
+        """Take one slot from the least-loaded inbound; returns the inbound id"""
+        return self._reserve(keys=[index_key(server_type, protocol)]) or None
+
+    def release(self, inbound: XUIInbound, count: int = 1) -> None:
+        """Give slots back to an inbound"""
+        self._release(
+            keys=[index_key(inbound.server.server_type, inbound.protocol), MEMBERS_KEY],
+            args=[str(inbound.id), count]
+        )
+
+    def consume(self, inbound: XUIInbound) -> None:
+        """Record a slot taken outside the index (e.g. by the database fallback)"""
+        key = index_key(inbound.server.server_type, inbound.protocol)
+        member = str(inbound.id)
+        if self.client.zincrby(key, -1, member) <= 0:
+            self.client.zrem(key, member)
+
+    def discard(self, server_type: str, protocol: str, inbound_id: str) -> None:
+        """Drop a stale entry that the database refused"""
+        self.client.zrem(index_key(server_type, protocol), inbound_id)
+
+
+_index: Optional[CapacityIndex] = None
+
+
+def get_capacity_index() -> CapacityIndex:
+    """Get the process-wide capacity index"""
+    global _index
+    if _index is None:
+        _index = CapacityIndex()
+    return _index
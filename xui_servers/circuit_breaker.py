@@ -0,0 +1,199 @@
+"""
+Per-panel Circuit Breakers
+Lets every panel client fail fast while a panel is down instead of retrying against it
+"""
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+import redis
+from django.conf import settings
+
+from core.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+SHARED_KEY = 'circuit:open:{}'
+
+
+def breaker_key(host: str, port) -> str:
+    """Breaker key of a panel; clients only know host and port, not the XUIServer row"""
+    return f"{host}:{port}"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one panel
+
+    - closed: calls go through; consecutive failures are counted
+    - open: calls are refused until reset_timeout has passed
+    - half_open: one trial call is let through; its outcome closes or re-opens
+
+    Besides its own failure count, the breaker honours a shared "open" marker
+    in Redis written by the health prober, so every process stops calling a
+    panel the prober found dead. The marker is looked up at most once per
+    CIRCUIT_SHARED_CHECK_INTERVAL seconds per process.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        key: str,
+        failure_threshold: Optional[int] = None,
+        reset_timeout: Optional[float] = None
+    ):
+        """
+        Args:
+            key: Panel key (see breaker_key)
+            failure_threshold: Consecutive failures that open the breaker
+            reset_timeout: Seconds to stay open before a trial call
+        """
+        self.key = key
+        self.failure_threshold = failure_threshold or getattr(settings, 'CIRCUIT_FAILURE_THRESHOLD', 3)
+        self.reset_timeout = reset_timeout or getattr(settings, 'CIRCUIT_RESET_TIMEOUT', 30)
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._shared_open = False
+        self._shared_checked_at = 0.0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def is_open(self) -> bool:
+        """True while calls would be refused (does not use up the half-open trial)"""
+        with self._lock:
+            if self._current_state() == self.OPEN:
+                return True
+        return self._is_shared_open()
+
+    def allow(self) -> bool:
+        """
+        Ask permission for one call to the panel
+
+        Returns:
+            False if the call must be skipped
+        """
+        if self._is_shared_open():
+            return False
+
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """Close the breaker after a successful call"""
+        with self._lock:
+            was_half_open = self._state == self.HALF_OPEN
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+        if was_half_open:
+            logger.info(f"Circuit for panel {self.key} closed")
+
+    def record_failure(self) -> None:
+        """Count a failed call; opens the breaker past the threshold or on a failed trial"""
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                opened = self._state != self.OPEN
+                self._open()
+            else:
+                opened = False
+
+        if opened:
+            logger.warning(
+                f"Circuit for panel {self.key} opened after {self._failures} failure(s), "
+                f"failing fast for {self.reset_timeout}s"
+            )
+
+    def trip(self, ttl: int) -> None:
+        """
+        Open the breaker in every process (used by the health prober)
+
+        Args:
+            ttl: Seconds the shared marker lives unless refreshed or cleared
+        """
+        with self._lock:
+            self._open()
+        self._shared_open = True
+        self._shared_checked_at = time.monotonic()
+
+        try:
+            get_redis().set(SHARED_KEY.format(self.key), 1, ex=ttl)
+        except redis.RedisError as e:
+            logger.warning(f"Could not share open circuit of panel {self.key}: {e}")
+
+    def reset(self) -> None:
+        """Close the breaker in every process (used by the health prober)"""
+        self.record_success()
+        self._shared_open = False
+        self._shared_checked_at = time.monotonic()
+
+        try:
+            get_redis().delete(SHARED_KEY.format(self.key))
+        except redis.RedisError as e:
+            logger.warning(f"Could not clear shared circuit of panel {self.key}: {e}")
+
+    def _open(self) -> None:
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_in_flight = False
+
+    def _is_shared_open(self) -> bool:
+        interval = getattr(settings, 'CIRCUIT_SHARED_CHECK_INTERVAL', 5)
+        now = time.monotonic()
+        if now - self._shared_checked_at < interval:
+            return self._shared_open
+
+        try:
+            self._shared_open = bool(get_redis().exists(SHARED_KEY.format(self.key)))
+        except redis.RedisError:
+            # Redis being down must not take the panels down with it
+            self._shared_open = False
+        self._shared_checked_at = now
+        return self._shared_open
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+
+
+def get_breaker(key: str) -> CircuitBreaker:
+    """Get the process-wide breaker of a panel"""
+    breaker = _breakers.get(key)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(key, CircuitBreaker(key))
+    return breaker
+
+
+def get_server_breaker(server) -> CircuitBreaker:
+    """Get the breaker of an XUIServer"""
+    return get_breaker(breaker_key(server.host, server.port))
+
+
+def reset_breakers() -> None:
+    """Forget all breakers of this process"""
+    with _lock:
+        _breakers.clear()
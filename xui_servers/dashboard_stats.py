@@ -0,0 +1,153 @@
+"""
+Dashboard Statistics Snapshot
+Fleet-wide counters for the admin dashboards, computed with a handful of
+conditional aggregates and cached in Redis by a beat task
+"""
+import json
+import logging
+from typing import Any, Dict, Optional
+
+import redis
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from core.redis_client import get_redis
+from .models import UserConfig, XUIClient, XUIInbound, XUIServer
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_KEY = 'dashboard:stats'
+
+
+def compute_dashboard_stats() -> Dict[str, Any]:
+    """
+    Count everything the dashboards show
+
+    One conditional aggregate per table plus two grouped queries for the
+    per-server breakdown, regardless of how many servers and inbounds exist.
+
+    Returns:
+        Flat dict of counters, a ``servers`` list (name, inbounds, clients)
+        and the ``computed_at`` ISO timestamp
+    """
+    from accounts.models import UsersModel
+    from plan.models import ConfingPlansModel
+    from order.models import OrderUserModel, PayMentModel
+    from conf.models import TrialConfigModel
+
+    now = timezone.now()
+    stats: Dict[str, Any] = {}
+
+    stats.update(UsersModel.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(is_active=True)),
+    ))
+    stats.update(XUIServer.objects.aggregate(
+        total_servers=Count('id'),
+        active_servers=Count('id', filter=Q(is_active=True)),
+    ))
+    stats['active_inbounds'] = XUIInbound.objects.filter(is_active=True).count()
+    stats['active_clients'] = XUIClient.objects.filter(is_active=True).count()
+    stats.update(UserConfig.objects.aggregate(
+        total_configs=Count('id'),
+        active_configs=Count('id', filter=Q(is_active=True)),
+        expired_configs=Count('id', filter=Q(expires_at__lt=now)),
+        active_expired_configs=Count('id', filter=Q(is_active=True, expires_at__lt=now)),
+    ))
+    stats.update(ConfingPlansModel.objects.aggregate(
+        total_plans=Count('id'),
+        active_plans=Count('id', filter=Q(is_active=True)),
+    ))
+    stats.update(OrderUserModel.objects.aggregate(
+        total_orders=Count('id'),
+        active_orders=Count('id', filter=Q(is_active=True)),
+    ))
+    stats.update(PayMentModel.objects.aggregate(
+        total_payments=Count('id'),
+        approved_payments=Count('id', filter=Q(is_active=True, rejected=False)),
+        pending_payments=Count('id', filter=Q(is_active=False, rejected=False)),
+        rejected_payments=Count('id', filter=Q(rejected=True)),
+    ))
+    stats.update(TrialConfigModel.objects.aggregate(
+        total_trials=Count('id'),
+        active_trials=Count('id', filter=Q(is_active=True)),
+    ))
+
+    inbounds_per_server = dict(
+        XUIInbound.objects.filter(is_active=True)
+        .values_list('server_id')
+        .annotate(count=Count('id'))
+    )
+    clients_per_server = dict(
+        XUIClient.objects.filter(inbound__is_active=True)
+        .exclude(inbound__is_deleted=True)
+        .values_list('inbound__server_id')
+        .annotate(count=Count('id'))
+    )
+    stats['servers'] = [
+        {
+            'name': name,
+            'inbounds': inbounds_per_server.get(server_id, 0),
+            'clients': clients_per_server.get(server_id, 0),
+        }
+        for server_id, name in XUIServer.objects.filter(is_active=True).values_list('id', 'name')
+    ]
+
+    stats['computed_at'] = now.isoformat()
+    return stats
+
+
+def store_dashboard_stats(stats: Dict[str, Any]) -> None:
+    """Publish a snapshot for every process; it expires after DASHBOARD_STATS_TTL"""
+    get_redis().set(
+        SNAPSHOT_KEY,
+        json.dumps(stats),
+        ex=getattr(settings, 'DASHBOARD_STATS_TTL', 300)
+    )
+
+
+def refresh_dashboard_stats() -> Dict[str, Any]:
+    """Recompute the snapshot and publish it"""
+    stats = compute_dashboard_stats()
+    try:
+        store_dashboard_stats(stats)
+    except redis.RedisError as e:
+        logger.warning(f"Could not store dashboard stats: {e}")
+    return stats
+
+
+def get_dashboard_stats() -> Dict[str, Any]:
+    """
+    Dashboard statistics in one Redis read
+
+    Falls back to computing (and publishing) the snapshot when it is
+    missing, expired or Redis is unavailable.
+    """
+    stats = _read_snapshot()
+    if stats is not None:
+        return stats
+    return refresh_dashboard_stats()
+
+
+def _read_snapshot() -> Optional[Dict[str, Any]]:
+    try:
+        raw = get_redis().get(SNAPSHOT_KEY)
+    except redis.RedisError as e:
+        logger.warning(f"Could not read dashboard stats: {e}")
+        return None
+    if not raw:
+        return None
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return None
+
+
+def format_server_stats(stats: Dict[str, Any]) -> str:
+    """Per-server lines shown under the dashboard totals"""
+    lines = [
+        f"• {server['name']}: {server['inbounds']} inbound, {server['clients']} کلاینت"
+        for server in stats.get('servers', [])
+    ]
+    return "\n".join(lines) if lines else "هیچ سروری یافت نشد"
@@ -7,13 +7,80 @@ import json
 import uuid
 import random
 import string
-from typing import Dict, List, Optional, Any
+import time
+from contextlib import closing
+from typing import Dict, Iterator, List, Optional, Any
 from datetime import datetime, timedelta
+from django.db import transaction
 from django.utils import timezone
 from .models import XUIServer, XUIInbound, XUIClient, UserConfig
+from .session_registry import panel_sessions
+from .circuit_breaker import get_server_breaker
+from .retry_policy import get_panel_retry_policy
+from .json_stream import PanelInbound, iter_json_array
+from .inbound_sync import bulk_sync_inbounds
 from accounts.models import UsersModel
 from plan.models import ConfingPlansModel
 
+
+def merge_client_changes(
+    inbound: Dict,
+    adds: Optional[List[Dict]] = None,
+    removes: Optional[List[str]] = None,
+    updates: Optional[Dict[str, Dict]] = None
+):
+    """
+    اعمال تغییرات کلاینت‌ها روی تنظیمات یک inbound در حافظه
+    
+    کلاینت‌ها در removes و updates با email یا id (UUID) شناسایی می‌شوند و
+    کلاینت‌های تکراری (با email موجود در inbound، حتی اگر در همین دسته حذف
+    شوند) دوباره اضافه نمی‌شوند.
+    
+    Returns:
+        (settings جدید, دیکشنری نتیجه با کلیدهای added, removed, updated, missing)
+    """
+    adds = adds or []
+    removes = set(removes or [])
+    updates = updates or {}
+    result = {'added': [], 'removed': [], 'updated': [], 'missing': []}
+    
+    settings = inbound.get('settings', '{}')
+    if isinstance(settings, str):
+        settings = json.loads(settings or '{}')
+    clients = settings.get('clients', [])
+    
+    remaining_clients = []
+    for client in clients:
+        keys = {client.get('email'), client.get('id')}
+        matched_remove = keys & removes
+        if matched_remove:
+            result['removed'].extend(matched_remove)
+            continue
+        
+        for key in keys:
+            if key in updates:
+                client.update(updates[key])
+                result['updated'].append(key)
+                break
+        
+        remaining_clients.append(client)
+    
+    # تکراری بودن با کلاینت‌های inbound پیش از حذف‌ها سنجیده می‌شود
+    existing_emails = {client.get('email') for client in clients}
+    for client in adds:
+        if client.get('email') in existing_emails:
+            continue
+        remaining_clients.append(client)
+        existing_emails.add(client.get('email'))
+        result['added'].append(client.get('email'))
+    
+    seen = set(result['removed']) | set(result['updated'])
+    result['missing'] = [key for key in list(removes) + list(updates) if key not in seen]
+    
+    settings['clients'] = remaining_clients
+    return settings, result
+
+
 class XUIEnhancedService:
     """سرویس پیشرفته برای مدیریت X-UI با API جدید"""
     
@@ -28,19 +95,72 @@ class XUIEnhancedService:
             self.base_url += server.web_base_path
         self.base_url = self.base_url.rstrip('/')
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': 'Django-XUI-Bot/3.0',
-            'Accept': 'application/json'
-        })
+        # session مشترک و احراز هویت شده برای این سرور در کل پروسه
+        self._panel = panel_sessions.get(server)
+        self.session = self._panel.session
+        self.breaker = get_server_breaker(server)
+        self.retry_policy = get_panel_retry_policy('xui')
+    
+    @property
+    def _token(self) -> Optional[str]:
+        return self._panel.token
+    
+    @_token.setter
+    def _token(self, value: Optional[str]):
+        self._panel.token = value
+    
+    @property
+    def _cookies(self) -> Dict:
+        return self._panel.cookies
+    
+    @_cookies.setter
+    def _cookies(self, value: Dict):
+        self._panel.cookies = value
+    
+    def ensure_login(self) -> bool:
+        """ورود فقط در صورتی که session مشترک هنوز احراز هویت نشده باشد"""
+        return self._panel.ensure_authenticated(self.login)
+    
+    def _request(self, method: str, endpoint: str, **kwargs) -> Optional[requests.Response]:
+        """
+        ارسال درخواست به پنل؛ ورود مجدد فقط در صورت دریافت 401
         
-        # تنظیم SSL verification
-        verify_ssl = getattr(settings, 'XUI_VERIFY_SSL', False)
-        self.session.verify = verify_ssl
+        تا وقتی circuit breaker این پنل باز است درخواستی ارسال نمی‌شود و
+        بلافاصله None برمی‌گردد. خطاهای گذرا طبق retry_policy (با سقف زمانی
+        کل) دوباره تلاش می‌شوند.
+        """
+        if not self.breaker.allow():
+            print(f"⚠️ پنل {self.server.name} در دسترس نیست (circuit باز است)، درخواست {endpoint} ارسال نشد")
+            return None
+        
+        try:
+            if not self.ensure_login():
+                self.breaker.record_failure()
+                return None
+            
+            url = f"{self.base_url}{endpoint}"
+            
+            def send(timeout):
+                return self.session.request(method, url, timeout=timeout, **kwargs)
+            
+            # ارسال مجدد پس از ورود هم از همان سقف زمانی کل مصرف می‌کند
+            started = time.monotonic()
+            response = self.retry_policy.execute(send, method=method, timeout=30, started=started)
+            
+            if response.status_code == 401:
+                self._panel.invalidate_auth()
+                if not self.ensure_login() or self.retry_policy.deadline_exceeded(started):
+                    return response
+                response = self.retry_policy.execute(send, method=method, timeout=30, started=started)
+        except requests.exceptions.RequestException:
+            self.breaker.record_failure()
+            raise
         
-        self._token = None
-        self._cookies = {}
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
     
     def login(self) -> bool:
         """ورود به X-UI با API جدید"""
@@ -84,18 +204,9 @@ class XUIEnhancedService:
     def get_inbounds(self) -> List[Dict]:
         """دریافت لیست inbound ها"""
         try:
-            if not self._token and not self._cookies:
-                if not self.login():
-                    return []
-            
-            # تنظیم کوکی‌ها
-            if self._cookies:
-                self.session.cookies.update(self._cookies)
-            
-            response = self.session.get(
-                f"{self.base_url}/panel/api/inbounds/list",
-                timeout=30
-            )
+            response = self._request('GET', "/panel/api/inbounds/list")
+            if response is None:
+                return []
             
             if response.status_code == 200:
                 data = response.json()
@@ -109,32 +220,48 @@ class XUIEnhancedService:
             print(f"خطا در دریافت inbound ها: {e}")
             return []
     
+    def iter_inbounds(self) -> Iterator[PanelInbound]:
+        """
+        دریافت inbound ها به صورت جریانی (یکی یکی)
+        
+        پاسخ در حین دانلود پارس می‌شود تا مصرف حافظه برای پنل‌های بزرگ ثابت
+        بماند؛ settings هر inbound فقط هنگام دسترسی به clients دیکود می‌شود.
+        اگر جریان نیمه‌کاره قطع شود خطا دوباره پرتاب می‌شود تا لیست ناقص
+        به جای لیست کامل گرفته نشود.
+        """
+        from django.conf import settings
+        
+        response = self._request('GET', "/panel/api/inbounds/list", stream=True)
+        if response is None:
+            return
+        
+        with closing(response):
+            if response.status_code != 200:
+                print(f"❌ خطا در دریافت inbound ها: {response.status_code}")
+                return
+            
+            try:
+                yield from iter_json_array(
+                    response.iter_content(chunk_size=getattr(settings, 'PANEL_STREAM_CHUNK_SIZE', 65536)),
+                    key='obj',
+                    factory=PanelInbound
+                )
+            except (ValueError, requests.exceptions.RequestException) as e:
+                print(f"خطا در دریافت جریانی inbound ها: {e}")
+                raise
+    
     def add_client_to_inbound(self, inbound_id: int, client_data: Dict) -> bool:
         """اضافه کردن کلاینت به inbound"""
         try:
-            if not self._token and not self._cookies:
-                if not self.login():
-                    return False
-            
-            # تنظیم کوکی‌ها
-            if self._cookies:
-                self.session.cookies.update(self._cookies)
-            
-            # اضافه کردن کوکی 3x-ui اگر موجود باشد
-            if '3x-ui' in self._cookies:
-                self.session.cookies.set('3x-ui', self._cookies['3x-ui'])
-            
             # استفاده از API جدید برای اضافه کردن کلاینت
             payload = {
                 "id": inbound_id,
                 "settings": json.dumps(client_data)
             }
             
-            response = self.session.post(
-                f"{self.base_url}/panel/api/inbounds/addClient",
-                json=payload,
-                timeout=30
-            )
+            response = self._request('POST', "/panel/api/inbounds/addClient", json=payload)
+            if response is None:
+                return False
             
             if response.status_code == 200:
                 data = response.json()
@@ -150,107 +277,56 @@ class XUIEnhancedService:
             print(f"خطا در اضافه کردن کلاینت: {e}")
             return False
     
-    def remove_client_from_inbound(self, inbound_id: int, client_email: str) -> bool:
-        """حذف کلاینت از inbound"""
+    def get_inbound(self, inbound_id: int) -> Optional[Dict]:
+        """دریافت یک inbound با ID (بدون دانلود لیست کامل inbound ها)"""
         try:
-            if not self._token and not self._cookies:
-                if not self.login():
-                    return False
-            
-            # تنظیم کوکی‌ها
-            if self._cookies:
-                self.session.cookies.update(self._cookies)
-            
-            # دریافت اطلاعات inbound فعلی
-            inbounds = self.get_inbounds()
-            target_inbound = None
-            
-            for inbound in inbounds:
-                if inbound.get('id') == inbound_id:
-                    target_inbound = inbound
-                    break
-            
-            if not target_inbound:
-                print(f"❌ Inbound با ID {inbound_id} یافت نشد")
-                return False
-            
-            # حذف کلاینت از لیست
-            settings = json.loads(target_inbound.get('settings', '{}'))
-            clients = settings.get('clients', [])
-            
-            # فیلتر کردن کلاینت مورد نظر
-            filtered_clients = [client for client in clients if client.get('email') != client_email]
-            
-            if len(filtered_clients) == len(clients):
-                print(f"❌ کلاینت با ایمیل {client_email} یافت نشد")
-                return False
-            
-            # به‌روزرسانی تنظیمات
-            settings['clients'] = filtered_clients
-            
-            # ارسال به‌روزرسانی
-            payload = {
-                "id": inbound_id,
-                "settings": json.dumps(settings)
-            }
-            
-            response = self.session.post(
-                f"{self.base_url}/panel/api/inbounds/update/{inbound_id}",
-                json=payload,
-                timeout=30
-            )
+            response = self._request('GET', f"/panel/api/inbounds/get/{inbound_id}")
+            if response is None:
+                return None
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
-                    print(f"✅ کلاینت {client_email} با موفقیت حذف شد")
-                    return True
+                    return data.get('obj')
             
-            print(f"❌ خطا در حذف کلاینت: {response.status_code} - {response.text}")
-            return False
+            print(f"❌ خطا در دریافت inbound {inbound_id}: {response.status_code}")
+            return None
             
         except Exception as e:
-            print(f"خطا در حذف کلاینت: {e}")
-            return False
+            print(f"خطا در دریافت inbound {inbound_id}: {e}")
+            return None
     
-    def update_client_settings(self, inbound_id: int, client_email: str, new_settings: Dict) -> bool:
-        """به‌روزرسانی تنظیمات کلاینت"""
+    def apply_client_changes(
+        self,
+        inbound_id: int,
+        adds: Optional[List[Dict]] = None,
+        removes: Optional[List[str]] = None,
+        updates: Optional[Dict[str, Dict]] = None
+    ) -> Optional[Dict[str, List[str]]]:
+        """
+        اعمال دسته‌ای تغییرات کلاینت‌های یک inbound با یک بار دریافت و یک بار ارسال
+        
+        کلاینت‌ها در removes و updates با email یا id (UUID) شناسایی می‌شوند.
+        
+        Args:
+            inbound_id: شناسه inbound در X-UI
+            adds: لیست کلاینت‌های جدید (مانند خروجی create_client_settings()['clients'])
+            removes: لیست شناسه‌های کلاینت‌هایی که باید حذف شوند
+            updates: نگاشت شناسه کلاینت به فیلدهایی که باید به‌روزرسانی شوند
+            
+        Returns:
+            دیکشنری با کلیدهای added, removed, updated, missing یا None در صورت خطا
+        """
         try:
-            if not self._token and not self._cookies:
-                if not self.login():
-                    return False
-            
-            # تنظیم کوکی‌ها
-            if self._cookies:
-                self.session.cookies.update(self._cookies)
-            
-            # دریافت اطلاعات inbound فعلی
-            inbounds = self.get_inbounds()
-            target_inbound = None
-            
-            for inbound in inbounds:
-                if inbound.get('id') == inbound_id:
-                    target_inbound = inbound
-                    break
-            
+            target_inbound = self.get_inbound(inbound_id)
             if not target_inbound:
                 print(f"❌ Inbound با ID {inbound_id} یافت نشد")
-                return False
+                return None
             
-            # به‌روزرسانی کلاینت
-            settings = json.loads(target_inbound.get('settings', '{}'))
-            clients = settings.get('clients', [])
+            settings, result = merge_client_changes(target_inbound, adds, removes, updates)
             
-            client_updated = False
-            for client in clients:
-                if client.get('email') == client_email:
-                    client.update(new_settings)
-                    client_updated = True
-                    break
-            
-            if not client_updated:
-                print(f"❌ کلاینت با ایمیل {client_email} یافت نشد")
-                return False
+            if not (result['added'] or result['removed'] or result['updated']):
+                return result
             
             # ارسال به‌روزرسانی
             payload = {
@@ -258,33 +334,67 @@ class XUIEnhancedService:
                 "settings": json.dumps(settings)
             }
             
-            response = self.session.post(
-                f"{self.base_url}/panel/api/inbounds/update/{inbound_id}",
-                json=payload,
-                timeout=30
-            )
+            response = self._request('POST', f"/panel/api/inbounds/update/{inbound_id}", json=payload)
+            if response is None:
+                return None
             
             if response.status_code == 200:
                 data = response.json()
                 if data.get('success'):
-                    print(f"✅ تنظیمات کلاینت {client_email} با موفقیت به‌روزرسانی شد")
-                    return True
+                    print(
+                        f"✅ inbound {inbound_id}: {len(result['added'])} اضافه، "
+                        f"{len(result['removed'])} حذف، {len(result['updated'])} به‌روزرسانی"
+                    )
+                    return result
             
-            print(f"❌ خطا در به‌روزرسانی کلاینت: {response.status_code} - {response.text}")
-            return False
+            print(f"❌ خطا در به‌روزرسانی کلاینت‌های inbound {inbound_id}: {response.status_code} - {response.text}")
+            return None
             
         except Exception as e:
-            print(f"خطا در به‌روزرسانی کلاینت: {e}")
+            print(f"خطا در اعمال تغییرات کلاینت‌ها: {e}")
+            return None
+    
+    def remove_client_from_inbound(self, inbound_id: int, client_email: str) -> bool:
+        """حذف کلاینت از inbound"""
+        result = self.apply_client_changes(inbound_id, removes=[client_email])
+        if not result:
             return False
+        
+        if not result['removed']:
+            print(f"❌ کلاینت با ایمیل {client_email} یافت نشد")
+            return False
+        
+        return True
     
-    def create_client_settings(self, email: str, total_gb: int = 0, expiry_days: int = 30) -> Dict:
-        """ایجاد تنظیمات کلاینت"""
-        client_id = str(uuid.uuid4())
+    def update_client_settings(self, inbound_id: int, client_email: str, new_settings: Dict) -> bool:
+        """به‌روزرسانی تنظیمات کلاینت"""
+        result = self.apply_client_changes(inbound_id, updates={client_email: new_settings})
+        if not result:
+            return False
+        
+        if not result['updated']:
+            print(f"❌ کلاینت با ایمیل {client_email} یافت نشد")
+            return False
+        
+        return True
+    
+    def create_client_settings(
+        self,
+        email: str,
+        total_gb: int = 0,
+        expiry_days: int = 30,
+        client_id: Optional[str] = None,
+        expires_at: Optional[datetime] = None
+    ) -> Dict:
+        """ایجاد تنظیمات کلاینت (client_id و expires_at اختیاری برای شناسه و انقضای از پیش تعیین شده)"""
+        client_id = client_id or str(uuid.uuid4())
         sub_id = ''.join(random.choices(string.ascii_lowercase + string.digits, k=16))
         
         # محاسبه زمان انقضا
         expiry_time = 0
-        if expiry_days > 0:
+        if expires_at:
+            expiry_time = int(expires_at.timestamp() * 1000)
+        elif expiry_days > 0:
             expiry_time = int((timezone.now() + timedelta(days=expiry_days)).timestamp() * 1000)
         
         return {
@@ -305,38 +415,7 @@ class XUIEnhancedService:
     def sync_inbounds_to_database(self) -> int:
         """همگام‌سازی inbound ها با دیتابیس"""
         try:
-            inbounds = self.get_inbounds()
-            synced_count = 0
-            
-            for inbound_data in inbounds:
-                inbound_id = inbound_data.get('id')
-                if not inbound_id:
-                    continue
-                
-                # بررسی وجود inbound در دیتابیس
-                inbound, created = XUIInbound.objects.get_or_create(
-                    server=self.server,
-                    xui_inbound_id=inbound_id,
-                    defaults={
-                        'port': inbound_data.get('port', 0),
-                        'protocol': inbound_data.get('protocol', 'vless'),
-                        'remark': inbound_data.get('remark', f'Inbound {inbound_id}'),
-                        'is_active': inbound_data.get('enable', True),
-                        'max_clients': 100,  # مقدار پیش‌فرض
-                        'current_clients': len(inbound_data.get('clientStats', []))
-                    }
-                )
-                
-                if not created:
-                    # به‌روزرسانی اطلاعات موجود
-                    inbound.port = inbound_data.get('port', inbound.port)
-                    inbound.protocol = inbound_data.get('protocol', inbound.protocol)
-                    inbound.remark = inbound_data.get('remark', inbound.remark)
-                    inbound.is_active = inbound_data.get('enable', inbound.is_active)
-                    inbound.current_clients = len(inbound_data.get('clientStats', []))
-                    inbound.save()
-                
-                synced_count += 1
+            synced_count = bulk_sync_inbounds(self.server, self.iter_inbounds())
             
             print(f"✅ {synced_count} inbound همگام‌سازی شد")
             return synced_count
@@ -398,6 +477,7 @@ class XUIClientManager:
     async def create_user_config_async(self, user: UsersModel, plan: ConfingPlansModel, inbound: XUIInbound) -> Optional[UserConfig]:
         """ایجاد کانفیگ کاربر برای محیط async"""
         from asgiref.sync import sync_to_async
+        from .async_client import AsyncXUIClient
         
         try:
             # ایجاد تنظیمات کلاینت
@@ -408,8 +488,9 @@ class XUIClientManager:
                 expiry_days=getattr(plan, 'duration_days', 30)
             )
             
-            # اضافه کردن کلاینت به inbound
-            if self.service.add_client_to_inbound(inbound.xui_inbound_id, client_settings):
+            # اضافه کردن کلاینت به inbound بدون بلاک کردن event loop
+            panel_client = AsyncXUIClient(self.server)
+            if await panel_client.add_client_to_inbound(inbound.xui_inbound_id, client_settings):
                 # ایجاد رکورد در دیتابیس
                 client_data = client_settings['clients'][0]
                 
@@ -527,6 +608,7 @@ class XUIClientManager:
     async def create_trial_config_async(self, user: UsersModel, inbound: XUIInbound) -> Optional[UserConfig]:
         """ایجاد کانفیگ تستی برای محیط async"""
         from asgiref.sync import sync_to_async
+        from .async_client import AsyncXUIClient
         
         try:
             email = f"trial_{user.username_tel}_{user.telegram_id}"
@@ -536,7 +618,9 @@ class XUIClientManager:
                 expiry_days=1  # 1 روز
             )
             
-            if self.service.add_client_to_inbound(inbound.xui_inbound_id, client_settings):
+            # اضافه کردن کلاینت به inbound بدون بلاک کردن event loop
+            panel_client = AsyncXUIClient(self.server)
+            if await panel_client.add_client_to_inbound(inbound.xui_inbound_id, client_settings):
                 client_data = client_settings['clients'][0]
                 
                 # استفاده از sync_to_async برای Django ORM
@@ -628,51 +712,241 @@ class XUIClientManager:
             print(f"خطا در حذف کانفیگ کاربر: {e}")
             return False
     
+    def delete_user_configs(self, user_configs) -> int:
+        """حذف دسته‌ای کانفیگ‌ها با یک به‌روزرسانی برای هر inbound"""
+        configs_by_inbound: Dict[int, List[UserConfig]] = {}
+        for config in user_configs:
+            configs_by_inbound.setdefault(config.xui_inbound_id, []).append(config)
+        
+        deleted_ids = []
+        slots: Dict[uuid.UUID, int] = {}
+        for inbound_id, configs in configs_by_inbound.items():
+            result = self.service.apply_client_changes(
+                inbound_id,
+                removes=[config.xui_user_id for config in configs]
+            )
+            if not result:
+                continue
+            
+            removed = set(result['removed'])
+            for config in configs:
+                if config.xui_user_id in removed:
+                    deleted_ids.append(config.id)
+                    slots[config.inbound_id] = slots.get(config.inbound_id, 0) + 1
+        
+        if deleted_ids:
+            # غیرفعال کردن در دیتابیس با یک کوئری
+            UserConfig.objects.filter(id__in=deleted_ids).update(
+                is_active=False,
+                updated_at=timezone.now()
+            )
+            self._release_slots(slots)
+        
+        return len(deleted_ids)
+    
+    def _release_slots(self, slots: Dict[uuid.UUID, int]) -> None:
+        """آزاد کردن اسلات inbound های کانفیگ‌های حذف شده (تعداد به ازای هر inbound)"""
+        from .placement import PlacementEngine
+        
+        try:
+            PlacementEngine().release_many(slots)
+        except Exception as e:
+            print(f"خطا در آزاد کردن اسلات‌های inbound: {e}")
+    
+    def provision_configs_batch(self, user_configs) -> Dict[str, List[UserConfig]]:
+        """
+        تامین دسته‌ای کانفیگ‌های در انتظار با یک addClient برای هر inbound
+        
+        شناسه و ایمیل کلاینت از external_id ساخته می‌شوند؛ اگر دسته‌ای نیمه‌کاره
+        تکرار شود کلاینت‌های موجود در پنل دوباره ساخته نمی‌شوند.
+        """
+        from django.conf import settings
+        
+        from .placement import PlacementEngine
+        
+        placement = PlacementEngine()
+        configs_by_inbound: Dict[int, List[UserConfig]] = {}
+        inbounds: Dict[int, XUIInbound] = {}
+        failed: List[UserConfig] = []
+        
+        for config in user_configs:
+            inbound = config.inbound
+            if inbound is None:
+                # رزرو یک اسلات روی همین سرور؛ inbound ذخیره می‌شود تا تلاش بعدی دوباره رزرو نکند
+                inbound = placement.reserve(config.protocol, server=self.server)
+                if not inbound:
+                    failed.append(config)
+                    continue
+                config.inbound = inbound
+                UserConfig.objects.filter(pk=config.pk).update(inbound=inbound)
+            inbounds[inbound.xui_inbound_id] = inbound
+            configs_by_inbound.setdefault(inbound.xui_inbound_id, []).append(config)
+        
+        provisioned: List[UserConfig] = []
+        base_url = getattr(settings, 'SERVER_DOMAIN', 'localhost')
+        for inbound_id, configs in configs_by_inbound.items():
+            inbound = inbounds[inbound_id]
+            clients = []
+            for config in configs:
+                config.external_id = config.external_id or f"config_{config.id}"
+                clients.append(self.service.create_client_settings(
+                    email=config.external_id,
+                    total_gb=config.plan.get_traffic_gb() if config.plan else 0,
+                    client_id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"xui-config:{config.external_id}")),
+                    expires_at=config.expires_at
+                )['clients'][0])
+            
+            added = self.service.add_client_to_inbound(inbound_id, {"clients": clients})
+            if not added:
+                # تکرار یک دسته نیمه‌کاره: کلاینت‌هایی که از قبل در پنل هستند رد می‌شوند
+                added = self.service.apply_client_changes(inbound_id, adds=clients) is not None
+            
+            if not added:
+                failed.extend(configs)
+                continue
+            
+            now = timezone.now()
+            for config, client in zip(configs, clients):
+                config.inbound = inbound
+                config.xui_inbound_id = inbound_id
+                config.xui_user_id = client['id']
+                config.protocol = inbound.protocol
+                config.config_data = self._generate_real_config_data(inbound, client)
+                config.status = 'active'
+                config.is_active = True
+                config.last_sync_at = now
+                config.updated_at = now
+                config.sync_required = False
+                config.provision_retry_count = 0
+                config.last_provision_error = None
+                config.subscription_url = config.subscription_url or f"https://{base_url}/api/subscription/{client['id']}"
+                provisioned.append(config)
+        
+        if provisioned:
+            # فعال‌سازی همه کانفیگ‌ها در یک تراکنش
+            with transaction.atomic():
+                UserConfig.objects.bulk_update(provisioned, [
+                    'inbound', 'xui_inbound_id', 'xui_user_id', 'protocol', 'config_data',
+                    'status', 'is_active', 'last_sync_at', 'sync_required',
+                    'provision_retry_count', 'last_provision_error', 'subscription_url',
+                    'external_id', 'updated_at',
+                ])
+        
+        return {'provisioned': provisioned, 'failed': failed}
+    
     def check_and_cleanup_expired_users(self) -> int:
-        """بررسی و پاکسازی کاربران منقضی شده"""
+        """بررسی و پاکسازی کاربران منقضی شده همین سرور"""
+        from django.conf import settings
+        
         try:
+            now = timezone.now()
             expired_configs = UserConfig.objects.filter(
+                server=self.server,
                 is_active=True,
-                expires_at__lt=timezone.now()
+                expires_at__lt=now
             )
+            chunk_size = getattr(settings, 'EXPIRY_SWEEP_CHUNK_SIZE', 1000)
+            
+            # فقط شناسه‌ها را تکه‌تکه می‌خوانیم و بر اساس inbound گروه می‌کنیم
+            removes_by_inbound: Dict[int, List[str]] = {}
+            ids_by_inbound: Dict[int, List[uuid.UUID]] = {}
+            rows = expired_configs.values_list('id', 'xui_inbound_id', 'xui_user_id').iterator(chunk_size=chunk_size)
+            for config_id, inbound_id, xui_user_id in rows:
+                removes_by_inbound.setdefault(inbound_id, []).append(xui_user_id)
+                ids_by_inbound.setdefault(inbound_id, []).append(config_id)
+            
+            if not removes_by_inbound:
+                return 0
+            
+            # یک به‌روزرسانی پنل برای هر inbound؛ فقط inbound های ناموفق برای دور بعد می‌مانند
+            # (کلاینت‌هایی که در پنل نبودند هم منقضی‌اند)
+            removed_ids = [
+                config_id
+                for inbound_id, removes in removes_by_inbound.items()
+                if self.service.apply_client_changes(inbound_id, removes=removes) is not None
+                for config_id in ids_by_inbound[inbound_id]
+            ]
+            
+            # فقط همان کانفیگ‌هایی که از پنل حذف شدند منقضی می‌شوند؛ کانفیگی که در این
+            # فاصله تمدید شده فعال می‌ماند و کلاینتش دوباره به پنل اضافه می‌شود
+            slots: Dict[uuid.UUID, int] = {}
+            with transaction.atomic():
+                locked = UserConfig.objects.select_for_update().filter(
+                    id__in=removed_ids, is_active=True
+                ).values_list('id', 'expires_at', 'inbound_id')
+                still_expired, renewed_ids = [], []
+                for config_id, expires_at, inbound_pk in locked:
+                    if expires_at is not None and expires_at < now:
+                        still_expired.append(config_id)
+                        slots[inbound_pk] = slots.get(inbound_pk, 0) + 1
+                    else:
+                        renewed_ids.append(config_id)
+                
+                cleaned_count = UserConfig.objects.filter(id__in=still_expired).update(
+                    is_active=False,
+                    status='expired',
+                    updated_at=now
+                )
             
-            cleaned_count = 0
-            for config in expired_configs:
-                if self.delete_user_config(config):
-                    cleaned_count += 1
+            # آزاد کردن اسلات‌های رزرو شده تا placement ظرفیت واقعی را ببیند
+            self._release_slots(slots)
             
-            print(f"✅ {cleaned_count} کانفیگ منقضی شده پاکسازی شد")
+            if renewed_ids:
+                self._restore_renewed_configs(renewed_ids)
+            
+            print(f"✅ {cleaned_count} کانفیگ منقضی شده از {self.server.name} پاکسازی شد")
             return cleaned_count
             
         except Exception as e:
             print(f"خطا در پاکسازی کاربران منقضی شده: {e}")
             return 0
     
+    def _restore_renewed_configs(self, config_ids: List[uuid.UUID]) -> None:
+        """اضافه کردن دوباره کلاینت کانفیگ‌هایی که حین پاکسازی تمدید شدند"""
+        adds_by_inbound: Dict[int, List[Dict]] = {}
+        for config in UserConfig.objects.filter(id__in=config_ids).select_related('plan'):
+            adds_by_inbound.setdefault(config.xui_inbound_id, []).append(
+                self.service.create_client_settings(
+                    email=config.external_id or f"config_{config.id}",
+                    total_gb=config.plan.get_traffic_gb() if config.plan else 0,
+                    client_id=config.xui_user_id,
+                    expires_at=config.expires_at
+                )['clients'][0]
+            )
+        
+        for inbound_id, adds in adds_by_inbound.items():
+            if self.service.apply_client_changes(inbound_id, adds=adds) is None:
+                print(f"❌ بازگرداندن {len(adds)} کانفیگ تمدید شده به inbound {inbound_id} ناموفق بود")
+            else:
+                print(f"♻️ {len(adds)} کانفیگ تمدید شده دوباره به inbound {inbound_id} اضافه شد")
+    
     def check_traffic_limits(self) -> int:
         """بررسی محدودیت‌های ترافیک"""
         try:
+            from django.db.models import Q
             from .models import XUIClient, UserConfig
 
-            cleaned = 0
+            # اگر زمان انقضا در خود X-UI گذشته یا حجمش تمام شده
+            exceeded_clients = [
+                client
+                for client in XUIClient.objects.filter(is_active=True, inbound__server=self.server)
+                if client.is_expired() or client.get_remaining_gb() <= 0
+            ]
+            if not exceeded_clients:
+                return 0
 
-            # همه کلاینت‌های فعال را بررسی می‌کنیم
-            for client in XUIClient.objects.filter(is_active=True):
-                # اگر زمان انقضا در خود X-UI گذشته یا حجمش تمام شده
-                if client.is_expired() or client.get_remaining_gb() <= 0:
-                    # تمام کانفیگ‌های مرتبط با این کاربر و inbound را پیدا کن
-                    related_configs = UserConfig.objects.filter(
-                        is_active=True,
-                        user=client.user,
-                        inbound=client.inbound,
-                    )
+            # تمام کانفیگ‌های مرتبط با این کاربرها و inbound ها را یکجا پیدا کن
+            related_filter = Q()
+            for client in exceeded_clients:
+                related_filter |= Q(user_id=client.user_id, inbound_id=client.inbound_id)
 
-                    for cfg in related_configs:
-                        if self.delete_user_config(cfg):
-                            cleaned += 1
+            related_configs = UserConfig.objects.filter(related_filter, is_active=True)
+            cleaned = self.delete_user_configs(related_configs)
 
-                    # خود کلاینت را هم غیرفعال می‌کنیم
-                    client.is_active = False
-                    client.save(update_fields=["is_active"])
+            # خود کلاینت‌ها را هم غیرفعال می‌کنیم
+            XUIClient.objects.filter(
+                id__in=[client.id for client in exceeded_clients]
+            ).update(is_active=False)
 
             if cleaned:
                 print(f"✅ {cleaned} کانفیگ به دلیل اتمام حجم/ترافیک پاکسازی شد")
@@ -754,15 +1028,13 @@ class XUIInboundManager:
         )
     
     def find_best_inbound(self, protocol: str = "vless") -> Optional[XUIInbound]:
-        """یافتن بهترین inbound برای کاربر"""
-        inbounds = self.get_available_inbounds().filter(protocol=protocol)
-        
-        # اولویت با inbound هایی که ظرفیت خالی دارند
-        for inbound in inbounds:
-            if inbound.can_accept_client():
-                return inbound
+        """یافتن کم‌بارترین inbound دارای ظرفیت با یک کوئری (بدون رزرو اسلات)"""
+        from django.db.models import F
         
-        return None
+        return self.get_available_inbounds().filter(
+            protocol=protocol,
+            current_clients__lt=F('max_clients')
+        ).order_by(F('current_clients') - F('max_clients'), 'current_clients').first()
     
     def sync_inbounds(self) -> int:
         """همگام‌سازی inbound ها با X-UI"""
@@ -0,0 +1,163 @@
+"""
+Panel Health Prober
+Probes all panels concurrently and records availability and latency per server
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from .circuit_breaker import get_server_breaker
+from .models import XUIServer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ProbeResult:
+    """Outcome of probing one panel"""
+    healthy: bool
+    latency_ms: Optional[int] = None
+    error: str = ''
+
+
+def _probe_request(server: XUIServer):
+    """URL and headers of the cheapest request that proves the panel is serving"""
+    if server.server_type == 'sui':
+        protocol = "https" if server.use_ssl else "http"
+        base_path = (server.web_base_path or '/app').rstrip('/')
+        headers = {'Accept': 'application/json'}
+        api_token = server.api_token or getattr(settings, 'SUI_API_TOKEN', '')
+        if api_token:
+            headers['Authorization'] = f'Bearer {api_token}'
+        return f"{protocol}://{server.host}:{server.port}{base_path}/api/v2/system/info", headers
+
+    protocol = "https" if getattr(settings, 'XUI_USE_SSL', True) else "http"
+    base_path = (server.web_base_path or '').rstrip('/')
+    return f"{protocol}://{server.host}:{server.port}{base_path}/", {}
+
+
+async def probe_server(session: aiohttp.ClientSession, server: XUIServer) -> ProbeResult:
+    """
+    Probe one panel
+
+    The probe bypasses the circuit breaker: it is what decides whether the
+    breaker may close again. Any answer below 500 from an X-UI panel (its login
+    page) counts as healthy; S-UI must answer its system info endpoint.
+    """
+    url, headers = _probe_request(server)
+    started = time.monotonic()
+
+    try:
+        async with session.get(url, headers=headers, allow_redirects=False) as response:
+            latency_ms = int((time.monotonic() - started) * 1000)
+            if server.server_type == 'sui':
+                healthy = response.status == 200
+            else:
+                healthy = response.status < 500
+            return ProbeResult(
+                healthy=healthy,
+                latency_ms=latency_ms,
+                error='' if healthy else f'HTTP {response.status}'
+            )
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        return ProbeResult(healthy=False, error=str(e) or e.__class__.__name__)
+
+
+async def probe_servers(servers: Iterable[XUIServer]) -> Dict[str, ProbeResult]:
+    """
+    Probe panels concurrently
+
+    Returns:
+        Probe result per server id
+    """
+    servers = list(servers)
+    semaphore = asyncio.Semaphore(getattr(settings, 'HEALTH_PROBE_CONCURRENCY', 20))
+    timeout = aiohttp.ClientTimeout(total=getattr(settings, 'HEALTH_PROBE_TIMEOUT', 5))
+    connector = aiohttp.TCPConnector(ssl=None if getattr(settings, 'XUI_VERIFY_SSL', False) else False)
+
+    async def guarded(session, server):
+        async with semaphore:
+            return await probe_server(session, server)
+
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        results = await asyncio.gather(*(guarded(session, server) for server in servers))
+
+    return {str(server.id): result for server, result in zip(servers, results)}
+
+
+def record_probe_results(servers: Iterable[XUIServer], results: Dict[str, ProbeResult]) -> Dict[str, int]:
+    """
+    Persist probe results and feed the circuit breakers
+
+    A server turns unhealthy after HEALTH_FAILURE_THRESHOLD consecutive failed
+    probes, which also opens its breaker in every process until a probe
+    succeeds again. Servers whose status changed get their capacity index
+    entries rebuilt so placement follows immediately.
+
+    Returns:
+        Counts of healthy, unhealthy and changed servers
+    """
+    failure_threshold = getattr(settings, 'HEALTH_FAILURE_THRESHOLD', 2)
+    # the shared marker outlives a missed probe run but not a stopped prober
+    marker_ttl = getattr(settings, 'HEALTH_PROBE_INTERVAL', 60) * 3
+    now = timezone.now()
+
+    servers = list(servers)
+    changed = []
+    summary = {'healthy': 0, 'unhealthy': 0, 'changed': 0}
+
+    for server in servers:
+        result = results.get(str(server.id))
+        if result is None:
+            continue
+
+        previous_status = server.health_status
+        breaker = get_server_breaker(server)
+        server.last_health_check = now
+        server.health_latency_ms = result.latency_ms
+
+        if result.healthy:
+            server.health_failures = 0
+            server.health_status = 'healthy'
+            if previous_status != 'healthy' or breaker.is_open():
+                breaker.reset()
+        else:
+            server.health_failures += 1
+            logger.warning(
+                f"Health probe failed for {server.name} "
+                f"({server.health_failures}/{failure_threshold}): {result.error}"
+            )
+            if server.health_failures >= failure_threshold:
+                server.health_status = 'unhealthy'
+                breaker.trip(ttl=marker_ttl)
+
+        summary['healthy' if result.healthy else 'unhealthy'] += 1
+        if server.health_status != previous_status:
+            changed.append(server)
+
+    XUIServer.objects.bulk_update(
+        servers,
+        ['last_health_check', 'health_latency_ms', 'health_failures', 'health_status']
+    )
+
+    if changed and getattr(settings, 'CAPACITY_INDEX_ENABLED', True):
+        from .capacity_index import get_capacity_index
+        try:
+            index = get_capacity_index()
+            for server in changed:
+                index.rebuild_server(server)
+        except redis.RedisError as e:
+            logger.warning(f"Could not refresh capacity index after health changes: {e}")
+
+    for server in changed:
+        logger.info(f"Server {server.name} is now {server.health_status}")
+
+    summary['changed'] = len(changed)
+    return summary
@@ -0,0 +1,143 @@
+"""
+Bulk Inbound Sync
+Upserts a panel's inbound listing into XUIInbound with a constant number of queries
+"""
+import logging
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Set
+
+import redis
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import XUIInbound, XUIServer
+
+logger = logging.getLogger(__name__)
+
+
+def panel_inbound_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    XUIInbound field values carried by a panel inbound
+
+    Only keys the panel actually sent are returned, so a partial listing never
+    blanks out stored values.
+    """
+    fields = {}
+    if 'port' in data:
+        fields['port'] = data['port']
+    if 'protocol' in data:
+        fields['protocol'] = data['protocol']
+    if 'remark' in data:
+        fields['remark'] = data['remark']
+    if 'enable' in data:
+        fields['is_active'] = bool(data['enable'])
+
+    client_count = getattr(data, 'client_count', None)
+    if client_count is None:
+        client_count = len(data.get('clientStats') or [])
+    fields['current_clients'] = client_count
+    return fields
+
+
+def bulk_sync_inbounds(server: XUIServer, inbounds: Iterable[Dict[str, Any]]) -> int:
+    """
+    Upsert a server's inbounds from a panel listing
+
+    Existing rows are loaded once into a dict keyed by xui_inbound_id. The
+    listing is consumed in batches of INBOUND_SYNC_BATCH_SIZE (it may be a
+    stream): new inbounds go through one bulk_create per batch and changed
+    ones through one bulk_update limited to the fields that changed.
+    Inbounds that vanished from the panel are deactivated in a single UPDATE
+    once the whole listing has been read.
+
+    Soft-deleted inbounds are left alone, even if the panel still has them.
+
+    Args:
+        server: Server the listing belongs to
+        inbounds: Panel inbound dicts (list or iterator)
+
+    Returns:
+        Number of inbounds seen on the panel
+    """
+    batch_size = getattr(settings, 'INBOUND_SYNC_BATCH_SIZE', 500)
+    existing: Dict[int, XUIInbound] = {
+        inbound.xui_inbound_id: inbound
+        for inbound in XUIInbound._base_manager.filter(server=server)
+    }
+    seen: Set[int] = set()
+    changed_rows = 0
+
+    iterator = iter(inbounds)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+
+        now = timezone.now()
+        to_create: List[XUIInbound] = []
+        to_update: List[XUIInbound] = []
+        update_fields: Set[str] = set()
+
+        for data in batch:
+            inbound_id = data.get('id')
+            if not inbound_id or inbound_id in seen:
+                continue
+            seen.add(inbound_id)
+            fields = panel_inbound_fields(data)
+
+            inbound = existing.get(inbound_id)
+            if inbound is None:
+                to_create.append(XUIInbound(
+                    server=server,
+                    xui_inbound_id=inbound_id,
+                    port=fields.get('port', 0),
+                    protocol=fields.get('protocol', 'vless'),
+                    remark=fields.get('remark', f'Inbound {inbound_id}'),
+                    is_active=fields.get('is_active', True),
+                    max_clients=100,  # default, adjusted by admins
+                    current_clients=fields['current_clients'],
+                ))
+                continue
+
+            if inbound.is_deleted:
+                continue
+
+            changed = [name for name, value in fields.items() if getattr(inbound, name) != value]
+            if changed:
+                for name in changed:
+                    setattr(inbound, name, fields[name])
+                inbound.updated_at = now
+                update_fields.update(changed)
+                to_update.append(inbound)
+
+        with transaction.atomic():
+            if to_create:
+                XUIInbound.objects.bulk_create(to_create, ignore_conflicts=True)
+            if to_update:
+                XUIInbound.objects.bulk_update(to_update, sorted(update_fields | {'updated_at'}))
+        changed_rows += len(to_create) + len(to_update)
+
+    if seen:
+        # an empty listing is indistinguishable from a failed fetch; never wipe on it
+        changed_rows += XUIInbound.objects.filter(
+            server=server, is_active=True
+        ).exclude(
+            xui_inbound_id__in=seen
+        ).update(is_active=False, updated_at=timezone.now())
+
+    if changed_rows:
+        _refresh_capacity_index(server)
+
+    return len(seen)
+
+
+def _refresh_capacity_index(server: XUIServer) -> None:
+    if not getattr(settings, 'CAPACITY_INDEX_ENABLED', True):
+        return
+
+    from .capacity_index import get_capacity_index
+    try:
+        get_capacity_index().rebuild_server(server)
+    except redis.RedisError as e:
+        logger.warning(f"Could not rebuild capacity index for {server.name}: {e}")
@@ -0,0 +1,206 @@
+"""
+Streaming JSON Array Parser
+Yields the elements of a large JSON array while the response is still downloading
+"""
+import codecs
+import json
+import re
+from functools import cached_property
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+
+_STRING_SPECIAL = re.compile(r'["\\]')
+_STRUCTURAL = re.compile(r'["\[\]{}:,]')
+
+SEEK, VALUE, ITEMS, DONE = range(4)
+
+
+class PanelInbound(dict):
+    """
+    Inbound dict whose ``settings`` string is only decoded when the clients are needed
+
+    Panels return ``settings`` as a JSON string holding every client of the
+    inbound; most callers (inbound sync, capacity counts) never look inside.
+    """
+
+    @cached_property
+    def clients(self) -> List[Dict]:
+        settings_data = self.get('settings') or '{}'
+        if isinstance(settings_data, str):
+            try:
+                settings_data = json.loads(settings_data)
+            except json.JSONDecodeError:
+                return []
+        return settings_data.get('clients') or []
+
+    @property
+    def client_count(self) -> int:
+        """Client count from clientStats when the panel sends it, else from settings"""
+        stats = self.get('clientStats')
+        if stats is not None:
+            return len(stats)
+        return len(self.clients)
+
+
+class JSONArrayStream:
+    """
+    Incremental parser for the array held by one top-level key of a JSON object
+
+    Text is fed chunk by chunk; feed() returns the array elements completed
+    by that chunk. Only structural characters are inspected (found with a
+    regex, not char by char) and each element's text is decoded exactly once
+    when its closing bracket arrives, so memory is bounded by the largest
+    single element rather than by the whole document.
+
+    Elements must be objects or arrays, as in the panels' inbound listings.
+    """
+
+    def __init__(self, key: Optional[str] = None, factory: Optional[Callable[[Any], Any]] = None):
+        """
+        Args:
+            key: Top-level key holding the array (None if the document is the array)
+            factory: Called on every decoded element (e.g. PanelInbound)
+        """
+        self.key = key
+        self.factory = factory
+        self._phase = SEEK if key is not None else VALUE
+        self._depth = 0
+        self._array_depth = 0
+        self._in_string = False
+        self._escape = False
+        self._expect_key = False
+        self._last_key: Optional[str] = None
+        self._capturing = False
+        self._capture_from = 0
+        self._pieces: List[str] = []
+
+    @property
+    def done(self) -> bool:
+        return self._phase == DONE
+
+    def feed(self, chunk: str) -> List[Any]:
+        """Consume a chunk of text; returns the elements it completed"""
+        items: List[Any] = []
+        pos, end = 0, len(chunk)
+        self._capture_from = 0
+
+        while pos < end and self._phase != DONE:
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                    pos += 1
+                    continue
+                match = _STRING_SPECIAL.search(chunk, pos)
+                if match is None:
+                    pos = end
+                    break
+                i = match.start()
+                pos = i + 1
+                if chunk[i] == '\\':
+                    self._escape = True
+                    continue
+                self._in_string = False
+                if self._phase == SEEK and self._capturing:
+                    self._last_key = json.loads(self._take(chunk, pos))
+                continue
+
+            match = _STRUCTURAL.search(chunk, pos)
+            if match is None:
+                pos = end
+                break
+            i = match.start()
+            char = chunk[i]
+            pos = i + 1
+
+            if char == '"':
+                self._in_string = True
+                if self._phase == SEEK and self._depth == 1 and self._expect_key:
+                    self._expect_key = False
+                    self._start_capture(i)
+
+            elif char in '{[':
+                if self._phase == VALUE:
+                    if char != '[':
+                        self._phase = DONE
+                        break
+                    self._phase = ITEMS
+                    self._array_depth = self._depth + 1
+                elif self._phase == ITEMS and self._depth == self._array_depth:
+                    self._start_capture(i)
+                self._depth += 1
+                if self._phase == SEEK and self._depth == 1:
+                    self._expect_key = True
+
+            elif char in '}]':
+                self._depth -= 1
+                if self._phase == ITEMS:
+                    if self._depth < self._array_depth:
+                        self._phase = DONE
+                    elif self._depth == self._array_depth and self._capturing:
+                        element = json.loads(self._take(chunk, pos))
+                        items.append(self.factory(element) if self.factory else element)
+                elif self._phase == VALUE and self._depth < 1:
+                    self._phase = DONE
+
+            elif char == ',':
+                if self._phase == SEEK and self._depth == 1:
+                    self._expect_key = True
+                elif self._phase == VALUE and self._depth == 1:
+                    # the key held a scalar (e.g. null), not an array
+                    self._phase = DONE
+
+            elif char == ':':
+                if self._phase == SEEK and self._depth == 1 and self._last_key == self.key:
+                    self._phase = VALUE
+
+        if self._capturing:
+            self._pieces.append(chunk[self._capture_from:pos])
+        return items
+
+    def close(self) -> None:
+        """Check that the array was read to its end"""
+        if self._phase in (VALUE, ITEMS) or self._capturing:
+            raise ValueError("JSON document ended inside the streamed array")
+
+    def _start_capture(self, index: int) -> None:
+        self._capturing = True
+        self._capture_from = index
+        self._pieces = []
+
+    def _take(self, chunk: str, end: int) -> str:
+        text = ''.join(self._pieces) + chunk[self._capture_from:end]
+        self._capturing = False
+        self._pieces = []
+        return text
+
+
+def iter_json_array(
+    chunks: Iterable[Union[bytes, str]],
+    key: Optional[str] = None,
+    factory: Optional[Callable[[Any], Any]] = None
+) -> Iterator[Any]:
+    """
+    Stream the elements of a JSON array from an iterable of chunks
+
+    Args:
+        chunks: Raw response chunks (bytes are decoded as UTF-8 incrementally)
+        key: Top-level key holding the array (None if the document is the array)
+        factory: Called on every decoded element
+
+    Yields:
+        Array elements, as soon as each one is complete
+
+    Raises:
+        ValueError: If the document ends before the array does
+    """
+    parser = JSONArrayStream(key, factory)
+    decoder = codecs.getincrementaldecoder('utf-8')()
+
+    for chunk in chunks:
+        if isinstance(chunk, bytes):
+            chunk = decoder.decode(chunk)
+        yield from parser.feed(chunk)
+        if parser.done:
+            return
+
+    yield from parser.feed(decoder.decode(b'', final=True))
+    parser.close()
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xui_servers', '0006_auditlog_userconfig_external_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='userconfig',
+            index=models.Index(fields=['server', 'is_active', 'expires_at'], name='xui_servers_server__14298f_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xui_servers', '0007_userconfig_server_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xuiserver',
+            name='region',
+            field=models.CharField(blank=True, default='', help_text='منطقه سرور (برای انتخاب سرور نزدیک)', max_length=50),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.27 on 2026-10-18 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xui_servers', '0008_xuiserver_region'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='xuiserver',
+            name='health_failures',
+            field=models.IntegerField(default=0, help_text='تعداد بررسی\u200cهای ناموفق پشت سر هم'),
+        ),
+        migrations.AddField(
+            model_name='xuiserver',
+            name='health_latency_ms',
+            field=models.IntegerField(blank=True, help_text='تاخیر آخرین بررسی سلامت (میلی\u200cثانیه)', null=True),
+        ),
+    ]
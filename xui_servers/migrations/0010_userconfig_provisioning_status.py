@@ -0,0 +1,18 @@
+# Generated by Django 4.2.27 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('xui_servers', '0009_xuiserver_health_latency'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userconfig',
+            name='status',
+            field=models.CharField(choices=[('pending', 'در انتظار'), ('provisioning', 'در حال تامین'), ('active', 'فعال'), ('expired', 'منقضی شده'), ('suspended', 'معلق'), ('cancelled', 'لغو شده'), ('failed', 'تامین ناموفق')], default='pending', help_text='وضعیت کانفیگ', max_length=20),
+        ),
+    ]
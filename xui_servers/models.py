@@ -81,8 +81,11 @@ class XUIServer(BaseModel, TimeStampMixin, SoftDeleteModel):
         default='unknown',
         help_text="وضعیت سلامت"
     )
+    health_latency_ms = models.IntegerField(null=True, blank=True, help_text="تاخیر آخرین بررسی سلامت (میلی‌ثانیه)")
+    health_failures = models.IntegerField(default=0, help_text="تعداد بررسی‌های ناموفق پشت سر هم")
     last_sync_at = models.DateTimeField(null=True, blank=True, help_text="آخرین همگام‌سازی")
     sync_interval_minutes = models.IntegerField(default=15, help_text="فاصله همگام‌سازی (دقیقه)")
+    region = models.CharField(max_length=50, blank=True, default='', help_text="منطقه سرور (برای انتخاب سرور نزدیک)")
     
     class Meta:
         indexes = [
@@ -177,10 +180,12 @@ class UserConfig(BaseModel, TimeStampMixin, SoftDeleteModel):
     """Improved User Config Model"""
     STATUS_CHOICES = [
         ('pending', 'در انتظار'),
+        ('provisioning', 'در حال تامین'),
         ('active', 'فعال'),
         ('expired', 'منقضی شده'),
         ('suspended', 'معلق'),
         ('cancelled', 'لغو شده'),
+        ('failed', 'تامین ناموفق'),
     ]
     
     user = models.ForeignKey(UsersModel, on_delete=models.CASCADE, related_name="xui_configs")
@@ -215,6 +220,7 @@ class UserConfig(BaseModel, TimeStampMixin, SoftDeleteModel):
             models.Index(fields=['user', 'is_active']),
             models.Index(fields=['user', 'status']),
             models.Index(fields=['expires_at', 'is_active']),
+            models.Index(fields=['server', 'is_active', 'expires_at']),
             models.Index(fields=['sync_required']),
             models.Index(fields=['xui_inbound_id', 'xui_user_id']),
             models.Index(fields=['external_id']),
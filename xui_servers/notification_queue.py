@@ -0,0 +1,338 @@
+"""
+Outbound Notification Queue
+Producers append Telegram messages to a Redis stream; one async sender drains it
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from core.redis_client import get_redis
+from .broadcast import GAVE_UP, BroadcastEngine, BroadcastResult, OutboundMessage, SharedRateLimit
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = 'notify:outbound'
+GROUP = 'senders'
+DEDUP_PREFIX = 'notify:dedup'
+
+# Telegram rejects longer texts
+MAX_MESSAGE_LENGTH = 4096
+COALESCE_SEPARATOR = '\n\n➖➖➖➖➖\n\n'
+
+
+def bot_token(name: str) -> str:
+    """Token of a named bot; queue entries never carry tokens themselves"""
+    if name == 'admin':
+        return getattr(settings, 'ADMIN_BOT_TOKEN', '') or getattr(settings, 'USER_BOT_TOKEN', '')
+    return getattr(settings, 'USER_BOT_TOKEN', '')
+
+
+def enqueue_notification(
+    chat_id: int,
+    text: str,
+    parse_mode: Optional[str] = None,
+    reply_markup: Optional[Dict] = None,
+    reply_to_message_id: Optional[int] = None,
+    bot: str = 'user',
+    dedup_key: Optional[str] = None
+) -> bool:
+    """
+    Queue a message for the sender worker
+
+    Args:
+        chat_id: Telegram chat
+        text: Message text
+        parse_mode: 'HTML' / 'Markdown' / None
+        reply_markup: InlineKeyboardMarkup.to_dict()
+        reply_to_message_id: Message to reply to
+        bot: Which bot sends it ('user' or 'admin')
+        dedup_key: Queue the message only once per key (NOTIFY_DEDUP_TTL)
+
+    Returns:
+        True if queued, False if it was a duplicate or Redis is unavailable
+    """
+    client = get_redis()
+    fields = {'chat_id': str(chat_id), 'text': text, 'bot': bot}
+    if parse_mode:
+        fields['parse_mode'] = parse_mode
+    if reply_markup:
+        fields['reply_markup'] = json.dumps(reply_markup)
+    if reply_to_message_id:
+        fields['reply_to'] = str(reply_to_message_id)
+
+    dedup_marker = f'{DEDUP_PREFIX}:{dedup_key}' if dedup_key else None
+    try:
+        if dedup_marker and not client.set(
+            dedup_marker, 1, nx=True,
+            ex=getattr(settings, 'NOTIFY_DEDUP_TTL', 86400)
+        ):
+            return False
+    except redis.RedisError as e:
+        logger.error(f"Could not queue notification for {chat_id}: {e}")
+        return False
+
+    try:
+        client.xadd(STREAM_KEY, fields, maxlen=getattr(settings, 'NOTIFY_QUEUE_MAXLEN', 100000), approximate=True)
+        return True
+    except redis.RedisError as e:
+        logger.error(f"Could not queue notification for {chat_id}: {e}")
+        if dedup_marker:
+            # the message was never queued: let a later attempt through
+            try:
+                client.delete(dedup_marker)
+            except redis.RedisError:
+                pass
+        return False
+
+
+aenqueue_notification = sync_to_async(enqueue_notification)
+
+
+def admin_chat_ids() -> List[int]:
+    """Telegram ids of ADMIN_USER_IDS plus every admin/staff user, without duplicates"""
+    from accounts.models import UsersModel
+
+    chat_ids = list(getattr(settings, 'ADMIN_USER_IDS', []))
+    chat_ids.extend(
+        UsersModel.objects.filter(Q(is_admin=True) | Q(is_staff=True))
+        .exclude(telegram_id__isnull=True)
+        .values_list('telegram_id', flat=True)
+    )
+    return list(dict.fromkeys(chat_id for chat_id in chat_ids if chat_id))
+
+
+def notify_admins(text: str, parse_mode: Optional[str] = None, reply_markup: Optional[Dict] = None) -> int:
+    """Queue one message per admin through the admin bot; returns the number queued"""
+    return sum(
+        enqueue_notification(chat_id, text, parse_mode=parse_mode, reply_markup=reply_markup, bot='admin')
+        for chat_id in admin_chat_ids()
+    )
+
+
+anotify_admins = sync_to_async(notify_admins)
+
+
+@dataclass
+class Batch:
+    """Queue entries for one chat merged into a single Telegram message"""
+    bot: str
+    message: Optional[OutboundMessage]  # None for malformed entries, which are just acknowledged
+    entry_ids: List[str] = field(default_factory=list)
+
+
+def coalesce(entries: Iterable[Tuple[str, Dict[str, str]]]) -> List[Batch]:
+    """
+    Merge entries that go to the same chat through the same bot
+
+    Entries are merged when their parse mode and keyboard match and they do
+    not reply to a specific message; texts are joined in queue order and a
+    new batch is started whenever Telegram's length limit would be exceeded.
+    """
+    batches: List[Batch] = []
+    open_batches: Dict[Tuple, Batch] = {}
+
+    for entry_id, fields in entries:
+        try:
+            chat_id = int(fields['chat_id'])
+        except (KeyError, ValueError):
+            logger.error(f"Dropping malformed notification {entry_id}: {fields}")
+            batches.append(Batch(bot='', message=None, entry_ids=[entry_id]))
+            continue
+
+        bot = fields.get('bot', 'user')
+        text = fields.get('text', '')
+        reply_to = fields.get('reply_to')
+        reply_markup = fields.get('reply_markup')
+        key = (bot, chat_id, fields.get('parse_mode'), reply_markup)
+
+        batch = open_batches.get(key)
+        if (
+            batch is not None
+            and not reply_to
+            and len(batch.message.text) + len(COALESCE_SEPARATOR) + len(text) <= MAX_MESSAGE_LENGTH
+        ):
+            batch.message.text += COALESCE_SEPARATOR + text
+            batch.entry_ids.append(entry_id)
+            continue
+
+        batch = Batch(
+            bot=bot,
+            message=OutboundMessage(
+                chat_id=chat_id,
+                text=text,
+                parse_mode=fields.get('parse_mode'),
+                reply_markup=json.loads(reply_markup) if reply_markup else None,
+                reply_to_message_id=int(reply_to) if reply_to else None,
+            ),
+            entry_ids=[entry_id],
+        )
+        batches.append(batch)
+        if not reply_to:
+            open_batches[key] = batch
+
+    return batches
+
+
+class NotificationSender:
+    """
+    Long-running consumer of the notification stream
+
+    Reads entries through a consumer group, coalesces them per chat, and
+    sends through BroadcastEngine under each bot's shared rate limit
+    (NOTIFY_RATE msg/s, shared with broadcasts of the same bot in other
+    processes) plus a minimum gap per chat (NOTIFY_CHAT_INTERVAL). Entries are acknowledged once sent or refused
+    by Telegram; entries whose send gave up stay pending and are claimed
+    again after NOTIFY_RETRY_IDLE seconds, until NOTIFY_MAX_DELIVERIES.
+    One Bot per bot name is kept open for the life of the process.
+    """
+
+    def __init__(self, consumer: Optional[str] = None):
+        self.consumer = consumer or f'{socket.gethostname()}-{os.getpid()}'
+        self.batch_size = getattr(settings, 'NOTIFY_BATCH_SIZE', 100)
+        self.block_ms = int(getattr(settings, 'NOTIFY_BLOCK_SECONDS', 5) * 1000)
+        self.chat_interval = getattr(settings, 'NOTIFY_CHAT_INTERVAL', 1.0)
+        self.retry_idle_ms = int(getattr(settings, 'NOTIFY_RETRY_IDLE', 60) * 1000)
+        self.max_deliveries = getattr(settings, 'NOTIFY_MAX_DELIVERIES', 5)
+        # blocking reads need a socket timeout longer than the block
+        self.client = redis.Redis.from_url(
+            getattr(settings, 'REDIS_URL', 'redis://localhost:6379/0'),
+            decode_responses=True,
+            socket_timeout=self.block_ms / 1000 + 5,
+        )
+        self.engine = BroadcastEngine('', rate=getattr(settings, 'NOTIFY_RATE', 25))
+        self._bots: Dict[str, object] = {}
+        self._rate_limits: Dict[str, SharedRateLimit] = {}
+        self._next_send: Dict[Tuple[str, int], float] = {}
+        self._stopping = False
+
+    def stop(self) -> None:
+        self._stopping = True
+
+    def ensure_group(self) -> None:
+        try:
+            self.client.xgroup_create(STREAM_KEY, GROUP, id='0', mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def _bot(self, name: str):
+        bot = self._bots.get(name)
+        if bot is None:
+            token = bot_token(name)
+            if not token:
+                return None
+            bot = BroadcastEngine(token, concurrency=self.engine.concurrency)._make_bot()
+            await bot.initialize()
+            self._bots[name] = bot
+            self._rate_limits[name] = self.engine.rate_limit(token)
+        return bot
+
+    def _claim_stale(self) -> List[Tuple[str, Dict[str, str]]]:
+        """Take over entries whose send gave up (or whose consumer died), dropping exhausted ones"""
+        pending = self.client.xpending_range(
+            STREAM_KEY, GROUP, min='-', max='+', count=self.batch_size, idle=self.retry_idle_ms
+        )
+        if not pending:
+            return []
+
+        exhausted = [p['message_id'] for p in pending if p['times_delivered'] >= self.max_deliveries]
+        if exhausted:
+            logger.error(f"Dropping {len(exhausted)} notifications after {self.max_deliveries} deliveries")
+            self._finish(exhausted)
+
+        retry = [p['message_id'] for p in pending if p['times_delivered'] < self.max_deliveries]
+        if not retry:
+            return []
+        return [
+            entry for entry in self.client.xclaim(STREAM_KEY, GROUP, self.consumer, self.retry_idle_ms, retry)
+            if entry[1]
+        ]
+
+    def _read_new(self) -> List[Tuple[str, Dict[str, str]]]:
+        response = self.client.xreadgroup(
+            GROUP, self.consumer, {STREAM_KEY: '>'}, count=self.batch_size, block=self.block_ms
+        )
+        return response[0][1] if response else []
+
+    def _finish(self, entry_ids: List[str]) -> None:
+        pipe = self.client.pipeline()
+        pipe.xack(STREAM_KEY, GROUP, *entry_ids)
+        pipe.xdel(STREAM_KEY, *entry_ids)
+        pipe.execute()
+
+    async def _send_batch(self, batch: Batch, result: BroadcastResult) -> bool:
+        """Send one coalesced batch; True if its entries are done with"""
+        if batch.message is None:
+            return True
+
+        bot = await self._bot(batch.bot)
+        if bot is None:
+            logger.error(f"No token configured for bot '{batch.bot}', dropping {len(batch.entry_ids)} notifications")
+            return True
+
+        chat = (batch.bot, batch.message.chat_id)
+        wait = self._next_send.get(chat, 0) - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._next_send[chat] = time.monotonic() + self.chat_interval
+
+        outcome = await self.engine.deliver(bot, self._rate_limits[batch.bot], batch.message, result)
+        return outcome != GAVE_UP
+
+    async def _send_chat(self, batches: List[Batch], result: BroadcastResult) -> List[str]:
+        """Send one chat's batches in order; returns the entry ids that are done with"""
+        done: List[str] = []
+        for batch in batches:
+            if await self._send_batch(batch, result):
+                done.extend(batch.entry_ids)
+        return done
+
+    async def drain_once(self) -> BroadcastResult:
+        """Read, coalesce and send one round of entries"""
+        entries = await asyncio.to_thread(self._claim_stale)
+        if not entries:
+            entries = await asyncio.to_thread(self._read_new)
+
+        result = BroadcastResult()
+        if not entries:
+            return result
+
+        per_chat: Dict[Tuple[str, int], List[Batch]] = {}
+        for batch in coalesce(entries):
+            chat = (batch.bot, batch.message.chat_id if batch.message else 0)
+            per_chat.setdefault(chat, []).append(batch)
+
+        finished = await asyncio.gather(*(self._send_chat(batches, result) for batches in per_chat.values()))
+        done = [entry_id for entry_ids in finished for entry_id in entry_ids]
+        if done:
+            await asyncio.to_thread(self._finish, done)
+
+        if result.sent or result.failed:
+            logger.info(f"Notification round: {len(entries)} entries, {result.as_dict()}")
+        return result
+
+    async def run(self) -> None:
+        """Drain the queue until stop() is called"""
+        await asyncio.to_thread(self.ensure_group)
+        logger.info(f"Notification sender {self.consumer} started")
+        try:
+            while not self._stopping:
+                try:
+                    await self.drain_once()
+                except redis.RedisError as e:
+                    logger.error(f"Notification queue unavailable: {e}")
+                    await asyncio.sleep(5)
+        finally:
+            for bot in self._bots.values():
+                await bot.shutdown()
+            self._bots.clear()
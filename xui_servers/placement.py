@@ -0,0 +1,283 @@
+"""
+Inbound Placement Engine
+Picks the inbound for a new client and reserves its slot atomically
+"""
+import logging
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Type
+from uuid import UUID
+
+import redis
+from django.conf import settings
+from django.db.models import Case, F, IntegerField, Q, QuerySet, Value, When
+from django.db.models.functions import Greatest
+
+from .circuit_breaker import get_server_breaker
+from .models import XUIInbound, XUIServer
+
+logger = logging.getLogger(__name__)
+
+
+class PlacementPolicy(ABC):
+    """
+    Base placement policy
+
+    A policy turns the queryset of inbounds with free slots into an ordered
+    list of candidates; the engine tries to reserve them in that order.
+    """
+
+    name = ''
+
+    def __init__(self, candidates: int = 10):
+        """
+        Args:
+            candidates: Maximum number of inbounds fetched per placement
+        """
+        self.candidates = candidates
+
+    @abstractmethod
+    def order(self, inbounds: QuerySet, region: Optional[str] = None) -> List[XUIInbound]:
+        """Candidate inbounds in the order they should be tried"""
+
+
+class LeastLoadedPolicy(PlacementPolicy):
+    """Prefer the inbound with the most free slots"""
+
+    name = 'least_loaded'
+
+    def order(self, inbounds: QuerySet, region: Optional[str] = None) -> List[XUIInbound]:
+        return list(inbounds.order_by('-free_slots', 'current_clients')[:self.candidates])
+
+
+class WeightedPolicy(PlacementPolicy):
+    """
+    Spread clients randomly, weighted by free slots
+
+    Avoids every concurrent purchase racing for the same least-loaded inbound.
+    """
+
+    name = 'weighted'
+
+    def order(self, inbounds: QuerySet, region: Optional[str] = None) -> List[XUIInbound]:
+        pool = list(inbounds.order_by('-free_slots')[:self.candidates])
+        ordered = []
+        while pool:
+            choice = random.choices(pool, weights=[max(i.free_slots, 1) for i in pool])[0]
+            pool.remove(choice)
+            ordered.append(choice)
+        return ordered
+
+
+class RegionAffinityPolicy(PlacementPolicy):
+    """Prefer servers in the requested region, least loaded first"""
+
+    name = 'region_affinity'
+
+    def order(self, inbounds: QuerySet, region: Optional[str] = None) -> List[XUIInbound]:
+        if not region:
+            return LeastLoadedPolicy(self.candidates).order(inbounds)
+
+        affinity = Case(
+            When(server__region=region, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField()
+        )
+        return list(
+            inbounds.annotate(affinity=affinity)
+            .order_by('affinity', '-free_slots', 'current_clients')[:self.candidates]
+        )
+
+
+PLACEMENT_POLICIES: Dict[str, Type[PlacementPolicy]] = {
+    policy.name: policy
+    for policy in (LeastLoadedPolicy, WeightedPolicy, RegionAffinityPolicy)
+}
+
+
+class PlacementEngine:
+    """
+    Capacity-aware inbound placement
+
+    Candidates are read in one query over healthy, active servers. A slot is
+    reserved with a conditional UPDATE (current_clients < max_clients), so
+    concurrent purchases can never overfill an inbound; a lost race simply
+    moves on to the next candidate.
+
+    Least-loaded placements for a server type are answered from the shared
+    Redis capacity index when it is enabled, skipping the candidate query.
+
+    Servers whose panel circuit breaker is open are skipped, so new clients
+    are never placed on a panel that cannot be provisioned right now.
+    """
+
+    def __init__(self, policy: Optional[PlacementPolicy] = None):
+        """
+        Args:
+            policy: Placement policy (defaults to settings.PLACEMENT_POLICY)
+        """
+        if policy is None:
+            policy_class = PLACEMENT_POLICIES.get(
+                getattr(settings, 'PLACEMENT_POLICY', 'least_loaded'),
+                LeastLoadedPolicy
+            )
+            policy = policy_class()
+        self.policy = policy
+
+    def available_inbounds(
+        self,
+        protocol: str,
+        server: Optional[XUIServer] = None,
+        server_type: Optional[str] = None
+    ) -> QuerySet:
+        """Inbounds with free slots on active, not unhealthy servers"""
+        inbounds = XUIInbound.objects.filter(
+            Q(server__is_deleted=False) | Q(server__is_deleted__isnull=True),
+            is_active=True,
+            protocol=protocol,
+            current_clients__lt=F('max_clients'),
+            server__is_active=True,
+        ).exclude(
+            server__health_status='unhealthy'
+        ).annotate(
+            free_slots=F('max_clients') - F('current_clients')
+        ).select_related('server')
+
+        if server is not None:
+            inbounds = inbounds.filter(server=server)
+        if server_type:
+            inbounds = inbounds.filter(server__server_type=server_type)
+        return inbounds
+
+    def reserve(
+        self,
+        protocol: str = 'vless',
+        server: Optional[XUIServer] = None,
+        server_type: Optional[str] = None,
+        region: Optional[str] = None
+    ) -> Optional[XUIInbound]:
+        """
+        Pick an inbound and reserve one client slot on it
+
+        Args:
+            protocol: Inbound protocol
+            server: Restrict placement to this server
+            server_type: Restrict placement to 'xui' or 'sui' servers
+            region: Preferred region (used by region-affinity policies)
+
+        Returns:
+            The reserved inbound, or None if no capacity is left
+        """
+        if server is None and server_type and self._use_index():
+            inbound = self._reserve_from_index(protocol, server_type)
+            if inbound:
+                return inbound
+
+        candidates = self.policy.order(
+            self.available_inbounds(protocol, server=server, server_type=server_type),
+            region=region
+        )
+
+        for inbound in candidates:
+            if get_server_breaker(inbound.server).is_open():
+                logger.debug(f"Skipping inbound {inbound.pk}: circuit open for {inbound.server.name}")
+                continue
+
+            reserved = XUIInbound.objects.filter(
+                pk=inbound.pk,
+                current_clients__lt=F('max_clients')
+            ).update(current_clients=F('current_clients') + 1)
+
+            if reserved:
+                inbound.current_clients += 1
+                self._update_index('consume', inbound)
+                return inbound
+
+            logger.debug(f"Lost slot race on inbound {inbound.pk}, trying next candidate")
+
+        logger.warning(f"No free {protocol} inbound available for placement")
+        return None
+
+    def release(self, inbound: XUIInbound) -> None:
+        """Give back a slot reserved on an inbound"""
+        released = XUIInbound.objects.filter(
+            pk=inbound.pk,
+            current_clients__gt=0
+        ).update(current_clients=F('current_clients') - 1)
+
+        if released:
+            self._update_index('release', inbound)
+
+    def release_many(self, counts: Dict[UUID, int]) -> None:
+        """
+        Give back the slots of configs removed in bulk (expiry sweeps, batch deletes)
+
+        Args:
+            counts: Number of slots to free per inbound primary key
+        """
+        counts = {pk: count for pk, count in counts.items() if pk and count > 0}
+        if not counts:
+            return
+
+        inbounds = XUIInbound.objects.select_related('server').in_bulk(list(counts))
+        for pk, count in counts.items():
+            released = XUIInbound.objects.filter(
+                pk=pk,
+                current_clients__gt=0
+            ).update(current_clients=Greatest(F('current_clients') - count, 0))
+
+            if released and pk in inbounds:
+                self._update_index('release', inbounds[pk], count)
+
+    def _use_index(self) -> bool:
+        return (
+            getattr(settings, 'CAPACITY_INDEX_ENABLED', True)
+            and isinstance(self.policy, LeastLoadedPolicy)
+        )
+
+    def _reserve_from_index(self, protocol: str, server_type: str) -> Optional[XUIInbound]:
+        """Reserve the inbound picked by the capacity index, dropping stale entries"""
+        from .capacity_index import get_capacity_index
+
+        try:
+            index = get_capacity_index()
+            for _ in range(self.policy.candidates):
+                inbound_id = index.reserve(server_type, protocol)
+                if inbound_id is None:
+                    return None
+
+                inbound = XUIInbound.objects.select_related('server').filter(pk=inbound_id).first()
+                if inbound is not None and get_server_breaker(inbound.server).is_open():
+                    # hand the slot back and let the database placement pick around the server
+                    index.release(inbound)
+                    return None
+
+                reserved = XUIInbound.objects.filter(
+                    pk=inbound_id,
+                    is_active=True,
+                    current_clients__lt=F('max_clients'),
+                    server__is_active=True
+                ).update(current_clients=F('current_clients') + 1)
+
+                if reserved:
+                    inbound.current_clients += 1
+                    return inbound
+
+                index.discard(server_type, protocol, inbound_id)
+
+        except redis.RedisError as e:
+            logger.warning(f"Capacity index unavailable, using database placement: {e}")
+
+        return None
+
+    def _update_index(self, operation: str, inbound: XUIInbound, *args) -> None:
+        """Mirror a slot change into the capacity index (best effort)"""
+        if not getattr(settings, 'CAPACITY_INDEX_ENABLED', True):
+            return
+
+        from .capacity_index import get_capacity_index
+
+        try:
+            getattr(get_capacity_index(), operation)(inbound, *args)
+        except redis.RedisError as e:
+            logger.warning(f"Could not update capacity index for inbound {inbound.pk}: {e}")
@@ -3,9 +3,13 @@ Celery Tasks for Subscription Provisioning
 Handles provisioning, revoking, and syncing subscriptions with S-UI/X-UI
 """
 import logging
-from typing import Optional, Dict, Any
+from datetime import timedelta
+from typing import Optional, Dict, Any, List
+from uuid import UUID
+import redis
 from celery import shared_task
 from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
 from django.conf import settings
 
@@ -13,8 +17,11 @@ from .models import UserConfig, XUIServer, XUIInbound
 from accounts.models import UsersModel
 from plan.models import ConfingPlansModel
 from order.models import OrderUserModel
+from core.redis_client import get_redis
 from .sui_managers import SUIProvisionService
 from .enhanced_api_models import XUIClientManager, XUIInboundManager
+from .placement import PlacementEngine
+from .notification_queue import enqueue_notification, notify_admins
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +55,10 @@ def provision_subscription(
                 'subscription_url': user_config.subscription_url
             }
         
+        # Only live and not yet provisioned configs still hold their inbound slot;
+        # the expiry sweep, bulk deletes and failed provisioning already gave it back
+        holds_slot = user_config.is_active or user_config.status in ('pending', 'provisioning')
+        
         # Get server
         server = user_config.server
         
@@ -187,6 +198,10 @@ def revoke_subscription(
                 'user_config_id': str(user_config_id)
             }
         
+        # Only live and not yet provisioned configs still hold their inbound slot;
+        # the expiry sweep, bulk deletes and failed provisioning already gave it back
+        holds_slot = user_config.is_active or user_config.status in ('pending', 'provisioning')
+        
         # Get server
         server = user_config.server
         
@@ -201,9 +216,12 @@ def revoke_subscription(
         
         if success:
             with transaction.atomic():
-                user_config.status = 'cancelled'
-                user_config.is_active = False
-                user_config.save()
+                cancelled = UserConfig.objects.filter(pk=user_config.pk).exclude(
+                    status='cancelled'
+                ).update(status='cancelled', is_active=False, updated_at=timezone.now())
+                
+                if cancelled and holds_slot and user_config.inbound:
+                    PlacementEngine().release(user_config.inbound)
             
             logger.info(f"Successfully revoked subscription {user_config_id}")
             
@@ -262,6 +280,14 @@ def sync_server_stats(server_id: str) -> Dict[str, Any]:
         server.last_sync_at = timezone.now()
         server.save()
         
+        # Refresh this server's entries in the shared capacity index
+        if getattr(settings, 'CAPACITY_INDEX_ENABLED', True):
+            from .capacity_index import get_capacity_index
+            try:
+                get_capacity_index().rebuild_server(server)
+            except redis.RedisError as e:
+                logger.warning(f"Could not rebuild capacity index for {server.name}: {e}")
+        
         logger.info(f"Synced {synced_count} inbounds for server {server.name}")
         
         return {
@@ -362,12 +388,7 @@ def send_provision_notification(user_config_id: str) -> None:
         user_config = UserConfig.objects.get(id=user_config_id)
         user = user_config.user
         
-        # Send Telegram notification if bot token available
-        token = getattr(settings, 'USER_BOT_TOKEN', None)
-        if token and user.telegram_id:
-            from telegram import Bot
-            
-            bot = Bot(token=token)
+        if user.telegram_id:
             message = (
                 f"✅ **کانفیگ شما آماده است!**\n\n"
                 f"📋 نام: {user_config.config_name}\n"
@@ -375,19 +396,194 @@ def send_provision_notification(user_config_id: str) -> None:
                 f"⏰ اعتبار: {user_config.expires_at.strftime('%Y-%m-%d %H:%M') if user_config.expires_at else 'نامحدود'}"
             )
             
-            try:
-                bot.send_message(
-                    chat_id=user.telegram_id,
-                    text=message,
-                    parse_mode='Markdown'
-                )
-            except Exception as e:
-                logger.error(f"Failed to send notification: {e}")
+            # the dedup key keeps task retries from notifying twice
+            enqueue_notification(
+                user.telegram_id,
+                message,
+                parse_mode='Markdown',
+                dedup_key=f"provisioned:{user_config.id}"
+            )
         
     except Exception as e:
         logger.error(f"Error sending provision notification: {e}", exc_info=True)
 
 
+def schedule_batch_provision(server_id: str) -> None:
+    """
+    Queue one batch provisioning run per server per batch window
+    
+    The window is claimed in Redis (SET NX EX) so it holds across every
+    worker; if Redis is unavailable the batch is queued anyway, since a
+    duplicate run only finds nothing left to claim.
+    
+    Args:
+        server_id: XUIServer UUID
+    """
+    window = getattr(settings, 'PROVISION_BATCH_WINDOW', 5)
+    try:
+        claimed = get_redis().set(f"provision_batch:{server_id}", 1, nx=True, ex=window)
+    except redis.RedisError as e:
+        logger.warning(f"Could not claim batch window for server {server_id}: {e}")
+        claimed = True
+    if claimed:
+        provision_pending_batch.apply_async(args=[str(server_id)], countdown=window)
+
+
+def _claim_pending_configs(server: XUIServer, batch_size: int, max_retries: int) -> List[UserConfig]:
+    """
+    Claim a batch of pending configs by moving them to 'provisioning'
+    
+    Runs in its own short transaction, so no row lock is held while the panel
+    is called. Claims left behind by a worker that died are taken over after
+    PROVISION_CLAIM_TIMEOUT seconds.
+    """
+    stale_before = timezone.now() - timedelta(seconds=getattr(settings, 'PROVISION_CLAIM_TIMEOUT', 600))
+    
+    with transaction.atomic():
+        pending = list(
+            UserConfig.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(server=server, is_active=False, provision_retry_count__lt=max_retries)
+            .filter(Q(status='pending') | Q(status='provisioning', updated_at__lt=stale_before))
+            .select_related('user', 'plan', 'inbound')
+            .order_by('created_at')[:batch_size]
+        )
+        if pending:
+            UserConfig.objects.filter(id__in=[c.id for c in pending]).update(
+                status='provisioning',
+                updated_at=timezone.now()
+            )
+    return pending
+
+
+def _fail_exhausted_configs(server: XUIServer, max_retries: int) -> int:
+    """
+    Give configs that ran out of retries the terminal 'failed' status and tell the admins
+
+    The inbound slots they reserved (at purchase or on their first batch)
+    are given back at the same time, since a failed config never uses them.
+    """
+    exhausted = list(
+        UserConfig.objects.filter(
+            server=server,
+            is_active=False,
+            status__in=['pending', 'provisioning'],
+            provision_retry_count__gte=max_retries
+        ).values_list('id', 'external_id', 'inbound_id')
+    )
+    if not exhausted:
+        return 0
+    
+    slots: Dict[UUID, int] = {}
+    for _, _, inbound_id in exhausted:
+        if inbound_id:
+            slots[inbound_id] = slots.get(inbound_id, 0) + 1
+    
+    with transaction.atomic():
+        UserConfig.objects.filter(id__in=[config_id for config_id, _, _ in exhausted]).update(
+            status='failed',
+            updated_at=timezone.now()
+        )
+        PlacementEngine().release_many(slots)
+    
+    external_ids = [external_id for _, external_id, _ in exhausted]
+    logger.error(
+        f"{len(exhausted)} configs on {server.name} failed provisioning after {max_retries} attempts: "
+        f"{external_ids}"
+    )
+    notify_admins(
+        f"❌ تامین {len(exhausted)} کانفیگ روی سرور {server.name} پس از {max_retries} تلاش ناموفق بود.\n"
+        + "\n".join(f"• {external_id}" for external_id in external_ids)
+    )
+    return len(exhausted)
+
+
+@shared_task
+def provision_pending_batch(server_id: str) -> Dict[str, Any]:
+    """
+    Provision all pending X-UI configs of a server in batches
+    
+    Pending configs are claimed by flipping them to 'provisioning' in a short
+    transaction (SELECT ... FOR UPDATE SKIP LOCKED). The panel is then called
+    outside any transaction, with one addClient call per inbound, and the
+    results are written back in a second short transaction. Failed configs go
+    back to 'pending' for the next batch; once they run out of retries they
+    are marked 'failed'.
+    
+    Args:
+        server_id: XUIServer UUID
+        
+    Returns:
+        Dict with batch results
+    """
+    try:
+        server = XUIServer.objects.get(id=server_id)
+        batch_size = getattr(settings, 'PROVISION_BATCH_SIZE', 200)
+        max_retries = provision_subscription.max_retries
+        
+        pending = _claim_pending_configs(server, batch_size, max_retries)
+        if not pending:
+            return {
+                'success': True,
+                'server_id': str(server_id),
+                'provisioned': 0,
+                'failed': 0,
+                'exhausted': _fail_exhausted_configs(server, max_retries)
+            }
+        
+        try:
+            # successful configs are activated by the manager in one transaction
+            result = XUIClientManager(server).provision_configs_batch(pending)
+        except Exception:
+            # release the claim so the configs are retried instead of waiting for the timeout
+            result = {'provisioned': [], 'failed': pending}
+            logger.error(f"Batch provisioning on {server.name} failed", exc_info=True)
+        
+        if result['failed']:
+            with transaction.atomic():
+                UserConfig.objects.filter(id__in=[c.id for c in result['failed']]).update(
+                    status='pending',
+                    provision_retry_count=F('provision_retry_count') + 1,
+                    last_provision_error='Batch provisioning failed',
+                    updated_at=timezone.now()
+                )
+        exhausted = _fail_exhausted_configs(server, max_retries)
+        
+        for user_config in result['provisioned']:
+            send_provision_notification.delay(str(user_config.id))
+        
+        # More work left: failed configs to retry or a full batch
+        if len(result['failed']) > exhausted or len(pending) == batch_size:
+            schedule_batch_provision(server_id)
+        
+        logger.info(
+            f"Batch provisioned {len(result['provisioned'])} configs on {server.name}, "
+            f"{len(result['failed'])} failed, {exhausted} out of retries"
+        )
+        
+        return {
+            'success': True,
+            'server_id': str(server_id),
+            'provisioned': len(result['provisioned']),
+            'failed': len(result['failed']),
+            'exhausted': exhausted
+        }
+        
+    except XUIServer.DoesNotExist:
+        logger.error(f"Server {server_id} not found")
+        return {
+            'success': False,
+            'message': 'Server not found',
+            'server_id': str(server_id)
+        }
+    except Exception as e:
+        logger.error(f"Error batch provisioning server {server_id}: {e}", exc_info=True)
+        return {
+            'success': False,
+            'message': str(e),
+            'server_id': str(server_id)
+        }
+
+
 @shared_task
 def process_paid_order(order_id: str) -> Dict[str, Any]:
     """
@@ -409,8 +605,19 @@ def process_paid_order(order_id: str) -> Dict[str, Any]:
                 'order_id': str(order_id)
             }
         
-        # Find or create active server
-        server = XUIServer.objects.filter(is_active=True, server_type__in=['xui', 'sui']).first()
+        # Reserve a slot on the best inbound; fall back to any active server
+        # when no inbound with free capacity has been synced yet. Placement is
+        # asked per server type so it can be answered from the capacity index.
+        placement = PlacementEngine()
+        inbound = None
+        for server_type in ('xui', 'sui'):
+            inbound = placement.reserve(protocol='vless', server_type=server_type)
+            if inbound:
+                break
+        if inbound:
+            server = inbound.server
+        else:
+            server = XUIServer.objects.filter(is_active=True, server_type__in=['xui', 'sui']).first()
         if not server:
             raise ValueError("No active server available")
         
@@ -419,6 +626,8 @@ def process_paid_order(order_id: str) -> Dict[str, Any]:
             user=order.user,
             server=server,
             plan=order.plan,
+            inbound=inbound,
+            xui_inbound_id=inbound.xui_inbound_id if inbound else 0,  # Assigned on provisioning
             config_name=f"{order.user.full_name} - {order.plan.name}",
             is_active=False,  # Will be activated after provisioning
             status='pending',
@@ -428,11 +637,14 @@ def process_paid_order(order_id: str) -> Dict[str, Any]:
             external_id=f"order_{order.order_number}"
         )
         
-        # Queue provisioning
-        provision_subscription.delay(
-            str(user_config.id),
-            idempotency_key=f"order_{order.order_number}"
-        )
+        # Queue provisioning (X-UI configs are collected into per-inbound batches)
+        if server.server_type == 'sui':
+            provision_subscription.delay(
+                str(user_config.id),
+                idempotency_key=f"order_{order.order_number}"
+            )
+        else:
+            schedule_batch_provision(str(server.id))
         
         return {
             'success': True,
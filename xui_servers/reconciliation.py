@@ -0,0 +1,394 @@
+"""
+Panel Reconciliation
+Diffs the clients on a panel against UserConfig / XUIClient rows and optionally repairs drift
+"""
+import asyncio
+import json
+import logging
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .async_client import close_panel_sessions, get_async_client
+from .broadcast import BroadcastEngine, OutboundMessage
+from .models import AuditLog, UserConfig, XUIClient, XUIServer
+from .telegram_runtime import get_bot
+
+logger = logging.getLogger(__name__)
+
+GB = 1024 ** 3
+
+
+@dataclass
+class Orphan:
+    """Client on the panel with no live row in the database"""
+    inbound_id: int
+    email: str
+    client_id: str
+
+
+@dataclass
+class Missing:
+    """Active config in the database that the panel does not have"""
+    inbound_id: int
+    key: str
+    config_id: str
+
+
+@dataclass
+class Mismatch:
+    """Client present on both sides whose limits or expiry differ"""
+    inbound_id: int
+    key: str
+    fields: Dict[str, Tuple[Any, Any]]  # field -> (database value, panel value)
+
+
+@dataclass
+class ReconciliationReport:
+    """Diff between one panel and the database"""
+    server_id: str
+    server_name: str
+    panel_clients: int = 0
+    db_records: int = 0
+    orphans: List[Orphan] = field(default_factory=list)
+    missing: List[Missing] = field(default_factory=list)
+    mismatches: List[Mismatch] = field(default_factory=list)
+    repaired: Dict[str, int] = field(default_factory=lambda: {'orphans': 0, 'missing': 0, 'mismatches': 0})
+    error: str = ''
+
+    @property
+    def has_drift(self) -> bool:
+        return bool(self.orphans or self.missing or self.mismatches)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'server': self.server_name,
+            'panel_clients': self.panel_clients,
+            'db_records': self.db_records,
+            'orphans': len(self.orphans),
+            'missing': len(self.missing),
+            'mismatches': len(self.mismatches),
+            'repaired': dict(self.repaired),
+            'error': self.error,
+        }
+
+    def summary_line(self) -> str:
+        if self.error:
+            return f"❌ {self.server_name}: {self.error}"
+        if not self.has_drift:
+            return f"✅ {self.server_name}: {self.panel_clients} کلاینت، بدون اختلاف"
+
+        line = (
+            f"⚠️ {self.server_name}: {len(self.orphans)} اضافه در پنل، "
+            f"{len(self.missing)} غایب در پنل، {len(self.mismatches)} اختلاف محدودیت/انقضا"
+        )
+        if any(self.repaired.values()):
+            line += f" (اصلاح شد: {sum(self.repaired.values())})"
+        return line
+
+
+def _parse_clients(inbound: Dict) -> List[Dict]:
+    settings_data = inbound.get('settings') or '{}'
+    if isinstance(settings_data, str):
+        try:
+            settings_data = json.loads(settings_data)
+        except json.JSONDecodeError:
+            return []
+    return settings_data.get('clients') or []
+
+
+def _over_quota(client: Dict, stat: Optional[Dict]) -> bool:
+    """Whether the panel's traffic stats show the client has used up its quota"""
+    if not stat:
+        return False
+    total = stat.get('total') or client.get('totalGB') or 0
+    return bool(total) and (stat.get('up') or 0) + (stat.get('down') or 0) >= total
+
+
+def _expiry_ms(expires_at) -> int:
+    return int(expires_at.timestamp() * 1000) if expires_at else 0
+
+
+class PanelReconciler:
+    """
+    Reconciles one server
+
+    The panel's full client set is pulled once (one inbound listing) and
+    indexed by id and email; the database side is two queries. Every lookup
+    afterwards is a set/dict membership test, so a panel with thousands of
+    clients costs one request instead of one per client.
+
+    Repairs, when enabled, are applied per inbound through
+    apply_client_changes in batches of RECONCILE_REPAIR_BATCH_SIZE, the
+    database being the source of truth:
+    - orphans are removed from the panel
+    - missing configs are re-added with their stored UUID and expiry
+    - mismatched limits/expiry are overwritten with the database values
+    """
+
+    def __init__(self, server: XUIServer):
+        self.server = server
+        self.expiry_tolerance_ms = getattr(settings, 'RECONCILE_EXPIRY_TOLERANCE', 300) * 1000
+        self.batch_size = getattr(settings, 'RECONCILE_REPAIR_BATCH_SIZE', 100)
+
+    # --- database side -------------------------------------------------
+
+    def _load_database(self):
+        """Active configs and clients by panel key, plus keys that must never count as orphans"""
+        configs: Dict[str, UserConfig] = {}
+        protected: Set[str] = set()
+
+        rows = UserConfig.objects.filter(
+            server=self.server
+        ).filter(
+            Q(is_active=True) | Q(status__in=['pending', 'provisioning'])
+        ).select_related('plan').only(
+            'id', 'xui_inbound_id', 'xui_user_id', 'external_id', 'expires_at',
+            'is_active', 'status', 'plan__traffic_mb'
+        )
+        for config in rows.iterator():
+            # pending/provisioning configs may be on the panel already while their batch commits
+            protected.update(filter(None, (config.xui_user_id, config.external_id, f"config_{config.id}")))
+            if config.is_active and config.xui_user_id:
+                configs[config.xui_user_id] = config
+
+        clients: Dict[str, XUIClient] = {}
+        for client in XUIClient.objects.filter(
+            inbound__server=self.server, is_active=True
+        ).select_related('inbound').iterator():
+            clients[client.xui_client_id] = client
+            protected.update((client.xui_client_id, client.email))
+
+        return configs, clients, protected
+
+    # --- diff ----------------------------------------------------------
+
+    def diff(
+        self,
+        inbounds: List[Dict],
+        configs: Dict[str, UserConfig],
+        clients: Dict[str, XUIClient],
+        protected: Set[str]
+    ) -> ReconciliationReport:
+        """Compare the panel's inbounds with the database rows"""
+        report = ReconciliationReport(server_id=str(self.server.id), server_name=self.server.name)
+        report.db_records = len(configs) + len(clients)
+
+        panel: Dict[str, Tuple[int, Dict]] = {}
+        stats: Dict[str, Dict] = {}
+        for inbound in inbounds:
+            inbound_id = inbound.get('id')
+            for stat in inbound.get('clientStats') or []:
+                if stat.get('email'):
+                    stats[stat['email']] = stat
+            for client in _parse_clients(inbound):
+                report.panel_clients += 1
+                keys = {str(k) for k in (client.get('id'), client.get('email')) if k}
+                for key in keys:
+                    panel[key] = (inbound_id, client)
+                if not keys & protected:
+                    report.orphans.append(Orphan(
+                        inbound_id=inbound_id,
+                        email=client.get('email', ''),
+                        client_id=str(client.get('id', ''))
+                    ))
+
+        now = timezone.now()
+        for key, config in configs.items():
+            found = panel.get(key)
+            if found is None:
+                report.missing.append(Missing(config.xui_inbound_id, key, str(config.id)))
+                continue
+
+            inbound_id, client = found
+            panel_key = str(client.get('id') or client.get('email'))
+            fields = {}
+            if inbound_id != config.xui_inbound_id:
+                fields['inbound'] = (config.xui_inbound_id, inbound_id)
+            db_expiry = _expiry_ms(config.expires_at)
+            panel_expiry = client.get('expiryTime') or 0
+            if abs(db_expiry - panel_expiry) > self.expiry_tolerance_ms:
+                fields['expiryTime'] = (db_expiry, panel_expiry)
+            # the panel disables clients itself on expiry or exhausted quota; only
+            # a client that should still be serving counts as wrongly disabled
+            if (
+                client.get('enable') is False
+                and not (config.expires_at and config.expires_at <= now)
+                and not _over_quota(client, stats.get(client.get('email')))
+            ):
+                fields['enable'] = (True, False)
+            if fields:
+                report.mismatches.append(Mismatch(inbound_id, panel_key, fields))
+
+        for key, db_client in clients.items():
+            found = panel.get(key) or panel.get(db_client.email)
+            if found is None:
+                report.missing.append(Missing(db_client.inbound.xui_inbound_id, key, str(db_client.id)))
+                continue
+
+            inbound_id, client = found
+            panel_key = str(client.get('id') or client.get('email'))
+            fields = {}
+            if (client.get('limitIp') or 0) != db_client.limit_ip:
+                fields['limitIp'] = (db_client.limit_ip, client.get('limitIp') or 0)
+            if (client.get('totalGB') or 0) != db_client.total_gb * GB:
+                fields['totalGB'] = (db_client.total_gb * GB, client.get('totalGB') or 0)
+            if abs(db_client.expiry_time - (client.get('expiryTime') or 0)) > self.expiry_tolerance_ms:
+                fields['expiryTime'] = (db_client.expiry_time, client.get('expiryTime') or 0)
+            if fields:
+                report.mismatches.append(Mismatch(inbound_id, panel_key, fields))
+
+        return report
+
+    # --- repair --------------------------------------------------------
+
+    def _missing_client(self, missing: Missing, configs: Dict[str, UserConfig], clients: Dict[str, XUIClient]) -> Dict:
+        """Panel client dict re-creating a missing row"""
+        db_client = clients.get(missing.key)
+        if db_client is not None:
+            return {
+                "id": db_client.xui_client_id,
+                "email": db_client.email,
+                "limitIp": db_client.limit_ip,
+                "totalGB": db_client.total_gb * GB,
+                "expiryTime": db_client.expiry_time,
+                "enable": True,
+                "flow": "",
+                "tgId": "",
+                "subId": uuid.uuid4().hex[:16],
+                "reset": 0
+            }
+
+        config = configs[missing.key]
+        try:
+            client_id = str(uuid.UUID(missing.key))
+            email = config.external_id or f"config_{config.id}"
+        except ValueError:
+            # S-UI configs are keyed by email
+            client_id = str(uuid.uuid4())
+            email = missing.key
+        return {
+            "id": client_id,
+            "email": email,
+            "limitIp": 0,
+            "totalGB": config.plan.get_traffic_gb() if config.plan else 0,
+            "expiryTime": _expiry_ms(config.expires_at),
+            "enable": True,
+            "flow": "",
+            "tgId": "",
+            "subId": uuid.uuid4().hex[:16],
+            "reset": 0
+        }
+
+    async def _repair(self, report: ReconciliationReport, configs, clients) -> None:
+        changes: Dict[int, Dict[str, Any]] = defaultdict(lambda: {'adds': [], 'removes': [], 'updates': {}})
+        for orphan in report.orphans:
+            changes[orphan.inbound_id]['removes'].append(orphan.client_id or orphan.email)
+        for missing in report.missing:
+            changes[missing.inbound_id]['adds'].append(self._missing_client(missing, configs, clients))
+        for mismatch in report.mismatches:
+            update = {name: db_value for name, (db_value, _) in mismatch.fields.items() if name != 'inbound'}
+            if update:
+                changes[mismatch.inbound_id]['updates'][mismatch.key] = update
+
+        panel = get_async_client(self.server)
+        for inbound_id, change in changes.items():
+            adds, removes, updates = change['adds'], change['removes'], list(change['updates'].items())
+            while adds or removes or updates:
+                batch_adds, adds = adds[:self.batch_size], adds[self.batch_size:]
+                batch_removes, removes = removes[:self.batch_size], removes[self.batch_size:]
+                batch_updates, updates = dict(updates[:self.batch_size]), updates[self.batch_size:]
+
+                result = await panel.apply_client_changes(
+                    inbound_id, adds=batch_adds, removes=batch_removes, updates=batch_updates
+                )
+                if result is None:
+                    logger.error(f"Reconciliation repair failed on inbound {inbound_id} of {self.server.name}")
+                    break
+
+                report.repaired['orphans'] += len(result['removed'])
+                report.repaired['missing'] += len(result['added'])
+                report.repaired['mismatches'] += len(result['updated'])
+
+    # --- entry point ---------------------------------------------------
+
+    async def _reconcile(self, configs, clients, protected, auto_repair: bool) -> ReconciliationReport:
+        try:
+            inbounds = await get_async_client(self.server).get_inbounds()
+            report = self.diff(inbounds, configs, clients, protected)
+            if auto_repair and report.has_drift and inbounds:
+                await self._repair(report, configs, clients)
+            return report
+        finally:
+            await close_panel_sessions()
+
+    def run(self, auto_repair: bool = False) -> ReconciliationReport:
+        """
+        Reconcile the server
+
+        Args:
+            auto_repair: Push the database state to the panel for every difference found
+
+        Returns:
+            The diff (with repair counts when auto_repair is set)
+        """
+        configs, clients, protected = self._load_database()
+
+        try:
+            report = asyncio.run(self._reconcile(configs, clients, protected, auto_repair))
+        except Exception as e:
+            logger.error(f"Reconciliation of {self.server.name} failed: {e}", exc_info=True)
+            return ReconciliationReport(server_id=str(self.server.id), server_name=self.server.name, error=str(e))
+
+        if report.panel_clients == 0 and report.db_records:
+            # an empty listing from a panel that should have clients is a failed fetch, not drift
+            return ReconciliationReport(
+                server_id=str(self.server.id),
+                server_name=self.server.name,
+                db_records=report.db_records,
+                error='پنل هیچ کلاینتی برنگرداند'
+            )
+
+        if any(report.repaired.values()):
+            AuditLog.objects.create(
+                action='sync',
+                model_name='XUIServer',
+                object_id=str(self.server.id),
+                description=f"Reconciliation repaired drift on {self.server.name}",
+                changes=report.as_dict()
+            )
+
+        return report
+
+
+async def send_admin_report(text: str) -> int:
+    """
+    Send a report to every admin through the admin bot; returns the number delivered
+
+    Uses the worker's shared admin Bot, so it must run inside run_telegram().
+    """
+    token = getattr(settings, 'ADMIN_BOT_TOKEN', '') or getattr(settings, 'USER_BOT_TOKEN', '')
+    if not token:
+        return 0
+
+    messages = [
+        OutboundMessage(chat_id=admin_id, text=text)
+        for admin_id in getattr(settings, 'ADMIN_USER_IDS', [])
+    ]
+    result = await BroadcastEngine(token).send(messages, bot=await get_bot(token))
+    return result.sent
+
+
+def format_admin_report(reports: List[ReconciliationReport], auto_repair: bool) -> str:
+    """Admin bot message summarising a reconciliation run"""
+    title = "🔄 گزارش تطبیق پنل‌ها با دیتابیس"
+    if auto_repair:
+        title += " (با اصلاح خودکار)"
+    lines = [title, ""]
+    lines.extend(report.summary_line() for report in reports)
+    return "\n".join(lines)
@@ -0,0 +1,329 @@
+"""
+Panel Retry Policy
+One budgeted retry/timeout policy shared by every panel client
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type
+
+import aiohttp
+import requests
+from django.conf import settings
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Statuses meaning the panel refused the request without acting on it: retry any method
+RETRYABLE_STATUSES = frozenset({429, 503})
+# Proxy errors: the panel may have applied the request behind them, retry idempotent methods only
+IDEMPOTENT_RETRYABLE_STATUSES = frozenset({502, 504})
+# Methods that can be replayed after the panel may already have seen the request
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'})
+
+# The request never reached the panel: safe to retry whatever the method
+CONNECT_ERRORS: Tuple[Type[BaseException], ...] = (
+    requests.exceptions.ConnectTimeout,
+    aiohttp.ClientConnectorError,
+)
+# The panel may have processed the request (dropped connection, read timeout):
+# retry idempotent methods only
+READ_ERRORS: Tuple[Type[BaseException], ...] = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    asyncio.TimeoutError,
+    aiohttp.ClientConnectionError,
+)
+
+
+def _never_sent(error: BaseException) -> bool:
+    """Whether the request failed before a connection to the panel existed"""
+    if isinstance(error, CONNECT_ERRORS):
+        return True
+    # requests reports refused connections and DNS failures as a plain ConnectionError
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout, asyncio.TimeoutError):
+    """The call's deadline ran out before another attempt could be sent"""
+
+
+class RetryMetrics:
+    """
+    Process-wide retry counters per client label
+
+    Tracks calls, attempts, retries, calls that gave up, and the time spent
+    waiting between attempts.
+    """
+
+    FIELDS = ('calls', 'attempts', 'retries', 'exhausted', 'retry_wait_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, float]] = {}
+
+    def record(self, label: str, attempts: int, waited: float, exhausted: bool) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(label, dict.fromkeys(self.FIELDS, 0))
+            counters['calls'] += 1
+            counters['attempts'] += attempts
+            counters['retries'] += attempts - 1
+            counters['exhausted'] += int(exhausted)
+            counters['retry_wait_seconds'] += waited
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Copy of the counters, keyed by client label"""
+        with self._lock:
+            return {label: dict(counters) for label, counters in self._counters.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+retry_metrics = RetryMetrics()
+
+
+class RetryPolicy:
+    """
+    Budgeted retry policy
+
+    Every attempt and every backoff sleep is charged to one total deadline, so
+    a call's worst-case latency is bounded by ``deadline`` no matter how many
+    attempts are allowed. Backoff uses full jitter (a random wait between 0
+    and the exponential step) so clients retrying a recovering panel do not
+    arrive in lockstep.
+
+    Failures are classified before retrying:
+    - failures to connect are always retried (the panel never saw the request)
+    - dropped connections and timeouts are retried for idempotent methods only
+    - 429/503 responses are retried, honouring Retry-After; 502/504 (the
+      panel may have applied the request behind the proxy) only for
+      idempotent methods
+    - anything else (4xx, other 5xx, programming errors) returns immediately
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        deadline: Optional[float] = 30.0,
+        base_delay: float = 0.5,
+        max_delay: float = 4.0,
+        retry_exceptions: Optional[Tuple[Type[BaseException], ...]] = None,
+        label: str = 'panel'
+    ):
+        """
+        Args:
+            max_attempts: Attempts per call, including the first
+            deadline: Total seconds per call across attempts and waits (None = unbounded)
+            base_delay: First backoff step in seconds
+            max_delay: Largest backoff step in seconds
+            retry_exceptions: Retry on any of these exceptions regardless of method,
+                instead of the connect/read classification
+            label: Metrics label
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_exceptions = retry_exceptions
+        self.label = label
+
+    def with_label(self, label: str) -> 'RetryPolicy':
+        """Copy of the policy reporting metrics under another label"""
+        return RetryPolicy(
+            max_attempts=self.max_attempts,
+            deadline=self.deadline,
+            base_delay=self.base_delay,
+            max_delay=self.max_delay,
+            retry_exceptions=self.retry_exceptions,
+            label=label
+        )
+
+    def is_retryable_error(self, error: BaseException, method: str = 'GET') -> bool:
+        if self.retry_exceptions is not None:
+            return isinstance(error, self.retry_exceptions)
+        if _never_sent(error):
+            return True
+        if isinstance(error, READ_ERRORS):
+            return method.upper() in IDEMPOTENT_METHODS
+        return False
+
+    @staticmethod
+    def is_retryable_status(status: Optional[int], method: str = 'GET') -> bool:
+        if status in RETRYABLE_STATUSES:
+            return True
+        return status in IDEMPOTENT_RETRYABLE_STATUSES and method.upper() in IDEMPOTENT_METHODS
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Seconds to wait before attempt number ``attempt + 1`` (attempt is 0-based)"""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _remaining(self, started: float) -> Optional[float]:
+        if self.deadline is None:
+            return None
+        return self.deadline - (time.monotonic() - started)
+
+    def deadline_exceeded(self, started: float) -> bool:
+        """Whether nothing is left of the deadline of a call started at ``started``"""
+        remaining = self._remaining(started)
+        return remaining is not None and remaining <= 0
+
+    def attempt_timeout(self, started: float, timeout: Optional[float]) -> Optional[float]:
+        """Per-attempt timeout capped by what is left of the deadline"""
+        remaining = self._remaining(started)
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        return min(timeout, remaining)
+
+    def _next_wait(self, started: float, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """Wait before the next attempt, or None if the call must give up"""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        wait = self.backoff(attempt, retry_after)
+        remaining = self._remaining(started)
+        if remaining is not None and wait >= remaining:
+            return None
+        return wait
+
+    def execute(
+        self,
+        send: Callable[[Optional[float]], Any],
+        method: str = 'GET',
+        timeout: Optional[float] = None,
+        status_of: Callable[[Any], Optional[int]] = lambda response: getattr(response, 'status_code', None),
+        retry_after_of: Optional[Callable[[Any], Optional[float]]] = None,
+        started: Optional[float] = None
+    ) -> Any:
+        """
+        Run ``send(attempt_timeout)`` under the policy
+
+        ``started`` (a time.monotonic() value) charges the call to a deadline
+        that began earlier, e.g. when a request is resent after re-login.
+
+        Returns:
+            The last result; retryable statuses that ran out of budget are
+            returned as-is for the caller to handle
+
+        Raises:
+            The last exception if no attempt produced a result;
+            DeadlineExceeded if the deadline of ``started`` is already spent
+        """
+        retry_after_of = retry_after_of or _retry_after
+        started = time.monotonic() if started is None else started
+        waited = 0.0
+        attempt = 0
+
+        while True:
+            if self.deadline_exceeded(started):
+                # a zero/negative timeout is an error in requests and "no timeout" in aiohttp
+                raise DeadlineExceeded(f"[{self.label}] deadline of {self.deadline}s spent before sending")
+            result = error = retry_after = None
+            try:
+                result = send(self.attempt_timeout(started, timeout))
+                if not self.is_retryable_status(status_of(result), method):
+                    self._record(attempt + 1, waited, exhausted=False)
+                    return result
+                retry_after = retry_after_of(result)
+            except Exception as e:
+                if not self.is_retryable_error(e, method):
+                    self._record(attempt + 1, waited, exhausted=False)
+                    raise
+                error = e
+
+            wait = self._next_wait(started, attempt, retry_after)
+            if wait is None:
+                self._record(attempt + 1, waited, exhausted=True)
+                if error is not None:
+                    raise error
+                return result
+
+            logger.debug(
+                f"[{self.label}] attempt {attempt + 1}/{self.max_attempts} failed "
+                f"({error or status_of(result)}), retrying in {wait:.2f}s"
+            )
+            time.sleep(wait)
+            waited += wait
+            attempt += 1
+
+    async def aexecute(
+        self,
+        send: Callable[[Optional[float]], Awaitable[Any]],
+        method: str = 'GET',
+        timeout: Optional[float] = None,
+        status_of: Callable[[Any], Optional[int]] = lambda result: result[0],
+        retry_after_of: Optional[Callable[[Any], Optional[float]]] = None,
+        started: Optional[float] = None
+    ) -> Any:
+        """Async twin of execute(); waits with asyncio.sleep instead of blocking"""
+        started = time.monotonic() if started is None else started
+        waited = 0.0
+        attempt = 0
+
+        while True:
+            if self.deadline_exceeded(started):
+                # a zero/negative timeout is an error in requests and "no timeout" in aiohttp
+                raise DeadlineExceeded(f"[{self.label}] deadline of {self.deadline}s spent before sending")
+            result = error = retry_after = None
+            try:
+                result = await send(self.attempt_timeout(started, timeout))
+                if not self.is_retryable_status(status_of(result), method):
+                    self._record(attempt + 1, waited, exhausted=False)
+                    return result
+                retry_after = retry_after_of(result) if retry_after_of else None
+            except Exception as e:
+                if not self.is_retryable_error(e, method):
+                    self._record(attempt + 1, waited, exhausted=False)
+                    raise
+                error = e
+
+            wait = self._next_wait(started, attempt, retry_after)
+            if wait is None:
+                self._record(attempt + 1, waited, exhausted=True)
+                if error is not None:
+                    raise error
+                return result
+
+            logger.debug(
+                f"[{self.label}] attempt {attempt + 1}/{self.max_attempts} failed "
+                f"({error or status_of(result)}), retrying in {wait:.2f}s"
+            )
+            await asyncio.sleep(wait)
+            waited += wait
+            attempt += 1
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a plain callable under the policy, retrying on exceptions only"""
+        return self.execute(lambda _timeout: func(*args, **kwargs), status_of=lambda _result: None)
+
+    def _record(self, attempts: int, waited: float, exhausted: bool) -> None:
+        retry_metrics.record(self.label, attempts, waited, exhausted)
+        if exhausted and attempts > 1:
+            logger.warning(f"[{self.label}] gave up after {attempts} attempts ({waited:.2f}s waiting)")
+
+
+def _retry_after(response) -> Optional[float]:
+    """Retry-After header of a requests response, in seconds"""
+    try:
+        value = response.headers.get('Retry-After')
+        return float(value) if value is not None else None
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def get_panel_retry_policy(label: str = 'panel') -> RetryPolicy:
+    """The panel retry policy configured in settings"""
+    return RetryPolicy(
+        max_attempts=getattr(settings, 'PANEL_RETRY_MAX_ATTEMPTS', 3),
+        deadline=getattr(settings, 'PANEL_RETRY_DEADLINE', 30.0),
+        base_delay=getattr(settings, 'PANEL_RETRY_BASE_DELAY', 0.5),
+        max_delay=getattr(settings, 'PANEL_RETRY_MAX_DELAY', 4.0),
+        label=label
+    )
@@ -1,4 +1,3 @@
-import requests
 import json
 import base64
 import uuid
@@ -27,25 +26,15 @@ class XUIService:
             base_url += server.web_base_path
         self.base_url = base_url.rstrip('/')
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'User-Agent': 'Django-XUI-Bot/3.0'
-        })
-        
-        # تنظیم SSL verification
-        verify_ssl = getattr(settings, 'XUI_VERIFY_SSL', False)
-        self.session.verify = verify_ssl
-        self._token = None
-        
-        # استفاده از سرویس‌های پیشرفته
+        # استفاده از سرویس‌های پیشرفته (session مشترک سرور از رجیستری)
         self.enhanced_service = XUIEnhancedService(server)
+        self.session = self.enhanced_service.session
         self.client_manager = XUIClientManager(server)
         self.inbound_manager = XUIInboundManager(server)
     
     def login(self):
-        """ورود به X-UI با API جدید"""
-        return self.enhanced_service.login()
+        """ورود به X-UI با API جدید (فقط اگر session مشترک هنوز وارد نشده باشد)"""
+        return self.enhanced_service.ensure_login()
     
     def get_inbounds(self):
         """دریافت لیست inbound ها با API جدید"""
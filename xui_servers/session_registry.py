@@ -0,0 +1,171 @@
+"""
+Process-wide Panel Session Registry
+Shares one authenticated HTTP session per XUIServer across all managers in a process
+"""
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import requests
+from django.conf import settings
+
+from .sui_client import SUIClient
+
+logger = logging.getLogger(__name__)
+
+
+def server_fingerprint(server) -> Tuple:
+    """
+    Connection-relevant fields of a server
+
+    A cached session is only reused while these are unchanged, so a row edited in
+    another process (e.g. the admin panel) is picked up the next time a worker
+    loads the server, even without receiving the post_save signal.
+    """
+    return (
+        server.host,
+        server.port,
+        server.username,
+        server.password,
+        getattr(server, 'web_base_path', None),
+        getattr(server, 'use_ssl', None),
+        getattr(server, 'server_type', None),
+        getattr(server, 'api_token', None),
+    )
+
+
+class PanelSession:
+    """
+    Shared authenticated session for one X-UI panel
+
+    Holds the requests.Session plus the login cookie/token. Login is serialized
+    with a lock so concurrent threads trigger at most one login.
+    """
+
+    def __init__(self, fingerprint: Tuple):
+        self.fingerprint = fingerprint
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Content-Type': 'application/json',
+            'User-Agent': 'Django-XUI-Bot/3.0',
+            'Accept': 'application/json'
+        })
+        self.session.verify = getattr(settings, 'XUI_VERIFY_SSL', False)
+        self.lock = threading.Lock()
+        self.authenticated = False
+        self.token: Optional[str] = None
+        self.cookies: Dict[str, str] = {}
+        self.login_count = 0
+
+    def ensure_authenticated(self, login: Callable[[], bool]) -> bool:
+        """
+        Run login() only if no other thread has authenticated this session yet
+
+        Args:
+            login: Callable performing the actual login, returns True on success
+
+        Returns:
+            True if the session is authenticated
+        """
+        if self.authenticated:
+            return True
+
+        with self.lock:
+            if not self.authenticated:
+                self.login_count += 1
+                self.authenticated = bool(login())
+            return self.authenticated
+
+    def invalidate_auth(self) -> None:
+        """Forget the login (e.g. after a 401) so the next call re-authenticates"""
+        with self.lock:
+            self.authenticated = False
+            self.token = None
+            self.cookies = {}
+            self.session.headers.pop('Authorization', None)
+            self.session.cookies.clear()
+
+
+class PanelSessionRegistry:
+    """
+    Registry of panel sessions keyed by XUIServer.id
+
+    - X-UI servers get a shared PanelSession (cookie/token login)
+    - S-UI servers get a shared SUIClient (token auth, verified once)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, PanelSession] = {}
+        self._sui_clients: Dict[str, Tuple[Tuple, SUIClient]] = {}
+
+    def get(self, server) -> PanelSession:
+        """Get the shared X-UI session for a server"""
+        key = str(server.id)
+        fingerprint = server_fingerprint(server)
+
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None or entry.fingerprint != fingerprint:
+                entry = PanelSession(fingerprint)
+                self._sessions[key] = entry
+            return entry
+
+    def get_sui_client(self, server) -> SUIClient:
+        """Get the shared S-UI client for a server"""
+        key = str(server.id)
+        fingerprint = server_fingerprint(server)
+
+        with self._lock:
+            cached = self._sui_clients.get(key)
+            if cached is None or cached[0] != fingerprint:
+                client = SUIClient(
+                    host=server.host,
+                    port=server.port,
+                    api_token=getattr(server, 'api_token', None),
+                    use_ssl=getattr(server, 'use_ssl', False),
+                    base_path=getattr(server, 'web_base_path', None) or '/app'
+                )
+                cached = (fingerprint, client)
+                self._sui_clients[key] = cached
+            return cached[1]
+
+    def invalidate(self, server_id) -> None:
+        """Drop cached sessions for a server (called when the XUIServer row changes)"""
+        key = str(server_id)
+        with self._lock:
+            entry = self._sessions.pop(key, None)
+            self._sui_clients.pop(key, None)
+
+        if entry is not None:
+            entry.session.close()
+            logger.info(f"Invalidated panel session for server {key}")
+
+    def invalidate_if_changed(self, server) -> None:
+        """Drop cached sessions only if the server's connection fields changed"""
+        key = str(server.id)
+        fingerprint = server_fingerprint(server)
+
+        with self._lock:
+            entry = self._sessions.get(key)
+            sui_cached = self._sui_clients.get(key)
+            changed = (
+                (entry is not None and entry.fingerprint != fingerprint)
+                or (sui_cached is not None and sui_cached[0] != fingerprint)
+            )
+
+        if changed:
+            self.invalidate(server.id)
+
+    def clear(self) -> None:
+        """Drop all cached sessions"""
+        with self._lock:
+            entries = list(self._sessions.values())
+            self._sessions.clear()
+            self._sui_clients.clear()
+
+        for entry in entries:
+            entry.session.close()
+
+
+panel_sessions = PanelSessionRegistry()
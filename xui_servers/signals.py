@@ -0,0 +1,33 @@
+"""
+Signal handlers for xui_servers models
+"""
+import logging
+
+import redis
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import XUIServer
+from .session_registry import panel_sessions
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=XUIServer)
+def refresh_panel_session(sender, instance, **kwargs):
+    """Drop the cached panel session when the server's connection settings change"""
+    panel_sessions.invalidate_if_changed(instance)
+
+
+@receiver(post_delete, sender=XUIServer)
+def drop_panel_session(sender, instance, **kwargs):
+    """Drop the cached panel session and capacity index entries of a deleted server"""
+    panel_sessions.invalidate(instance.id)
+
+    if getattr(settings, 'CAPACITY_INDEX_ENABLED', True):
+        from .capacity_index import get_capacity_index
+        try:
+            get_capacity_index().drop_server(instance.id)
+        except redis.RedisError as e:
+            logger.warning(f"Could not drop capacity index entries of server {instance.id}: {e}")
@@ -6,38 +6,40 @@ import requests
 import json
 import time
 import logging
-from typing import Optional, Dict, List, Any
+from contextlib import closing
+from typing import Optional, Dict, Iterator, List, Any
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.conf import settings
 from functools import wraps
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+
+from .circuit_breaker import breaker_key, get_breaker
+from .json_stream import PanelInbound, iter_json_array
+from .retry_policy import RetryPolicy, get_panel_retry_policy
 
 logger = logging.getLogger(__name__)
 
 
 def retry_with_backoff(max_retries: int = 3, backoff_factor: float = 1.0):
-    """Decorator for retry logic with exponential backoff"""
+    """
+    Decorator for retry logic with jittered exponential backoff
+
+    Retries on any exception; panel HTTP calls go through the client's
+    RetryPolicy instead, which classifies failures and enforces a deadline.
+    """
     def decorator(func):
+        policy = RetryPolicy(
+            max_attempts=max_retries,
+            deadline=None,
+            base_delay=backoff_factor,
+            max_delay=backoff_factor * (2 ** max(max_retries - 1, 0)),
+            retry_exceptions=(Exception,),
+            label=func.__name__
+        )
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            last_exception = None
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    if attempt < max_retries - 1:
-                        wait_time = backoff_factor * (2 ** attempt)
-                        logger.warning(
-                            f"Attempt {attempt + 1}/{max_retries} failed for {func.__name__}: {e}. "
-                            f"Retrying in {wait_time}s..."
-                        )
-                        time.sleep(wait_time)
-                    else:
-                        logger.error(f"All {max_retries} attempts failed for {func.__name__}")
-            raise last_exception
+            return policy.call(func, *args, **kwargs)
         return wrapper
     return decorator
 
@@ -85,17 +87,10 @@ class SUIClient:
         protocol = "https" if use_ssl else "http"
         self.base_url = f"{protocol}://{host}:{port}{base_path}"
         
-        # Create session with retry strategy
+        # Retries are handled by one budgeted policy in _make_request, not by
+        # the transport adapter or per-method decorators
         self.session = requests.Session()
-        retry_strategy = Retry(
-            total=3,
-            backoff_factor=1,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST", "PUT", "DELETE"]
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
+        self.retry_policy = get_panel_retry_policy('sui')
         
         # Set default headers
         self.session.headers.update({
@@ -114,6 +109,59 @@ class SUIClient:
         self.session.verify = getattr(settings, 'SUI_VERIFY_SSL', False)
         
         self._authenticated = False
+        self.breaker = get_breaker(breaker_key(host, port))
+    
+    def _send(
+        self,
+        method: str,
+        endpoint: str,
+        data: Optional[Dict] = None,
+        params: Optional[Dict] = None,
+        stream: bool = False
+    ) -> Optional[requests.Response]:
+        """
+        Send a request through the circuit breaker and retry policy
+        
+        Returns:
+            The response, or None if the panel could not be reached
+        """
+        url = f"{self.base_url}{endpoint}"
+        
+        # Fail fast while the panel's circuit is open
+        if not self.breaker.allow():
+            logger.warning(f"Circuit open for {self.host}:{self.port}, skipping {endpoint}")
+            return None
+        
+        try:
+            response = self.retry_policy.execute(
+                lambda timeout: self.session.request(
+                    method=method,
+                    url=url,
+                    json=data,
+                    params=params,
+                    timeout=timeout,
+                    stream=stream
+                ),
+                method=method,
+                timeout=self.timeout
+            )
+        except requests.exceptions.Timeout:
+            logger.error(f"Request timeout for {endpoint}")
+            self.breaker.record_failure()
+            return None
+        except requests.exceptions.ConnectionError as e:
+            logger.error(f"Connection error for {endpoint}: {e}")
+            self.breaker.record_failure()
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error in {endpoint}: {e}")
+            return None
+        
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
     
     def _make_request(
         self,
@@ -134,17 +182,11 @@ class SUIClient:
         Returns:
             Response JSON data or None on error
         """
-        url = f"{self.base_url}{endpoint}"
+        response = self._send(method, endpoint, data=data, params=params)
+        if response is None:
+            return None
         
         try:
-            response = self.session.request(
-                method=method,
-                url=url,
-                json=data,
-                params=params,
-                timeout=self.timeout
-            )
-            
             # Check status code
             if response.status_code == 401:
                 logger.error("Authentication failed - invalid API token")
@@ -172,17 +214,10 @@ class SUIClient:
                 logger.error(f"Invalid JSON response: {response.text[:200]}")
                 return None
                 
-        except requests.exceptions.Timeout:
-            logger.error(f"Request timeout for {endpoint}")
-            return None
-        except requests.exceptions.ConnectionError as e:
-            logger.error(f"Connection error for {endpoint}: {e}")
-            return None
         except Exception as e:
             logger.error(f"Unexpected error in {endpoint}: {e}")
             return None
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def login(self) -> bool:
         """
         Authenticate with S-UI panel
@@ -210,7 +245,6 @@ class SUIClient:
             return self.login()
         return True
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def get_inbounds(self) -> List[Dict[str, Any]]:
         """
         Get list of all inbounds
@@ -228,7 +262,44 @@ class SUIClient:
         
         return []
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
+    def iter_inbounds(self) -> Iterator[PanelInbound]:
+        """
+        Stream inbounds one at a time
+        
+        The response is parsed while it downloads, so memory stays flat on
+        panels with very large inbound listings and callers can start
+        writing before the transfer finishes. Each inbound's settings are
+        only decoded when its ``clients`` are accessed.
+        
+        Yields:
+            PanelInbound dictionaries
+        
+        Raises:
+            ValueError, RequestException: If the listing breaks off midway, so
+                callers never mistake a partial listing for the full one
+        """
+        if not self.ensure_authenticated():
+            return
+        
+        response = self._send('GET', '/api/v2/inbounds', stream=True)
+        if response is None:
+            return
+        
+        with closing(response):
+            if response.status_code != 200:
+                logger.warning(f"Streaming inbounds returned {response.status_code}")
+                return
+            
+            try:
+                yield from iter_json_array(
+                    response.iter_content(chunk_size=getattr(settings, 'PANEL_STREAM_CHUNK_SIZE', 65536)),
+                    key='data',
+                    factory=PanelInbound
+                )
+            except (ValueError, requests.exceptions.RequestException) as e:
+                logger.error(f"Inbound stream from {self.host}:{self.port} broke off: {e}")
+                raise
+    
     def get_inbound_by_id(self, inbound_id: int) -> Optional[Dict[str, Any]]:
         """
         Get inbound by ID
@@ -249,7 +320,6 @@ class SUIClient:
         
         return None
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def create_inbound(
         self,
         protocol: str = "vless",
@@ -307,7 +377,6 @@ class SUIClient:
         
         return None
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def add_client_to_inbound(
         self,
         inbound_id: int,
@@ -391,7 +460,6 @@ class SUIClient:
         
         return False
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def remove_client_from_inbound(self, inbound_id: int, email: str) -> bool:
         """
         Remove client from inbound
@@ -436,7 +504,6 @@ class SUIClient:
         
         return False
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def get_client_traffic(self, email: str) -> Optional[Dict[str, Any]]:
         """
         Get client traffic statistics
@@ -457,7 +524,6 @@ class SUIClient:
         
         return None
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def get_client_stats(self, inbound_id: int, email: str) -> Optional[Dict[str, Any]]:
         """
         Get detailed client statistics
@@ -482,7 +548,6 @@ class SUIClient:
         
         return None
     
-    @retry_with_backoff(max_retries=3, backoff_factor=1.0)
     def update_client_limits(
         self,
         inbound_id: int,
@@ -5,7 +5,8 @@ import logging
 from typing import Optional, Dict, List, Any
 from django.utils import timezone
 from django.db import transaction
-from .sui_client import SUIClient
+from .session_registry import panel_sessions
+from .inbound_sync import bulk_sync_inbounds
 from .models import XUIServer, XUIInbound, XUIClient, UserConfig
 from accounts.models import UsersModel
 from plan.models import ConfingPlansModel
@@ -27,12 +28,7 @@ class SUIInboundManager:
             server: XUIServer instance (can be S-UI or X-UI)
         """
         self.server = server
-        self.client = SUIClient(
-            host=server.host,
-            port=server.port,
-            use_ssl=getattr(server, 'use_ssl', False),
-            base_path=getattr(server, 'web_base_path', '/app')
-        )
+        self.client = panel_sessions.get_sui_client(server)
     
     def get_available_inbounds(self, protocol: Optional[str] = None):
         """
@@ -83,42 +79,11 @@ class SUIInboundManager:
             Number of inbounds synced
         """
         try:
-            if not self.client.login():
+            if not self.client.ensure_authenticated():
                 logger.error(f"Failed to login to S-UI server {self.server.name}")
                 return 0
             
-            inbounds = self.client.get_inbounds()
-            synced_count = 0
-            
-            for inbound_data in inbounds:
-                inbound_id = inbound_data.get('id')
-                if not inbound_id:
-                    continue
-                
-                # Get or create inbound in database
-                inbound, created = XUIInbound.objects.get_or_create(
-                    server=self.server,
-                    xui_inbound_id=inbound_id,
-                    defaults={
-                        'port': inbound_data.get('port', 0),
-                        'protocol': inbound_data.get('protocol', 'vless'),
-                        'remark': inbound_data.get('remark', f'Inbound {inbound_id}'),
-                        'is_active': inbound_data.get('enable', True),
-                        'max_clients': 100,  # Default
-                        'current_clients': len(inbound_data.get('clientStats', []))
-                    }
-                )
-                
-                if not created:
-                    # Update existing inbound
-                    inbound.port = inbound_data.get('port', inbound.port)
-                    inbound.protocol = inbound_data.get('protocol', inbound.protocol)
-                    inbound.remark = inbound_data.get('remark', inbound.remark)
-                    inbound.is_active = inbound_data.get('enable', inbound.is_active)
-                    inbound.current_clients = len(inbound_data.get('clientStats', []))
-                    inbound.save()
-                
-                synced_count += 1
+            synced_count = bulk_sync_inbounds(self.server, self.client.iter_inbounds())
             
             logger.info(f"Synced {synced_count} inbounds from S-UI server {self.server.name}")
             return synced_count
@@ -145,7 +110,7 @@ class SUIInboundManager:
             Created XUIInbound instance or None
         """
         try:
-            if not self.client.login():
+            if not self.client.ensure_authenticated():
                 return None
             
             inbound_id = self.client.create_inbound(
@@ -191,12 +156,7 @@ class SUIProvisionService:
             server: XUIServer instance
         """
         self.server = server
-        self.client = SUIClient(
-            host=server.host,
-            port=server.port,
-            use_ssl=getattr(server, 'use_ssl', False),
-            base_path=getattr(server, 'web_base_path', '/app')
-        )
+        self.client = panel_sessions.get_sui_client(server)
         self.inbound_manager = SUIInboundManager(server)
     
     @transaction.atomic
@@ -236,7 +196,7 @@ class SUIProvisionService:
             email = f"trial_{user.username_tel}_{user.telegram_id}"
             
             # Add client to S-UI
-            if not self.client.login():
+            if not self.client.ensure_authenticated():
                 logger.error("Failed to login to S-UI")
                 return None
             
@@ -312,7 +272,7 @@ class SUIProvisionService:
             email = f"{user.username_tel}_{user.telegram_id}"
             
             # Add client to S-UI
-            if not self.client.login():
+            if not self.client.ensure_authenticated():
                 logger.error("Failed to login to S-UI")
                 return None
             
@@ -380,7 +340,7 @@ class SUIProvisionService:
             True if sync successful
         """
         try:
-            if not self.client.login():
+            if not self.client.ensure_authenticated():
                 return False
             
             stats = self.client.get_client_stats(
@@ -412,7 +372,7 @@ class SUIProvisionService:
             True if successful
         """
         try:
-            if not self.client.login():
+            if not self.client.ensure_authenticated():
                 return False
             
             success = self.client.remove_client_from_inbound(
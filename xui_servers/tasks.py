@@ -1,12 +1,24 @@
+import asyncio
+import logging
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import timedelta
 
+import redis
 from celery import shared_task
 from django.conf import settings
+from django.db import connection
 from django.utils import timezone
 
-from accounts.models import UsersModel
+from core.redis_client import get_redis
 from .models import UserConfig, XUIServer
 from .enhanced_api_models import XUIAutoManager
+from .dashboard_stats import refresh_dashboard_stats
+from .broadcast import BroadcastResult, OutboundMessage, run_broadcast
+from .health import probe_servers, record_probe_results
+from .reconciliation import PanelReconciler, format_admin_report, send_admin_report
+from .telegram_runtime import run_telegram
 
 # Import provisioning tasks
 from .provisioning_tasks import (
@@ -17,19 +29,25 @@ from .provisioning_tasks import (
     process_paid_order,
 )
 
+logger = logging.getLogger(__name__)
+
 
 @shared_task
-def send_expiry_warnings() -> int:
+def send_expiry_warnings() -> dict:
     """
     ارسال پیام هشدار انقضای کانفیگ برای کاربرها در تلگرام.
 
+    پیام‌ها به صورت همزمان و با محدودیت نرخ (BroadcastEngine) ارسال می‌شوند
+    و هر کانفیگ برای هر تاریخ انقضا فقط یک بار هشدار می‌گیرد؛ تمدید کانفیگ
+    تاریخ جدید و در نتیجه هشدار جدید می‌سازد. ارسال روی event loop و Bot
+    مشترک worker (telegram_runtime) انجام می‌شود تا اتصال‌ها بین اجراها باز بمانند.
+
     از تنظیمات زیر استفاده می‌شود:
       - EXPIRY_WARNING_HOURS
       - EXPIRY_WARNING_MESSAGE
       - USER_BOT_TOKEN
+      - BROADCAST_RATE / BROADCAST_CONCURRENCY / BROADCAST_DEDUP_TTL
     """
-    from telegram import Bot
-
     hours = getattr(settings, "EXPIRY_WARNING_HOURS", 6)
     message_template = getattr(
         settings,
@@ -37,6 +55,10 @@ def send_expiry_warnings() -> int:
         "کانفیگ شما تا {hours} ساعت دیگر منقضی می‌شود ⏰",
     )
 
+    token = getattr(settings, "USER_BOT_TOKEN", None)
+    if not token:
+        return BroadcastResult().as_dict()
+
     now = timezone.now()
     window_end = now + timedelta(hours=hours)
 
@@ -46,39 +68,76 @@ def send_expiry_warnings() -> int:
             is_active=True,
             expires_at__gt=now,
             expires_at__lte=window_end,
+            user__telegram_id__isnull=False,
         )
         .select_related("user")
-        .all()
+        .only("id", "expires_at", "user__telegram_id")
     )
 
-    token = getattr(settings, "USER_BOT_TOKEN", None)
-    if not token:
-        return 0
-
-    bot = Bot(token=token)
-    sent = 0
-
-    for config in configs:
-        user: UsersModel = config.user
-        chat_id = getattr(user, "telegram_id", None)
-        if not chat_id:
-            continue
-
+    messages = []
+    for config in configs.iterator():
         remaining_seconds = max(
             0, int((config.expires_at - now).total_seconds())
         )
         remaining_hours = max(1, remaining_seconds // 3600)
 
-        text = message_template.format(hours=remaining_hours)
+        messages.append(OutboundMessage(
+            chat_id=config.user.telegram_id,
+            text=message_template.format(hours=remaining_hours),
+            dedup_key=f"expiry:{config.id}:{int(config.expires_at.timestamp())}",
+        ))
 
-        try:
-            bot.send_message(chat_id=chat_id, text=text)
-            sent += 1
-        except Exception:
-            # در صورت خطا برای یک کاربر، بقیه را ادامه می‌دهیم
-            continue
+    return run_broadcast(token, messages).as_dict()
+
+
+# قفل را فقط صاحبش آزاد می‌کند (قفلی که منقضی و دوباره گرفته شده دست نمی‌خورد)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
 
-    return sent
+
+def _acquire_cleanup_lock(server_id, token: str) -> bool:
+    """
+    قفل پاکسازی یک سرور در Redis (SET NX EX)
+
+    thread هایی که پس از CLEANUP_SERVER_TIMEOUT رها می‌شوند همچنان اجرا
+    می‌شوند؛ این قفل نمی‌گذارد اجرای بعدی همزمان همان سرور را پاکسازی کند.
+    اگر Redis در دسترس نباشد پاکسازی بدون قفل انجام می‌شود.
+    """
+    ttl = getattr(settings, "CLEANUP_LOCK_TTL", 900)
+    try:
+        return bool(get_redis().set(f"cleanup_lock:{server_id}", token, nx=True, ex=ttl))
+    except redis.RedisError as e:
+        logger.warning(f"Could not take cleanup lock for server {server_id}: {e}")
+        return True
+
+
+def _release_cleanup_lock(server_id, token: str) -> None:
+    try:
+        get_redis().eval(RELEASE_LOCK_SCRIPT, 1, f"cleanup_lock:{server_id}", token)
+    except redis.RedisError as e:
+        logger.warning(f"Could not release cleanup lock for server {server_id}: {e}")
+
+
+def _cleanup_server(server_id, started: dict) -> dict:
+    """پاکسازی یک سرور در thread جداگانه"""
+    started[server_id] = time.monotonic()
+    token = uuid.uuid4().hex
+    try:
+        if not _acquire_cleanup_lock(server_id, token):
+            logger.info(f"Cleanup for server {server_id} is still running from a previous run, skipping")
+            return {"skipped": True}
+        try:
+            server = XUIServer.objects.get(id=server_id)
+            return XUIAutoManager(server).run_cleanup()
+        finally:
+            _release_cleanup_lock(server_id, token)
+    finally:
+        # اتصال دیتابیس هر thread مختص همان thread است
+        connection.close()
 
 
 @shared_task
@@ -90,20 +149,129 @@ def cleanup_expired_and_overused() -> dict:
 
     این تسک روی تمام سرورهای X-UI فعال اجرا می‌شود و از
     XUIAutoManager برای ارتباط با پنل و حذف از X-UI استفاده می‌کند.
+
+    سرورها به صورت موازی (حداکثر CLEANUP_MAX_WORKERS سرور همزمان) پردازش
+    می‌شوند و منتظر سروری که بیش از CLEANUP_SERVER_TIMEOUT ثانیه طول بکشد
+    نمی‌مانیم، تا یک پنل کند یا از دسترس خارج، بقیه را معطل نکند. سروری که
+    پاکسازی قبلی‌اش هنوز در حال اجراست (قفل Redis) رد می‌شود.
     """
     total_results = {
         "expired_users": 0,
         "traffic_exceeded": 0,
         "total_cleaned": 0,
+        "failed_servers": 0,
+        "timed_out_servers": 0,
+        "skipped_servers": 0,
+    }
+
+    server_ids = list(
+        XUIServer.objects.filter(is_active=True).values_list("id", flat=True)
+    )
+    if not server_ids:
+        return total_results
+
+    max_workers = getattr(settings, "CLEANUP_MAX_WORKERS", 8)
+    server_timeout = getattr(settings, "CLEANUP_SERVER_TIMEOUT", 120)
+
+    started: dict = {}
+    executor = ThreadPoolExecutor(
+        max_workers=min(max_workers, len(server_ids)),
+        thread_name_prefix="xui-cleanup",
+    )
+    futures = {
+        executor.submit(_cleanup_server, server_id, started): server_id
+        for server_id in server_ids
     }
+    pending = set(futures)
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                server_id = futures[future]
+                try:
+                    res = future.result()
+                except Exception as e:
+                    logger.error(f"Cleanup failed for server {server_id}: {e}", exc_info=True)
+                    total_results["failed_servers"] += 1
+                    continue
 
-    for server in XUIServer.objects.filter(is_active=True):
-        manager = XUIAutoManager(server)
-        res = manager.run_cleanup()
+                if res.get("skipped"):
+                    total_results["skipped_servers"] += 1
+                    continue
 
-        total_results["expired_users"] += res.get("expired_users", 0)
-        total_results["traffic_exceeded"] += res.get("traffic_exceeded", 0)
-        total_results["total_cleaned"] += res.get("total_cleaned", 0)
+                total_results["expired_users"] += res.get("expired_users", 0)
+                total_results["traffic_exceeded"] += res.get("traffic_exceeded", 0)
+                total_results["total_cleaned"] += res.get("total_cleaned", 0)
+
+            # رها کردن سرورهایی که از زمان مجازشان گذشته‌اند
+            now = time.monotonic()
+            for future in list(pending):
+                server_id = futures[future]
+                if server_id in started and now - started[server_id] > server_timeout:
+                    logger.warning(
+                        f"Cleanup for server {server_id} exceeded {server_timeout}s, not waiting for it"
+                    )
+                    total_results["timed_out_servers"] += 1
+                    pending.discard(future)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
     return total_results
 
+
+@shared_task
+def probe_server_health() -> dict:
+    """
+    بررسی سلامت همه سرورها به صورت همزمان
+
+    تاخیر و در دسترس بودن هر پنل ثبت می‌شود و سرورهایی که چند بار پشت سر هم
+    پاسخ نداده‌اند ناسالم علامت می‌خورند؛ circuit breaker آن‌ها در همه پروسه‌ها
+    باز می‌شود تا درخواست‌ها به جای retry روی پنل خاموش، فوراً شکست بخورند.
+    """
+    servers = list(
+        XUIServer.objects.filter(is_active=True, health_check_enabled=True)
+    )
+    if not servers:
+        return {"healthy": 0, "unhealthy": 0, "changed": 0}
+
+    results = asyncio.run(probe_servers(servers))
+    return record_probe_results(servers, results)
+
+
+@shared_task
+def refresh_dashboard_snapshot() -> str:
+    """
+    محاسبه دوره‌ای آمار داشبورد ادمین و ذخیره آن در Redis
+
+    داشبوردها به جای ده‌ها کوئری count و حلقه روی سرورها/inbound ها، فقط
+    همین snapshot را می‌خوانند.
+    """
+    return refresh_dashboard_stats()["computed_at"]
+
+
+@shared_task
+def reconcile_panels(auto_repair: bool = None) -> dict:
+    """
+    تطبیق کلاینت‌های هر پنل با UserConfig / XUIClient های دیتابیس
+
+    برای هر سرور فعال لیست کامل کلاینت‌های پنل یک بار دریافت و با دیتابیس
+    مقایسه می‌شود (کلاینت‌های اضافه در پنل، کانفیگ‌های غایب در پنل و
+    اختلاف محدودیت/انقضا). در صورت فعال بودن RECONCILE_AUTO_REPAIR اختلاف‌ها
+    به صورت دسته‌ای روی پنل اصلاح می‌شوند و در صورت وجود اختلاف یا خطا
+    گزارش برای ادمین‌ها از طریق ربات ادمین ارسال می‌شود.
+    """
+    if auto_repair is None:
+        auto_repair = getattr(settings, "RECONCILE_AUTO_REPAIR", False)
+
+    servers = XUIServer.objects.filter(is_active=True).exclude(health_status="unhealthy")
+    reports = [PanelReconciler(server).run(auto_repair=auto_repair) for server in servers]
+
+    if any(report.has_drift or report.error for report in reports):
+        try:
+            run_telegram(send_admin_report(format_admin_report(reports, auto_repair)))
+        except Exception as e:
+            logger.error(f"Could not deliver reconciliation report: {e}")
+
+    return {report.server_id: report.as_dict() for report in reports}
@@ -0,0 +1,123 @@
+"""
+Process-wide Telegram Runtime
+One long-lived event loop and one initialized Bot per token for each worker process
+"""
+import asyncio
+import atexit
+import logging
+import os
+import threading
+from typing import Awaitable, Dict, Optional, TypeVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class TelegramRuntime:
+    """
+    Event loop running in a daemon thread, plus the Bots that live on it
+
+    Celery tasks are synchronous, and running each send under asyncio.run
+    creates a loop, a Bot and a TLS connection to api.telegram.org every
+    time. Here the loop outlives the task: run() submits a coroutine to it
+    and blocks for the result, and get_bot() hands out one Bot per token
+    whose HTTP pool (BROADCAST_CONCURRENCY connections) stays warm between
+    tasks. Bots are bound to this loop, so they may only be used from
+    coroutines passed to run().
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='telegram-runtime', daemon=True)
+        self._thread.start()
+        self._bots: Dict[str, object] = {}
+        self._bots_lock: Optional[asyncio.Lock] = None
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """Run a coroutine on the runtime loop and wait for its result"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("TelegramRuntime.run() called from the runtime loop itself")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result(timeout)
+
+    async def get_bot(self, token: str):
+        """Initialized Bot for a token, created on first use"""
+        if asyncio.get_running_loop() is not self._loop:
+            raise RuntimeError("Telegram runtime bots can only be used inside TelegramRuntime.run()")
+
+        bot = self._bots.get(token)
+        if bot is not None:
+            return bot
+
+        if self._bots_lock is None:
+            self._bots_lock = asyncio.Lock()
+        async with self._bots_lock:
+            bot = self._bots.get(token)
+            if bot is None:
+                from telegram import Bot
+                from telegram.request import HTTPXRequest
+
+                bot = Bot(
+                    token=token,
+                    request=HTTPXRequest(connection_pool_size=getattr(settings, 'BROADCAST_CONCURRENCY', 10))
+                )
+                await bot.initialize()
+                self._bots[token] = bot
+        return bot
+
+    async def _shutdown_bots(self) -> None:
+        bots, self._bots = list(self._bots.values()), {}
+        for bot in bots:
+            try:
+                await bot.shutdown()
+            except Exception as e:
+                logger.warning(f"Error closing Telegram bot session: {e}")
+
+    def close(self) -> None:
+        """Close every Bot session and stop the loop"""
+        if not self._loop.is_running():
+            return
+        try:
+            self.run(self._shutdown_bots(), timeout=10)
+        except Exception as e:
+            logger.warning(f"Error shutting down Telegram runtime: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+
+
+_runtime: Optional[TelegramRuntime] = None
+_lock = threading.Lock()
+
+
+def get_telegram_runtime() -> TelegramRuntime:
+    """
+    Get this process's runtime
+
+    A runtime inherited through fork (Celery prefork children) has no loop
+    thread in the child, so a new one is started per PID.
+    """
+    global _runtime
+    if _runtime is None or _runtime.pid != os.getpid():
+        with _lock:
+            if _runtime is None or _runtime.pid != os.getpid():
+                _runtime = TelegramRuntime()
+    return _runtime
+
+
+def run_telegram(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Blocking entry point for sync code (Celery tasks) that talks to Telegram"""
+    return get_telegram_runtime().run(coro, timeout)
+
+
+async def get_bot(token: str):
+    """Shared Bot for a token; only valid inside run_telegram()"""
+    return await get_telegram_runtime().get_bot(token)
+
+
+@atexit.register
+def _close_runtime() -> None:
+    if _runtime is not None and _runtime.pid == os.getpid():
+        _runtime.close()